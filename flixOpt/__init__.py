@@ -5,5 +5,15 @@ Created on Tue Feb 16 09:16:58 2021
 @author: Panitz
 """
 
+import importlib
+
 from .commons import *
 setup_logging('INFO')
+
+_LAZY_SUBMODULES = ('plotting', 'results')  # Heavy dependencies (plotly, matplotlib, pandas) are only loaded on use
+
+
+def __getattr__(name: str):
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -8,15 +8,17 @@ Modul zur aggregierten Berechnung eines Energiesystemmodells.
 """
 
 import copy
+import concurrent.futures
+import hashlib
+import itertools
+import pathlib
 import timeit
-from typing import Optional, List, Dict, Union, TYPE_CHECKING, Tuple
+from typing import Optional, List, Dict, Union, TYPE_CHECKING, Tuple, Literal, Any
 import warnings
 import logging
 from collections import Counter
 
-import pandas as pd
 import numpy as np
-import tsam.timeseriesaggregation as tsam
 
 from .core import Skalar, TimeSeries
 from .elements import Component
@@ -25,8 +27,13 @@ from .components import Storage
 from .core import TimeSeriesData
 from .structure import Element, SystemModel, ElementModel, create_variable, create_equation
 from .math_modeling import Equation, Variable, VariableTS
+from . import utils
 
 
+if TYPE_CHECKING:  # pandas and tsam are imported on first use, as they are slow to import
+    import pandas as pd
+    import tsam.timeseriesaggregation as tsam
+
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 logger = logging.getLogger('flixOpt')
 
@@ -36,13 +43,14 @@ class Aggregation:
     aggregation organizing class
     """
     def __init__(self,
-                 original_data: pd.DataFrame,
+                 original_data: 'pd.DataFrame',
                  hours_per_time_step: Skalar,
                  hours_per_period: Skalar,
                  nr_of_periods: int = 8,
                  weights: Optional[Dict[str, float]] = None,
                  time_series_for_high_peaks: Optional[List[str]] = None,
-                 time_series_for_low_peaks: Optional[List[str]] = None
+                 time_series_for_low_peaks: Optional[List[str]] = None,
+                 cache: Optional['ClusteringCache'] = None
                  ):
         """
         Write a docstring please
@@ -51,6 +59,9 @@ class Aggregation:
         ----------
         timeseries: pd.DataFrame
             timeseries of the data with a datetime index
+        cache: ClusteringCache, optional
+            Cache for the results of the clustering. If the same data was clustered with the same settings before,
+            the clustering is loaded from the cache instead of being recomputed. If None, no cache is used.
         """
         self.original_data = copy.deepcopy(original_data)
         self.hours_per_time_step = hours_per_time_step
@@ -61,15 +72,29 @@ class Aggregation:
         self.time_series_for_high_peaks = time_series_for_high_peaks
         self.time_series_for_low_peaks = time_series_for_low_peaks
 
-        self.aggregated_data: Optional[pd.DataFrame] = None
+        self.cache = cache
+
+        self.aggregated_data: Optional['pd.DataFrame'] = None
         self.clustering_duration_seconds = None
-        self.tsam: Optional[tsam.TimeSeriesAggregation] = None
+        self.clustering_from_cache = False
+        self.tsam: Optional['tsam.TimeSeriesAggregation'] = None
 
     def cluster(self) -> None:
         """
         Durchführung der Zeitreihenaggregation
         """
         start_time = timeit.default_timer()
+        cache_key = self.cache.key_of(self) if self.cache is not None else None
+        cached = self.cache.get(cache_key) if self.cache is not None else None
+        if cached is not None:
+            self.tsam, self.aggregated_data = cached
+            self.clustering_from_cache = True
+            self.clustering_duration_seconds = timeit.default_timer() - start_time
+            logger.info(f'Loaded clustering from cache (key: {cache_key[:12]})')
+            logger.info(self.describe_clusters())
+            return
+
+        import tsam.timeseriesaggregation as tsam
         # Erstellen des aggregation objects
         self.tsam = tsam.TimeSeriesAggregation(self.original_data,
                                                       noTypicalPeriods=self.nr_of_periods,
@@ -84,6 +109,8 @@ class Aggregation:
 
         self.tsam.createTypicalPeriods()   # Ausführen der Aggregation/Clustering
         self.aggregated_data = self.tsam.predictOriginalData()
+        if self.cache is not None:
+            self.cache.put(cache_key, (self.tsam, self.aggregated_data))
 
         self.clustering_duration_seconds = timeit.default_timer() - start_time   # Zeit messen:
         logger.info(self.describe_clusters())
@@ -95,10 +122,9 @@ class Aggregation:
                                 self.get_cluster_indices()[cluster]]
 
         if self.use_extreme_periods:
-            # Zeitreihe rauslöschen:
-            extremePeriods = self.tsam.extremePeriods.copy()
-            for key, val in extremePeriods.items():
-                del (extremePeriods[key]['profile'])
+            # Zeitreihe rauslöschen (ohne das tsam-Objekt zu verändern, da es im Cache liegen kann):
+            extremePeriods = {key: {k: v for k, v in val.items() if k != 'profile'}
+                              for key, val in self.tsam.extremePeriods.items()}
         else:
             extremePeriods = {}
 
@@ -197,6 +223,46 @@ class Aggregation:
         return np.array(idx_var1), np.array(idx_var2)
 
 
+class ClusteringCache(utils.PickleCache):
+    """
+    Cache for the results of Aggregation.cluster(), keyed by a hash of the input data and the clustering settings.
+    The entries are held in memory and optionally pickled to a directory, so they survive between python sessions.
+    If more than max_entries are stored, the least recently used entries are evicted.
+    """
+    name_of_entries = 'clustering'
+
+    def __init__(self, max_entries: int = 16, path: Optional[Union[str, pathlib.Path]] = None):
+        """
+        Parameters
+        ----------
+        max_entries : int
+            Maximum number of clusterings to keep in memory (and on disk, if a path is given).
+        path : str, pathlib.Path or None
+            Directory to store the clusterings in. If None, the clusterings are only held in memory.
+        """
+        assert max_entries >= 1, 'max_entries must be at least 1'
+        super().__init__(max_entries, path)
+
+    @property
+    def max_entries(self) -> int:
+        return self.max_size
+
+    @staticmethod
+    def key_of(aggregation: Aggregation) -> str:
+        """ Content hash of the data and all settings, that influence the result of the clustering """
+        import pandas as pd
+        hasher = hashlib.sha256()
+        # The order of the columns depends on the order the Elements were added in, so it is not part of the key
+        data = aggregation.original_data[sorted(aggregation.original_data.columns)]
+        hasher.update(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+        hasher.update(repr(list(data.columns)).encode())
+        settings = (aggregation.hours_per_time_step, aggregation.hours_per_period, aggregation.nr_of_periods,
+                    sorted((aggregation.weights or {}).items()),
+                    aggregation.time_series_for_high_peaks, aggregation.time_series_for_low_peaks)
+        hasher.update(repr(settings).encode())
+        return hasher.hexdigest()
+
+
 class TimeSeriesCollection:
     def __init__(self,
                  time_series_list: List[TimeSeries]):
@@ -255,7 +321,8 @@ class AggregationParameters:
                  percentage_of_period_freedom: float = 0,
                  penalty_of_period_freedom: float = 0,
                  time_series_for_high_peaks: Optional[List[TimeSeriesData]] = None,
-                 time_series_for_low_peaks: Optional[List[TimeSeriesData]] = None
+                 time_series_for_low_peaks: Optional[List[TimeSeriesData]] = None,
+                 use_index_aliasing: bool = False
                  ):
         """
         Initializes aggregation parameters for time series data
@@ -283,6 +350,10 @@ class AggregationParameters:
             List of time series to use for explicitly selecting periods with high values.
         time_series_for_low_peaks : list of TimeSeriesData, optional
             List of time series to use for explicitly selecting periods with low values.
+        use_index_aliasing : bool, optional
+            If True, equated time steps share one variable in the solver instead of being equated by equations.
+            This reduces the number of variables and equations of the model. Binary variables with
+            percentage_of_period_freedom > 0 are still equated by equations. Default is False.
         """
         self.hours_per_period = hours_per_period
         self.nr_of_periods = nr_of_periods
@@ -292,6 +363,7 @@ class AggregationParameters:
         self.penalty_of_period_freedom = penalty_of_period_freedom
         self.time_series_for_high_peaks: List[TimeSeriesData] = time_series_for_high_peaks or []
         self.time_series_for_low_peaks: List[TimeSeriesData] = time_series_for_low_peaks or []
+        self.use_index_aliasing = use_index_aliasing
 
     @property
     def use_extreme_periods(self):
@@ -347,7 +419,10 @@ class AggregationModel(ElementModel):
                 all_relevant_variables = [v for v in all_variables_of_component.values() if
                                           isinstance(v, VariableTS) and v.is_binary]
             for variable in all_relevant_variables:
-                self.equate_indices(variable, indices, system_model)
+                if self._use_index_aliasing(variable):
+                    variable.alias_indices(indices[1], indices[0])
+                else:
+                    self.equate_indices(variable, indices, system_model)
 
         penalty = self.aggregation_parameters.penalty_of_period_freedom
         if (self.aggregation_parameters.percentage_of_period_freedom > 0) and penalty != 0:
@@ -355,6 +430,12 @@ class AggregationModel(ElementModel):
                 system_model.effect_collection_model.add_share_to_penalty(f'Penalty_{label}', self.element, variable,
                                                                           penalty)
 
+    def _use_index_aliasing(self, variable: Variable) -> bool:
+        """ Binary variables with freedom between periods need the equations for their correction variables """
+        if not self.aggregation_parameters.use_index_aliasing:
+            return False
+        return not (variable.is_binary and self.aggregation_parameters.percentage_of_period_freedom > 0)
+
     def equate_indices(self, variable: Variable,
                        indices: Tuple[np.ndarray, np.ndarray],
                        system_model: SystemModel) -> Equation:
@@ -395,3 +476,125 @@ class AggregationModel(ElementModel):
             eq_max.add_summand(var_K0, 1, as_sum=True)
             eq_max.add_constant(round(self.aggregation_parameters.percentage_of_period_freedom / 100 * var_K1.length))  # Maximum
         return eq
+
+
+def sweep_aggregation_settings(original_data: 'pd.DataFrame',
+                               hours_per_time_step: Skalar,
+                               hours_per_period: List[Skalar],
+                               nr_of_periods: List[int],
+                               weights: Optional[Dict[str, float]] = None,
+                               time_series_for_high_peaks: Optional[List[str]] = None,
+                               time_series_for_low_peaks: Optional[List[str]] = None,
+                               metric: Literal['RMSE', 'RMSE_duration', 'MAE'] = 'RMSE',
+                               threshold: Optional[Union[float, Dict[str, float]]] = None,
+                               max_workers: Optional[int] = None
+                               ) -> Tuple['pd.DataFrame', Optional[Dict[str, Any]]]:
+    """
+    Clusters the data for every combination of hours_per_period and nr_of_periods in parallel worker processes and
+    evaluates the accuracy of each clustering. No optimization model is built. This helps to choose the
+    AggregationParameters before running an AggregatedCalculation.
+
+    Parameters
+    ----------
+    original_data : pd.DataFrame
+        timeseries of the data with a datetime index, e.g. pd.DataFrame(time_series_collection.data, index=...)
+    hours_per_time_step : Skalar
+        duration of a time step in hours
+    hours_per_period : list of Skalar
+        values of hours_per_period to evaluate
+    nr_of_periods : list of int
+        values of nr_of_periods to evaluate
+    weights : dict, optional
+        aggregation weights per column, e.g. TimeSeriesCollection.weights. Used for clustering and to average the
+        errors of the single columns.
+    time_series_for_high_peaks, time_series_for_low_peaks : list of str, optional
+        labels of the columns to use for extreme periods
+    metric : 'RMSE', 'RMSE_duration' or 'MAE'
+        error metric to compare with the threshold. 'RMSE_duration' is the RMSE of the duration curves.
+        All metrics are computed by tsam on the normalized data.
+    threshold : float or dict, optional
+        maximum allowed value of the weighted mean of the metric, or of the metric of single columns
+        ({column: maximum}).
+    max_workers : int, optional
+        number of worker processes. If None, the number of processors is used. If 1, no processes are spawned.
+        The data is sent to each worker process once.
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, Optional[dict]]
+        A table with one row per setting (columns: hours_per_period, nr_of_periods, nr_of_extreme_periods,
+        aggregated_hours, RMSE, RMSE_duration, MAE, clustering_duration_seconds, error, and the metrics per column
+        like 'RMSE [column]'), sorted by aggregated_hours and the metric. aggregated_hours includes the extreme
+        periods added by tsam. And the smallest setting (least aggregated hours) meeting the threshold as a row-dict,
+        or None if no threshold was given or no setting meets it.
+    """
+    if weights is not None:  # tsam needs a weight for every column
+        weights = {column: weights.get(column, 1) for column in original_data.columns}
+    data = dict(original_data=original_data, hours_per_time_step=hours_per_time_step, weights=weights,
+                time_series_for_high_peaks=time_series_for_high_peaks,
+                time_series_for_low_peaks=time_series_for_low_peaks)
+    settings = list(itertools.product(hours_per_period, nr_of_periods))
+
+    if max_workers == 1:
+        _init_sweep_worker(data)
+        try:
+            rows = [_evaluate_aggregation(setting) for setting in settings]
+        finally:
+            _init_sweep_worker(None)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=_init_sweep_worker,
+                                                    initargs=(data,)) as executor:
+            rows = list(executor.map(_evaluate_aggregation, settings))
+
+    import pandas as pd
+    table = pd.DataFrame(rows).sort_values(['aggregated_hours', metric], ignore_index=True)
+    if threshold is None:
+        return table, None
+    if isinstance(threshold, dict):
+        valid = table[np.all([table[f'{metric} [{column}]'] <= maximum for column, maximum in threshold.items()],
+                             axis=0)]
+    else:
+        valid = table[table[metric] <= threshold]
+    if valid.empty:
+        logger.warning(f'No aggregation setting meets {metric} <= {threshold}')
+        return table, None
+    return table, valid.iloc[0].to_dict()
+
+
+_sweep_data: Optional[Dict[str, Any]] = None  # Data of sweep_aggregation_settings(), set once per worker process
+
+
+def _init_sweep_worker(data: Optional[Dict[str, Any]]) -> None:
+    global _sweep_data
+    _sweep_data = data
+
+
+def _evaluate_aggregation(setting: Tuple[Skalar, int]) -> Dict[str, Any]:
+    """ Clusters the data with the given setting and returns the accuracy indicators of tsam, per column and mean """
+    hours_per_period, nr_of_periods = setting
+    row = {'hours_per_period': hours_per_period,
+           'nr_of_periods': nr_of_periods,
+           'nr_of_extreme_periods': 0,
+           'aggregated_hours': hours_per_period * nr_of_periods,
+           'RMSE': np.nan, 'RMSE_duration': np.nan, 'MAE': np.nan,
+           'clustering_duration_seconds': np.nan, 'error': None}
+    try:
+        aggregation = Aggregation(hours_per_period=hours_per_period, nr_of_periods=nr_of_periods, **_sweep_data)
+        aggregation.cluster()
+        indicators = aggregation.tsam.accuracyIndicators()
+    except Exception as e:  # A single invalid setting should not stop the whole sweep
+        row['error'] = f'{e.__class__.__name__}: {e}'
+        return row
+
+    # Extreme periods are added as new typical periods, which are part of the model as well
+    nr_of_typical_periods = len(aggregation.tsam.clusterPeriodNoOccur)
+    row['nr_of_extreme_periods'] = nr_of_typical_periods - nr_of_periods
+    row['aggregated_hours'] = hours_per_period * nr_of_typical_periods
+    weights = [(_sweep_data['weights'] or {}).get(column, 1) for column in indicators.index]
+    for indicator in ('RMSE', 'RMSE_duration', 'MAE'):
+        row[indicator] = float(np.average(indicators[indicator], weights=weights))
+    row['clustering_duration_seconds'] = aggregation.clustering_duration_seconds
+    for indicator in ('RMSE', 'RMSE_duration', 'MAE'):
+        for column, value in indicators[indicator].items():
+            row[f'{indicator} [{column}]'] = float(value)
+    return row
@@ -5,29 +5,221 @@ developed by Felix Panitz* and Peter Stange*
 * at Chair of Building Energy Systems and Heat Supply, Technische Universität Dresden
 """
 
+import concurrent.futures
+import copy
 import datetime
 import logging
 import math
+import os
 import pathlib
 import timeit
-from typing import List, Dict, Optional, Literal, Union, Any
+from typing import List, Dict, Optional, Literal, Union, Any, TYPE_CHECKING
 
 import numpy as np
 
-from .aggregation import TimeSeriesCollection, AggregationParameters, AggregationModel
-from .core import Numeric, Skalar
-from .structure import SystemModel
+from .aggregation import TimeSeriesCollection, AggregationParameters, AggregationModel, ClusteringCache
+from .core import Numeric, Skalar, float_dtype
+from .structure import SystemModel, ResultFilter
 from .flow_system import FlowSystem
 from .elements import Component
 from .components import Storage
-from .features import InvestmentModel
+from .features import InvestmentModel, SingleShareModel
+from .math_modeling import Variable, VariableTS, Equation, Inequation, SumOfSummand
 from .solvers import Solver
 from . import utils as utils
 
+if TYPE_CHECKING:  # pandas is imported on first use, as it is slow to import
+    import pandas as pd
 
 logger = logging.getLogger('flixOpt')
 
 
+class ResultCache(utils.PickleCache):
+    """
+    Cache for the results of solved Calculations, keyed by Calculation.fingerprint().
+    The entries are held in memory and optionally pickled to a directory, so they survive between python sessions.
+    If the stored results exceed max_megabytes, the least recently used entries are evicted.
+    """
+    name_of_entries = 'results'
+
+    def __init__(self, max_megabytes: float = 256, path: Optional[Union[str, pathlib.Path]] = None):
+        """
+        Parameters
+        ----------
+        max_megabytes : float
+            Maximum size of the results to keep in memory (and on disk, if a path is given).
+        path : str, pathlib.Path or None
+            Directory to store the results in. If None, the results are only held in memory.
+        """
+        super().__init__(int(max_megabytes * 1024 ** 2), path)
+
+    @property
+    def max_bytes(self) -> int:
+        return self.max_size
+
+    @max_bytes.setter
+    def max_bytes(self, value: int):
+        self.max_size = value
+
+    @property
+    def nbytes(self) -> int:
+        """ Size of the results held in memory """
+        return sum(self._sizes.values())
+
+    def _size_of(self, entry: Dict[str, Any]) -> int:
+        return sum(np.asarray(result).nbytes for result in entry['variables'])
+
+    def _size_of_file(self, file: pathlib.Path) -> int:
+        return file.stat().st_size
+
+
+class SweepParameter:
+    """
+    A parameter, which is varied in a sweep (see FullCalculation.sweep()). Only the bounds or factors affected by the
+    parameter are changed in the translated model, so the model is built only once.
+    Create it with effect_limit(), share_factor(), fixed_size() or flow_rate_max(). Elements are referenced by their
+    labels, so the parameter can be sent to worker processes.
+
+    Examples
+    --------
+    >>> SweepParameter.effect_limit('CO2', 'maximum_total')  # CO2 cap
+    >>> SweepParameter.share_factor('Gastarif__Q_Gas', 'costs')  # Factor on the gas price
+    >>> SweepParameter.fixed_size('Speicher')  # Fixed size of an investment
+    >>> SweepParameter.flow_rate_max('Kessel__Q_th')  # Maximum flow rate, e.g. 0 to disable a boiler
+    """
+    _LIMITS = {'minimum_operation': ('operation', 'lower_bound'), 'maximum_operation': ('operation', 'upper_bound'),
+               'minimum_invest': ('invest', 'lower_bound'), 'maximum_invest': ('invest', 'upper_bound'),
+               'minimum_total': ('all', 'lower_bound'), 'maximum_total': ('all', 'upper_bound')}
+
+    def __init__(self,
+                 kind: Literal['effect_limit', 'share_factor', 'fixed_size', 'flow_rate_max'],
+                 element_label: str,
+                 effect_label: Optional[str] = None,
+                 limit: Optional[str] = None,
+                 share: Optional[str] = None):
+        assert limit is None or limit in self._LIMITS, f'Unknown limit {limit}. Choose from {list(self._LIMITS)}'
+        self.kind = kind
+        self.element_label = element_label
+        self.effect_label = effect_label
+        self.limit = limit
+        self.share = share
+        self._original: Optional[Dict[str, Any]] = None  # Values of the model before the first apply()
+
+    @classmethod
+    def effect_limit(cls, effect_label: str, limit: Literal['minimum_operation', 'maximum_operation',
+                                                           'minimum_invest', 'maximum_invest',
+                                                           'minimum_total', 'maximum_total']) -> 'SweepParameter':
+        """ A limit of an Effect, e.g. a CO2 cap """
+        return cls('effect_limit', effect_label, limit=limit)
+
+    @classmethod
+    def share_factor(cls, element_label: str, effect_label: str,
+                     share: str = 'effects_per_flow_hour') -> 'SweepParameter':
+        """
+        A factor on a share of an Element to an Effect, e.g. on the gas price of a Flow (effects_per_flow_hour).
+        Other shares are 'specific_effects' and 'fix_effects' of investments or 'running_hour_effects' and
+        'switch_on_effects' of OnOffParameters. A value of 1 is the original share.
+        """
+        return cls('share_factor', element_label, effect_label=effect_label, share=share)
+
+    @classmethod
+    def fixed_size(cls, element_label: str) -> 'SweepParameter':
+        """ The size of an investment (of a Flow or Storage) is fixed to the value """
+        return cls('fixed_size', element_label)
+
+    @classmethod
+    def flow_rate_max(cls, flow_label: str) -> 'SweepParameter':
+        """ An upper bound of the flow rate of a Flow in all time steps, e.g. 0 to disable it """
+        return cls('flow_rate_max', flow_label)
+
+    def to_dict(self) -> Dict[str, Optional[str]]:
+        """ The definition of the parameter (without the state of a model), e.g. to send it as JSON """
+        return {'kind': self.kind, 'element_label': self.element_label, 'effect_label': self.effect_label,
+                'limit': self.limit, 'share': self.share}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Optional[str]]) -> 'SweepParameter':
+        return cls(**data)
+
+    @property
+    def label(self) -> str:
+        if self.kind == 'effect_limit':
+            return f'{self.element_label}__{self.limit}'
+        elif self.kind == 'share_factor':
+            return f'{self.element_label}__{self.share}__{self.effect_label}'
+        elif self.kind == 'flow_rate_max':
+            return f'{self.element_label}__flow_rate_max'
+        return f'{self.element_label}__size'
+
+    def apply(self, system_model: SystemModel, value: Skalar) -> None:
+        """ Changes the translated model of the SystemModel to the value of the parameter """
+        part = self._part_of(system_model)
+        if self._original is None:
+            self._original = self._state_of(part)
+        if self.kind == 'effect_limit':
+            setattr(part, self._LIMITS[self.limit][1], value)
+        elif self.kind == 'fixed_size':
+            part.fixed_value, part.fixed = value, True
+        elif self.kind == 'flow_rate_max':  # Also the lower bounds, else a value of 0 is infeasible for them
+            part.upper_bound = np.minimum(_bound_or(self._original['upper_bound'], np.inf), value)
+            part.lower_bound = np.minimum(_bound_or(self._original['lower_bound'], -np.inf), value)
+        else:  # All summands and the constant of the share are scaled, except the share itself
+            for summand, factor_vec in zip(part.summands[1:], self._original['factor_vecs']):
+                summand.factor_vec = factor_vec * value
+            part.constant = np.multiply(self._original['constant'], value)
+        system_model.update(part)
+
+    def reset(self, system_model: SystemModel) -> None:
+        """ Restores the model of the SystemModel to the state before the first apply() """
+        if self._original is None:
+            return
+        part = self._part_of(system_model)
+        if self.kind == 'share_factor':
+            for summand, factor_vec in zip(part.summands[1:], self._original['factor_vecs']):
+                summand.factor_vec = factor_vec
+            part.constant = self._original['constant']
+        else:
+            for name, value in self._original.items():
+                setattr(part, name, value)
+        system_model.update(part)
+        self._original = None
+
+    def _part_of(self, system_model: SystemModel) -> Union[Variable, Equation]:
+        element = system_model.flow_system.element_by_label(self.element_label)
+        if self.kind == 'effect_limit':
+            return getattr(element.model, self._LIMITS[self.limit][0]).sum
+        elif self.kind == 'flow_rate_max':
+            return element.model.flow_rate
+        elif self.kind == 'fixed_size':
+            for model in system_model.sub_models:
+                if isinstance(model, InvestmentModel) and model.element is element:
+                    return model.size
+            raise ValueError(f'Element "{self.element_label}" has no investment')
+        effect = system_model.flow_system.element_by_label(self.effect_label)
+        label_of_share = f'{element.label_full}__{self.share}'
+        for model in effect.model.all_sub_models:
+            if isinstance(model, SingleShareModel) and model.label_short == label_of_share:
+                return model.single_equation
+        raise ValueError(f'No share "{self.share}" of "{self.element_label}" to Effect "{self.effect_label}"')
+
+    def _state_of(self, part: Union[Variable, Equation]) -> Dict[str, Any]:
+        if self.kind == 'effect_limit':
+            name = self._LIMITS[self.limit][1]
+            return {name: getattr(part, name)}
+        elif self.kind == 'fixed_size':
+            return {'fixed_value': part.fixed_value, 'fixed': part.fixed}
+        elif self.kind == 'flow_rate_max':
+            return {'lower_bound': part.lower_bound, 'upper_bound': part.upper_bound}
+        return {'factor_vecs': [summand.factor_vec for summand in part.summands[1:]], 'constant': part.constant}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.label})'
+
+
+def _bound_or(bound: Optional[Numeric], default: float) -> Numeric:
+    return default if bound is None else bound
+
+
 class Calculation:
     """
     class for defined way of solving a flow_system optimization
@@ -53,6 +245,8 @@ class Calculation:
         self.time_indices = time_indices
 
         self.system_model: Optional[SystemModel] = None
+        self.result_filter: Optional[ResultFilter] = None
+        self.marginal_values = False
         self.durations = {'modeling': 0.0, 'solving': 0.0, 'saving': 0.0}  # Dauer der einzelnen Dinge
 
         self._paths: Dict[str, Optional[Union[pathlib.Path, List[pathlib.Path]]]] = {'log': None, 'data': None, 'info': None}
@@ -109,6 +303,63 @@ class Calculation:
             self._results = self.system_model.results()
         return self._results
 
+    def fingerprint(self, solver: Solver) -> str:
+        """
+        Content hash of everything that determines the results of the Calculation: The FlowSystem (topology,
+        parameters and time series), the time indices, the type of Calculation and the settings of the solver.
+        """
+        from .serialization import fingerprint
+        return fingerprint(self.flow_system, self._fingerprint_settings(solver))
+
+    def _fingerprint_settings(self, solver: Solver) -> Dict[str, Any]:
+        return {'calculation': self.__class__.__name__,
+                'modeling_language': self.modeling_language,
+                'time_indices': list(self.time_indices) if self.time_indices is not None else None,
+                'precision': np.dtype(float_dtype()).name,
+                'solver': solver.__class__.__name__,
+                'solver_settings': solver.settings,
+                'result_filter': repr(self.result_filter) if self.result_filter is not None else None,
+                'marginal_values': self.marginal_values}
+
+    def _solve_with_cache(self, solver: Solver, cache: Optional[ResultCache]) -> None:
+        """ Solves the SystemModel or, if the cache holds results with the same fingerprint, loads them """
+        if cache is None:
+            self.system_model.solve(solver, result_filter=self.result_filter, marginal_values=self.marginal_values)
+            return
+        key = self.fingerprint(solver)
+        entry = cache.get(key)
+        self.durations['results_from_cache'] = entry is not None
+        if entry is None:
+            self.system_model.solve(solver, result_filter=self.result_filter, marginal_values=self.marginal_values)
+            cache.put(key, {'variables': [variable.result for variable in self.system_model.variables],
+                            'duals': [constraint.dual for constraint in self.system_model.marginal_constraints],
+                            'reduced_costs': [variable.reduced_cost
+                                              for variable in self.system_model.marginal_variables],
+                            'objective': self.system_model.result_of_objective,
+                            'solver': {'objective': solver.objective,
+                                       'best_bound': solver.best_bound,
+                                       'termination_message': solver.termination_message}})
+            return
+
+        if len(entry['variables']) != len(self.system_model.variables):
+            raise ValueError(f'The cached results of "{self.name}" do not match its model: '
+                             f'{len(entry["variables"])} instead of {len(self.system_model.variables)} variables')
+        for variable, result in zip(self.system_model.variables, entry['variables']):
+            variable.result = result
+        if (len(entry['duals']) != len(self.system_model.marginal_constraints) or
+                len(entry['reduced_costs']) != len(self.system_model.marginal_variables)):
+            raise ValueError(f'The cached marginal values of "{self.name}" do not match its model')
+        for constraint, dual in zip(self.system_model.marginal_constraints, entry['duals']):
+            constraint.dual = dual
+        for variable, reduced_cost in zip(self.system_model.marginal_variables, entry['reduced_costs']):
+            variable.reduced_cost = reduced_cost
+        self.system_model.result_of_objective = entry['objective']
+        self.system_model.result_filter = self.result_filter
+        self.system_model.solver = solver
+        for name, value in entry['solver'].items():
+            setattr(solver, name, value)
+        logger.info(f'Loaded results of "{self.name}" from cache. Objective: {entry["objective"]:.2f}')
+
     @property
     def infos(self):
         return {
@@ -116,6 +367,7 @@ class Calculation:
             'Number of indices': len(self.time_indices) if self.time_indices else 'all',
             'Calculation Type': self.__class__.__name__,
             'Durations': self.durations,
+            'Result Filter': repr(self.result_filter) if self.result_filter is not None else None,
         }
 
 
@@ -128,8 +380,7 @@ class FullCalculation(Calculation):
         t_start = timeit.default_timer()
 
         self.flow_system.transform_data()
-        for time_series in self.flow_system.all_time_series:
-            time_series.activate_indices(self.time_indices)
+        self.flow_system.activate_indices(self.time_indices)
 
         self.system_model = SystemModel(self.name, self.modeling_language, self.flow_system, self.time_indices)
         self.system_model.do_modeling()
@@ -138,16 +389,176 @@ class FullCalculation(Calculation):
         self.durations['modeling'] = round(timeit.default_timer() - t_start, 2)
         return self.system_model
 
-    def solve(self, solver: Solver, save_results: Union[bool, str, pathlib.Path] = False):
+    def solve(self, solver: Solver, save_results: Union[bool, str, pathlib.Path] = False,
+              cache: Optional[ResultCache] = None, result_filter: Optional[ResultFilter] = None,
+              marginal_values: bool = False):
+        """
+        Parameters
+        ----------
+        solver : Solver
+            The solver to use. Choose from flixOpt.solvers
+        save_results : bool, str or pathlib.Path
+            If and where to save the results
+        cache : ResultCache or None
+            If given, the results are loaded from the cache instead of solving, if the cache holds the results of an
+            identical Calculation (see Calculation.fingerprint()). Otherwise, the results are stored in the cache.
+        result_filter : ResultFilter or None
+            If given, only the results of the selected variables are extracted from the solver and saved.
+            The main results (effects, penalty, excess and invested sizes) are always extracted.
+        marginal_values : bool
+            If True, the duals of the bus and storage balances and the reduced costs of the effect totals and invested
+            sizes are stored in the results of the elements ('..._dual', '..._reduced_cost').
+            For MILPs, the binaries are fixed to their solution and the LP is solved once more.
+        """
+        self.result_filter = result_filter
+        self.marginal_values = marginal_values
         self._define_path_names(save_results)
         t_start = timeit.default_timer()
         solver.logfile_name = self._paths['log']
-        self.system_model.solve(solver)
+        self._solve_with_cache(solver, cache)
         self.durations['solving'] = round(timeit.default_timer() - t_start, 2)
 
         if save_results:
             self._save_solve_infos()
 
+    def sweep(self, solver: Solver, parameter: SweepParameter, values: List[Skalar],
+              max_workers: Optional[int] = 1, with_results: bool = False) -> 'pd.DataFrame':
+        """
+        Solves the Calculation for every value of the parameter. The model is built once and only the bounds or
+        factors affected by the parameter are changed between the solves. Each solve starts from the solution of
+        the previous one (see Solver.warm_start). Only the variables of the main results are extracted.
+
+        Parameters
+        ----------
+        solver : Solver
+            The solver to use. Choose from flixOpt.solvers
+        parameter : SweepParameter
+            The parameter to vary, e.g. SweepParameter.effect_limit('CO2', 'maximum_total')
+        values : list of Skalar
+            The values of the parameter. Neighbouring values should lead to similar solutions for good warm starts.
+        max_workers : int, optional
+            Number of worker processes. The values are split into contiguous chunks, one per worker. Each worker
+            builds the model once. If None, the number of processors is used. If 1, no processes are spawned.
+        with_results : bool
+            If True, all variables are extracted and the results of every value (see Calculation.results()) are
+            stored in the column 'results'.
+
+        Returns
+        -------
+        pd.DataFrame
+            A table with one row per value: The value, the objective, the lower bound, the penalty, the totals of all
+            effects, the invested sizes, the termination message, the solving duration and an error, if the solve
+            failed (e.g. infeasible).
+        """
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if max_workers == 1 or len(values) <= 1:
+            if self.system_model is None:
+                self.do_modeling()
+            rows = self._sweep(solver, parameter, values, with_results)
+        else:
+            solver = copy.copy(solver)
+            solver._solver, solver._results = None, None  # State of previous solves is not sent to the processes
+            settings = [dict(flow_system=self.flow_system.to_bytes(), name=f'{self.name}_{i}',
+                             modeling_language=self.modeling_language, time_indices=self.time_indices,
+                             solver=solver, parameter=parameter, values=chunk.tolist(), with_results=with_results)
+                        for i, chunk in enumerate(np.array_split(np.asarray(values), min(max_workers, len(values))))]
+            # Forking is avoided, as solver threads of previous solves (e.g. HiGHS) would deadlock in the workers
+            import multiprocessing
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            with concurrent.futures.ProcessPoolExecutor(max_workers=len(settings),
+                                                        mp_context=multiprocessing.get_context(start_method)
+                                                        ) as executor:
+                rows = [row for chunk_rows in executor.map(_sweep_chunk, settings) for row in chunk_rows]
+
+        import pandas as pd
+        return pd.DataFrame(rows)
+
+    def _sweep(self, solver: Solver, parameter: SweepParameter, values: List[Skalar],
+               with_results: bool = False) -> List[Dict[str, Any]]:
+        warm_start, solver.warm_start = solver.warm_start, True
+        rows = []
+        try:
+            for value in values:
+                parameter.apply(self.system_model, value)
+                row = {parameter.label: value}
+                t_start = timeit.default_timer()
+                try:
+                    self.system_model.solve(solver, result_filter=None if with_results else
+                                            ResultFilter(variables=[]))  # Main results only
+                except Exception as e:  # A single infeasible value should not stop the whole sweep
+                    logger.warning(f'Sweep of {parameter.label} failed for {value}: {e}')
+                    row['error'] = f'{e.__class__.__name__}: {e}'
+                else:
+                    row.update(_main_results_as_row(self.system_model.main_results))
+                    row['termination_message'] = solver.termination_message
+                    if with_results:
+                        row['results'] = self.system_model.results()
+                row['solving_duration_seconds'] = round(timeit.default_timer() - t_start, 2)
+                rows.append(row)
+        finally:
+            parameter.reset(self.system_model)
+            solver.warm_start = warm_start
+        return rows
+
+    def pareto_front(self, solver: Solver, effect_label: str, nr_of_points: int = 10,
+                     max_workers: Optional[int] = 1, with_results: bool = False,
+                     tolerance: float = 1e-6) -> 'pd.DataFrame':
+        """
+        Computes the pareto front between the objective effect and another effect (e.g. costs and CO2) with the
+        epsilon-constraint method. First, the anchor points are computed by minimizing each of both effects. Then,
+        the objective is minimized for nr_of_points limits of the other effect between both anchors.
+        Only the maximum_total of the other effect is changed between the points (see sweep()).
+
+        Parameters
+        ----------
+        solver : Solver
+            The solver to use. Choose from flixOpt.solvers
+        effect_label : str
+            Label of the second effect, e.g. 'CO2'.
+        nr_of_points : int
+            Number of points of the front, including both anchors.
+        max_workers : int, optional
+            Number of worker processes for the points (see sweep()).
+        with_results : bool
+            If True, the results of every point are stored in the column 'results' (see sweep()).
+        tolerance : float
+            Relative tolerance added to the limits of the other effect. The anchors are solutions within the
+            feasibility tolerances of the solver, so using them as exact limits can make the points infeasible.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per point, from the minimum of the objective effect to the minimum of the other effect.
+            See sweep() for the columns.
+        """
+        assert nr_of_points >= 2, 'The pareto front needs at least the two anchor points'
+        if self.system_model is None:
+            self.do_modeling()
+        effect_collection_model = self.system_model.effect_collection_model
+        effect = self.flow_system.element_by_label(effect_label)
+        assert effect is not self.flow_system.effect_collection.objective_effect, \
+            'The second effect must differ from the objective effect'
+
+        warm_start, solver.warm_start = solver.warm_start, True
+        try:
+            self.system_model.solve(solver, result_filter=ResultFilter(variables=[]))
+            maximum = float(effect.model.all.sum.result)
+            effect_collection_model.set_objective(effect)
+            self.system_model.update(effect_collection_model.objective)
+            self.system_model.solve(solver, result_filter=ResultFilter(variables=[]))
+            minimum = float(effect.model.all.sum.result)
+        finally:
+            effect_collection_model.set_objective(self.flow_system.effect_collection.objective_effect)
+            self.system_model.update(effect_collection_model.objective)
+            solver.warm_start = warm_start
+        logger.info(f'Anchor points of the pareto front: {effect_label} from {maximum:.2f} to {minimum:.2f}')
+
+        limits = np.linspace(maximum, minimum, nr_of_points)
+        limits += tolerance * np.maximum(np.abs(limits), 1)
+        return self.sweep(solver, SweepParameter.effect_limit(effect_label, 'maximum_total'),
+                          limits.tolist(), max_workers, with_results)
+
 
 class AggregatedCalculation(Calculation):
     """
@@ -158,7 +569,9 @@ class AggregatedCalculation(Calculation):
                  aggregation_parameters: AggregationParameters,
                  components_to_clusterize: Optional[List[Component]] = None,
                  modeling_language: Literal["pyomo", "cvxpy"] = "pyomo",
-                 time_indices: Optional[Union[range, List[int]]] = None):
+                 time_indices: Optional[Union[range, List[int]]] = None,
+                 clustering_cache: Optional[ClusteringCache] = None,
+                 plot_aggregation: bool = False):
         """
         Class for Optimizing the FLowSystem including:
             1. Aggregating TimeSeriesData via typical periods using tsam.
@@ -179,18 +592,32 @@ class AggregatedCalculation(Calculation):
             choose optimization modeling language
         time_indices : List[int] or None
             list with indices, which should be used for calculation. If None, then all timesteps are used.
+        clustering_cache : ClusteringCache or None
+            Cache for the clustering results, e.g. shared by the AggregatedCalculations of a study. Pass a
+            ClusteringCache with a path to also store clusterings on disk. If None (default), nothing is cached.
+        plot_aggregation : bool
+            If True, the original and the aggregated data are plotted and shown after the clustering.
+            Default is False, so no plotting libraries are needed (e.g. in batch jobs).
         """
         super().__init__(name, flow_system, modeling_language, time_indices)
+        if flow_system.scenarios is not None:
+            raise NotImplementedError('AggregatedCalculation does not support FlowSystems with scenarios')
         self.aggregation_parameters = aggregation_parameters
+        self.clustering_cache = clustering_cache
+        self.plot_aggregation = plot_aggregation
         self.components_to_clusterize = components_to_clusterize
         self.time_series_for_aggregation = None
         self.aggregation = None
         self.time_series_collection: Optional[TimeSeriesCollection] = None
 
+    def _fingerprint_settings(self, solver: Solver) -> Dict[str, Any]:
+        return {**super()._fingerprint_settings(solver),
+                'aggregation_parameters': self.aggregation_parameters,
+                'components_to_clusterize': self.components_to_clusterize}
+
     def do_modeling(self) -> SystemModel:
         self.flow_system.transform_data()
-        for time_series in self.flow_system.all_time_series:
-            time_series.activate_indices(self.time_indices)
+        self.flow_system.activate_indices(self.time_indices)
 
         from .aggregation import Aggregation
 
@@ -212,10 +639,13 @@ class AggregatedCalculation(Calculation):
         logger.info(f'{"":#^80}')
         logger.info(f'{" Aggregating TimeSeries Data ":#^80}')
 
-        self.time_series_collection = TimeSeriesCollection([ts for ts in self.flow_system.all_time_series if ts.is_array])
-
-        import pandas as pd
-        original_data = pd.DataFrame(self.time_series_collection.data, index=chosenTimeSeries)
+        store = self.flow_system.time_series_store
+        # Memory-mapped TimeSeries are not part of the store. Their active indices are read for the aggregation
+        memory_mapped_time_series = [ts for ts in self.flow_system.all_time_series if ts.is_memory_mapped]
+        self.time_series_collection = TimeSeriesCollection(store.time_series + memory_mapped_time_series)
+        original_data = store.to_dataframe(index=chosenTimeSeries)
+        for time_series in memory_mapped_time_series:
+            original_data[time_series.label] = time_series.active_data
 
         # Aggregation - creation of aggregated timeseries:
         self.aggregation = Aggregation(original_data=original_data,
@@ -224,14 +654,19 @@ class AggregatedCalculation(Calculation):
                                             nr_of_periods=self.aggregation_parameters.nr_of_periods,
                                             weights=self.time_series_collection.weights,
                                             time_series_for_high_peaks=self.aggregation_parameters.labels_for_high_peaks,
-                                            time_series_for_low_peaks=self.aggregation_parameters.labels_for_low_peaks)
+                                            time_series_for_low_peaks=self.aggregation_parameters.labels_for_low_peaks,
+                                            cache=self.clustering_cache)
 
         self.aggregation.cluster()
-        self.aggregation.plot()
+        if self.plot_aggregation:
+            self.aggregation.plot()
         if self.aggregation_parameters.aggregate_data_and_fix_non_binary_vars:
-            self.time_series_collection.insert_data(  # Converting it into a dict with labels as keys
-                {col: np.array(values) for col, values in self.aggregation.aggregated_data.to_dict(orient='list').items()})
+            store.insert_aggregated_data(self.aggregation.aggregated_data)
+            for time_series in memory_mapped_time_series:
+                time_series.aggregated_data = self.aggregation.aggregated_data[time_series.label].to_numpy(
+                    dtype=float_dtype())
         self.durations['aggregation'] = round(timeit.default_timer() - t_start_agg, 2)
+        self.durations['clustering_from_cache'] = self.aggregation.clustering_from_cache
 
         # Model the System
         t_start = timeit.default_timer()
@@ -249,11 +684,33 @@ class AggregatedCalculation(Calculation):
         self.durations['modeling'] = round(timeit.default_timer() - t_start, 2)
         return self.system_model
 
-    def solve(self, solver: Solver, save_results: Union[bool, str, pathlib.Path] = False):
+    def solve(self, solver: Solver, save_results: Union[bool, str, pathlib.Path] = False,
+              cache: Optional[ResultCache] = None, result_filter: Optional[ResultFilter] = None,
+              marginal_values: bool = False):
+        """
+        Parameters
+        ----------
+        solver : Solver
+            The solver to use. Choose from flixOpt.solvers
+        save_results : bool, str or pathlib.Path
+            If and where to save the results
+        cache : ResultCache or None
+            If given, the results are loaded from the cache instead of solving, if the cache holds the results of an
+            identical Calculation (see Calculation.fingerprint()). Otherwise, the results are stored in the cache.
+        result_filter : ResultFilter or None
+            If given, only the results of the selected variables are extracted from the solver and saved.
+            The main results (effects, penalty, excess and invested sizes) are always extracted.
+        marginal_values : bool
+            If True, the duals of the bus and storage balances and the reduced costs of the effect totals and invested
+            sizes are stored in the results of the elements ('..._dual', '..._reduced_cost').
+            For MILPs, the binaries are fixed to their solution and the LP is solved once more.
+        """
+        self.result_filter = result_filter
+        self.marginal_values = marginal_values
         self._define_path_names(save_results)
         t_start = timeit.default_timer()
         solver.logfile_name = self._paths['log']
-        self.system_model.solve(solver)
+        self._solve_with_cache(solver, cache)
         self.durations['solving'] = round(timeit.default_timer() - t_start, 2)
 
         if save_results:
@@ -295,6 +752,8 @@ class SegmentedCalculation(Calculation):
 
         """
         super().__init__(name, flow_system, modeling_language, time_indices)
+        if flow_system.scenarios is not None:
+            raise NotImplementedError('SegmentedCalculation does not support FlowSystems with scenarios')
         self.segment_length = segment_length
         self.overlap_length = overlap_length
         self._total_length = len(self.time_indices) if self.time_indices is not None else len(flow_system.time_series)
@@ -412,6 +871,263 @@ class SegmentedCalculation(Calculation):
             **self._transfered_start_values}
 
 
+class RecedingHorizonCalculation(FullCalculation):
+    """
+    Online operation (model predictive control): One model of the length of the horizon is built and translated once.
+    Every step() shifts the window by step_length time steps and re-solves the model, starting from the previous
+    solution (see Solver.warm_start). The model is not translated again: The Elements compute the bounds, factors and
+    constants of the new window (time series data, forecasts and start values) in an untranslated SystemModel, and only
+    the changed indices of Variables and the changed rows of Constraints are replaced in the translated model. The
+    solver instance (HiGHS) is kept and only receives these changes.
+    """
+
+    def __init__(self, name, flow_system: FlowSystem,
+                 horizon: int,
+                 step_length: int = 1,
+                 start_index: int = 0,
+                 modeling_language: Literal["pyomo", "cvxpy"] = "pyomo"):
+        """
+        Parameters
+        ----------
+        name : str
+            name of calculation
+        flow_system : FlowSystem
+            flow_system which should be calculated. Its start values are set to the solution of the previous step
+            on every step: The executed flow rates are appended to the previous_flow_rate of the Flows (the on/off
+            history, each value lasting as long as the first time step), and the charge state becomes the
+            initial_charge_state of the Storages. Storages with initial_charge_state 'lastValueOfSim' or None keep
+            it in every window.
+        horizon : int
+            Number of time steps of the window, e.g. 192 for 48 h in steps of 15 minutes.
+        step_length : int
+            Number of time steps the window is shifted per step. These time steps of the previous solution are
+            regarded as executed: They become the history (previous flow rates) of the next window.
+        start_index : int
+            Index of the first time step of the first window.
+        modeling_language : 'pyomo','cvxpy' (not implemeted yet)
+            choose optimization modeling language
+        """
+        super().__init__(name, flow_system, modeling_language, range(start_index, start_index + horizon))
+        if flow_system.scenarios is not None:
+            raise NotImplementedError('RecedingHorizonCalculation does not support FlowSystems with scenarios')
+        assert 0 < step_length <= horizon, 'The step_length must be positive and must not exceed the horizon'
+        self.horizon = horizon
+        self.step_length = step_length
+        self.step_metrics: List[Dict[str, Any]] = []
+
+    def step(self, solver: Solver, forecasts: Optional[Dict[str, Numeric]] = None) -> Dict[str, Any]:
+        """
+        Solves the next window. The first call solves the window at start_index. Every further call shifts the
+        window by step_length, transfers the start values from the previous solution and updates the model.
+
+        Parameters
+        ----------
+        solver : Solver
+            The solver to use. Choose from flixOpt.solvers
+        forecasts : dict, optional
+            New values for TimeSeries in the (shifted) window, replacing the data of the FlowSystem for this step only.
+            Keys are the labels of the TimeSeries (e.g. 'Wärmelast__Q_th_Last__fixed_relative_profile'),
+            values are scalars or arrays of length horizon.
+
+        Returns
+        -------
+        dict
+            The metrics of the step (also appended to step_metrics): start index, objective, termination message,
+            number of updated variables and constraints and the durations of shifting the data, modeling,
+            updating and solving, and their total (latency) in seconds.
+        """
+        t_start = timeit.default_timer()
+        is_first_step = self.system_model is None or self.system_model.result_of_objective is None
+        if is_first_step:
+            self.flow_system.transform_data()
+            self.flow_system.activate_indices(self.time_indices)
+            self._apply_forecasts(forecasts)
+            t_shifted = timeit.default_timer()
+            self.system_model = SystemModel(self.name, self.modeling_language, self.flow_system, self.time_indices)
+            self.system_model.do_modeling()
+            self.system_model.translate_to_modeling_language()
+            t_modeled = t_updated = timeit.default_timer()
+            updated_parts = []
+        else:
+            window = range(self.time_indices.start + self.step_length, self.time_indices.stop + self.step_length)
+            if window.stop > len(self.flow_system.time_series):
+                raise IndexError(f'The window {window} exceeds the time series of the FlowSystem')
+            self._transfer_start_values()
+            self.time_indices = window
+            self.flow_system.activate_indices(window)
+            self._apply_forecasts(forecasts)
+            t_shifted = timeit.default_timer()
+            new_model = self._model_of_current_window()
+            t_modeled = timeit.default_timer()
+            updated_parts = self._update_from(new_model)
+            t_updated = timeit.default_timer()
+
+        self._results = None
+        warm_start, solver.warm_start = solver.warm_start, not is_first_step
+        try:
+            self.system_model.solve(solver)
+        finally:
+            solver.warm_start = warm_start
+        t_end = timeit.default_timer()
+
+        metrics = {'start_index': self.time_indices.start,
+                   'objective': self.system_model.result_of_objective,
+                   'termination_message': solver.termination_message,
+                   'updated_parts': len(updated_parts),
+                   'shifting_seconds': t_shifted - t_start,
+                   'modeling_seconds': t_modeled - t_shifted,
+                   'updating_seconds': t_updated - t_modeled,
+                   'solving_seconds': t_end - t_updated,
+                   'latency_seconds': t_end - t_start}
+        self.step_metrics.append(metrics)
+        logger.info(f'Step {len(self.step_metrics)} (start index {metrics["start_index"]}): '
+                    f'{len(updated_parts)} parts updated, latency {metrics["latency_seconds"]:.3f} s')
+        return metrics
+
+    def metrics(self) -> 'pd.DataFrame':
+        """ The metrics of all steps as a table, one row per step """
+        import pandas as pd
+        return pd.DataFrame(self.step_metrics)
+
+    def _transfer_start_values(self) -> None:
+        """
+        The executed time steps of the previous solution become the start values of the shifted window.
+        The whole history of the flow rates is kept, as on/off durations can be longer than one step.
+        """
+        for flow in self.flow_system.all_flows:
+            executed = np.asarray(flow.model.flow_rate.result[:self.step_length], dtype=float_dtype()).reshape(-1)
+            if flow.previous_flow_rate is not None:
+                executed = np.concatenate([np.asarray(flow.previous_flow_rate, dtype=float_dtype()).reshape(-1),
+                                           executed])
+            flow.previous_flow_rate = executed
+        for comp in self.flow_system.components:
+            if isinstance(comp, Storage) and utils.is_number(comp.initial_charge_state):
+                comp.initial_charge_state = float(comp.model.charge_state.result[self.step_length])
+
+    def _apply_forecasts(self, forecasts: Optional[Dict[str, Numeric]]) -> None:
+        if not forecasts:
+            return
+        time_series = {ts.label: ts for ts in self.flow_system.all_time_series}
+        for label, values in forecasts.items():
+            if label not in time_series:
+                raise KeyError(f'No TimeSeries with label "{label}" in FlowSystem')
+            values = np.asarray(values, dtype=float_dtype()).reshape(-1)
+            time_series[label].activate_indices(self.time_indices, aggregated_data=values)
+
+    def _model_of_current_window(self) -> SystemModel:
+        """
+        Builds the SystemModel of the current window without translating it. The models of the Elements are
+        restored afterward, as they belong to the translated model.
+        """
+        elements = self.flow_system.all_elements + [self.flow_system.effect_collection]
+        models = [element.model for element in elements]
+        try:
+            system_model = SystemModel(self.name, self.modeling_language, self.flow_system, self.time_indices)
+            system_model.do_modeling()
+        finally:
+            for element, model in zip(elements, models):
+                element.model = model
+        return system_model
+
+    def _update_from(self, new_model: SystemModel) -> List[Union[Variable, Equation]]:
+        """
+        Copies the bounds, factors and constants of the new model into the parts of the translated model and updates
+        the changed indices and rows in the modeling language. Returns the changed parts.
+        """
+        changed_indices: Dict[Union[Variable, Equation, Inequation], np.ndarray] = {}
+        new_variables = new_model.all_variables
+        for label, variable in self.system_model.all_variables.items():
+            indices = _transfer_bounds(variable, _counterpart(new_variables, label))
+            if len(indices) > 0:
+                changed_indices[variable] = indices
+        new_constraints = new_model.all_constraints
+        for label, constraint in self.system_model.all_constraints.items():
+            rows = _transfer_coefficients(constraint, _counterpart(new_constraints, label))
+            if len(rows) > 0:
+                changed_indices[constraint] = rows
+        changed = list(changed_indices)
+        if len(_transfer_coefficients(self.system_model.objective, new_model.objective)) > 0:
+            changed.append(self.system_model.objective)
+
+        for name in ('time_series', 'time_series_with_end', 'dt_in_hours', 'dt_in_hours_total'):
+            setattr(self.system_model, name, getattr(new_model, name))
+        self.system_model.update(*changed, indices=changed_indices)
+        return changed
+
+
+def _counterpart(parts: Dict[str, Any], label: str) -> Any:
+    try:
+        return parts[label]
+    except KeyError:
+        raise ValueError(f'The structure of the model changed between the windows: "{label}" is missing') from None
+
+
+def _changed_indices(first: Optional[Numeric], second: Optional[Numeric], length: int) -> np.ndarray:
+    """ Boolean vector of the indices, at which the (scalar or vector) values differ """
+    return utils.as_vector(first, length) != utils.as_vector(second, length)
+
+
+def _transfer_bounds(variable: Variable, new_variable: Variable) -> np.ndarray:
+    """ Copies the bounds and fixed values of new_variable into variable. Returns the changed indices """
+    if variable.length != new_variable.length:
+        raise ValueError(f'The length of Variable {variable.label} changed between the windows')
+    if isinstance(new_variable, VariableTS):
+        variable.previous_values = new_variable.previous_values  # Not translated, only used by the constraints
+    if variable.fixed != new_variable.fixed:
+        changed = np.ones(variable.length, dtype=bool)
+    else:
+        changed = (_changed_indices(variable.lower_bound, new_variable.lower_bound, variable.length) |
+                   _changed_indices(variable.upper_bound, new_variable.upper_bound, variable.length) |
+                   _changed_indices(variable.fixed_value, new_variable.fixed_value, variable.length))
+    if changed.any():
+        variable.lower_bound, variable.upper_bound = new_variable.lower_bound, new_variable.upper_bound
+        variable.fixed_value, variable.fixed = new_variable.fixed_value, new_variable.fixed
+    return np.flatnonzero(changed)
+
+
+def _transfer_coefficients(constraint: Union[Equation, Inequation], new_constraint: Union[Equation, Inequation]
+                           ) -> np.ndarray:
+    """ Copies the factors and the constant of new_constraint into constraint. Returns the changed rows """
+    if (constraint.length != new_constraint.length or
+            [summand.variable.label for summand in constraint.summands] !=
+            [summand.variable.label for summand in new_constraint.summands]):
+        raise ValueError(f'The structure of Constraint {constraint.label} changed between the windows')
+    changed = _changed_indices(constraint.constant_vector, new_constraint.constant_vector, constraint.length)
+    for summand, new_summand in zip(constraint.summands, new_constraint.summands):
+        if isinstance(summand, SumOfSummand):  # A sum is part of every row
+            if not np.array_equal(summand.factor_vec, new_summand.factor_vec):
+                changed[:] = True
+        else:
+            changed |= _changed_indices(summand.factor_vec, new_summand.factor_vec, constraint.length)
+    if changed.any():
+        for summand, new_summand in zip(constraint.summands, new_constraint.summands):
+            summand.factor, summand.factor_vec = new_summand.factor, new_summand.factor_vec
+        constraint.constant, constraint.parts_of_constant = new_constraint.constant, new_constraint.parts_of_constant
+    return np.flatnonzero(changed)
+
+
+def _sweep_chunk(setting: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """ Builds the model in a worker process and sweeps over a chunk of the values """
+    calculation = FullCalculation(setting['name'], FlowSystem.from_bytes(setting['flow_system']),
+                                  setting['modeling_language'], setting['time_indices'])
+    calculation.do_modeling()
+    return calculation._sweep(setting['solver'], setting['parameter'], setting['values'], setting['with_results'])
+
+
+def _main_results_as_row(main_results: Dict[str, Any]) -> Dict[str, Any]:
+    """ Flattens SystemModel.main_results to one row of a table """
+    row = {'objective': main_results['Objective'],
+           'lower_bound': main_results['lower bound'],
+           'penalty': main_results['penalty']}
+    for effect, effect_results in main_results['Effects'].items():
+        for part, value in effect_results.items():
+            row[f'{effect} {part}'] = value
+    invest_decisions = main_results['Invest-Decisions']
+    for label, size in {**invest_decisions['invested'], **invest_decisions['not invested']}.items():
+        row[f'{label} size'] = size
+    return row
+
+
 def _remove_none_values(d: Dict[Any, Optional[Any]]) -> Dict[Any, Any]:
     # Remove None values from a dictionary
     return {k: _remove_none_values(v) if isinstance(v, dict) else v for k, v in d.items() if v is not None}
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Command line entry point for batch runs, e.g. called by a scheduler:
+
+    flixopt district_full.yaml district_aggregated.yaml --workers 2
+
+Each config file (YAML or JSON) describes one calculation, or several in a list "calculations" (the other keys of the
+file are their defaults). Paths are relative to the config file:
+
+    name: district_aggregated
+    flow_system: district.flixopt       # File of FlowSystem.to_file()
+    calculation: aggregated             # full, aggregated or segmented
+    time_indices: [0, 192]              # [start, stop], optional
+    solver: {name: highs, mip_gap: 0.01, time_limit_seconds: 300}
+    aggregation: {hours_per_period: 6, nr_of_periods: 4, fix_storage_flows: true,
+                  aggregate_data_and_fix_non_binary_vars: true}
+    components_to_clusterize: [Kessel, Speicher]   # optional, for aggregated
+    segments: {segment_length: 96, overlap_length: 1}  # for segmented
+    results: {path: results, format: json}          # json (loadable by CalculationResults) or npz
+"""
+import argparse
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import pathlib
+import sys
+import timeit
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from .aggregation import AggregationParameters
+from .calculation import FullCalculation, AggregatedCalculation, SegmentedCalculation, Calculation
+from .core import change_logging_level
+from .flow_system import FlowSystem
+from .solvers import solver_from_config
+
+logger = logging.getLogger('flixOpt')
+
+RESULT_FORMATS = ('json', 'npz')
+
+
+def load_configs(path: Union[str, pathlib.Path]) -> List[Dict[str, Any]]:
+    """ Reads the calculations of a YAML or JSON config file. Relative paths are resolved against its directory """
+    path = pathlib.Path(path)
+    with open(path, 'r', encoding='utf-8') as file:
+        if path.suffix in ('.yaml', '.yml'):
+            import yaml
+            config = yaml.safe_load(file)
+        elif path.suffix == '.json':
+            config = json.load(file)
+        else:
+            raise ValueError(f'Config files must be .yaml, .yml or .json, but got {path}')
+    if not isinstance(config, dict):
+        raise ValueError(f'The config file {path} must contain a mapping')
+
+    calculations = config.pop('calculations', None)
+    configs = [config] if calculations is None else [{**config, **calculation} for calculation in calculations]
+    for i, config in enumerate(configs):
+        config.setdefault('name', path.stem if calculations is None else f'{path.stem}_{i}')
+        config['base_directory'] = str(path.parent.resolve())
+    return configs
+
+
+def run_calculation(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs the calculation of a config (see load_configs()) and saves its results.
+    Errors are not raised, but returned in the summary, so one failing calculation does not stop a batch.
+
+    Returns
+    -------
+    dict
+        Summary of the calculation: name, type, status ('ok' or 'failed'), objective, the durations of modeling,
+        solving and saving, the total duration in seconds and the error, if failed.
+    """
+    if 'log_level' in config:
+        change_logging_level(config['log_level'])
+    t_start = timeit.default_timer()
+    kind = config.get('calculation', 'full')
+    summary = {'name': config['name'], 'calculation': kind, 'status': 'ok', 'objective': None}
+    try:
+        calculation = _calculate(config)
+    except Exception as e:
+        logger.exception(f'Calculation "{config["name"]}" failed')
+        summary.update(status='failed', error=f'{e.__class__.__name__}: {e}')
+    else:
+        if not isinstance(calculation, SegmentedCalculation):  # The objectives of segments overlap
+            summary['objective'] = calculation.system_model.result_of_objective
+        summary.update({key: value for key, value in calculation.durations.items()
+                        if key in ('modeling', 'solving', 'saving')})
+    summary['total'] = round(timeit.default_timer() - t_start, 2)
+    return summary
+
+
+def run_calculations(configs: List[Dict[str, Any]], max_workers: Optional[int] = 1) -> List[Dict[str, Any]]:
+    """ Runs the calculations in up to max_workers processes (all processors, if None) and returns their summaries """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_workers == 1 or len(configs) <= 1:
+        return [run_calculation(config) for config in configs]
+    # Forking is avoided, as solver threads (e.g. HiGHS) would deadlock in the workers
+    start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(max_workers, len(configs)),
+                                                mp_context=multiprocessing.get_context(start_method)) as executor:
+        return list(executor.map(run_calculation, configs))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='flixopt', description='Runs the calculations described in config files.')
+    parser.add_argument('configs', nargs='+', help='YAML or JSON config files')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of calculations running in parallel (0: number of processors). Default: 1')
+    parser.add_argument('-f', '--format', choices=RESULT_FORMATS, help='Format of the results, for all configs')
+    parser.add_argument('-o', '--output', help='Directory of the results, for all configs')
+    parser.add_argument('--log-level', default='WARNING', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'])
+    args = parser.parse_args(argv)
+    change_logging_level(args.log_level)
+
+    configs = []
+    for path in args.configs:
+        for config in load_configs(path):
+            results = dict(config.get('results') or {})
+            if args.format is not None:
+                results['format'] = args.format
+            if args.output is not None:
+                results['path'] = str(pathlib.Path(args.output).resolve())
+            configs.append({**config, 'results': results, 'log_level': args.log_level})
+
+    t_start = timeit.default_timer()
+    summaries = run_calculations(configs, args.workers or None)
+    print(format_summary(summaries, timeit.default_timer() - t_start))
+    return 0 if all(summary['status'] == 'ok' for summary in summaries) else 1
+
+
+def format_summary(summaries: List[Dict[str, Any]], total_seconds: float) -> str:
+    """ Table of the timings and objectives of the calculations """
+    header = (f'{"name":<30} {"calculation":<11} {"status":<7} {"objective":>14} '
+              f'{"modeling":>9} {"solving":>9} {"saving":>9} {"total":>9}')
+    lines = [header, '-' * len(header)]
+    for summary in summaries:
+        objective = f'{summary["objective"]:>14.2f}' if summary['objective'] is not None else f'{"-":>14}'
+        durations = ' '.join(f'{summary.get(key, 0):>9.2f}' for key in ('modeling', 'solving', 'saving', 'total'))
+        lines.append(f'{summary["name"]:<30} {summary["calculation"]:<11} {summary["status"]:<7} {objective} '
+                     f'{durations}')
+        if 'error' in summary:
+            lines.append(f'  {summary["error"]}')
+    nr_failed = sum(summary['status'] != 'ok' for summary in summaries)
+    lines.append('-' * len(header))
+    lines.append(f'{len(summaries)} calculations ({nr_failed} failed) in {total_seconds:.2f} s')
+    return '\n'.join(lines)
+
+
+def _calculate(config: Dict[str, Any]) -> Calculation:
+    base_directory = pathlib.Path(config.get('base_directory', '.'))
+    flow_system = FlowSystem.from_file(base_directory / config['flow_system'])
+    time_indices = range(*config['time_indices']) if config.get('time_indices') is not None else None
+    # Parallel calculations would interleave their output on the console. Logs are written next to the json results
+    solver = solver_from_config({'solver_output_to_console': False, **(config.get('solver') or {})})
+
+    results = {'path': 'results', 'format': 'json', **(config.get('results') or {})}
+    if results['format'] not in RESULT_FORMATS:
+        raise ValueError(f'Unknown format of results "{results["format"]}". Choose from {RESULT_FORMATS}')
+    path = base_directory / results['path']
+    save_results = path if results['format'] == 'json' else False
+
+    name, kind = config['name'], config.get('calculation', 'full')
+    if kind == 'full':
+        calculation = FullCalculation(name, flow_system, time_indices=time_indices)
+        calculation.do_modeling()
+        calculation.solve(solver, save_results=save_results)
+    elif kind == 'aggregated':
+        labels = config.get('components_to_clusterize')
+        calculation = AggregatedCalculation(
+            name, flow_system, AggregationParameters(**config['aggregation']),
+            [flow_system.element_by_label(label) for label in labels] if labels is not None else None,
+            time_indices=time_indices)
+        calculation.do_modeling()
+        calculation.solve(solver, save_results=save_results)
+    elif kind == 'segmented':
+        calculation = SegmentedCalculation(name, flow_system, config['segments']['segment_length'],
+                                           config['segments']['overlap_length'], time_indices=time_indices)
+        calculation.do_modeling_and_solve(solver, save_results=save_results)
+    else:
+        raise ValueError(f'Unknown calculation "{kind}". Choose from full, aggregated or segmented')
+
+    if results['format'] == 'npz':
+        t_start = timeit.default_timer()
+        path.mkdir(parents=True, exist_ok=True)
+        calculation_results = (calculation.results(combined_arrays=True) if isinstance(calculation, SegmentedCalculation)
+                               else calculation.results())
+        np.savez_compressed(path / f'{name}_results.npz', **_flatten_results(calculation_results))
+        calculation.durations['saving'] = round(timeit.default_timer() - t_start, 2)
+    return calculation
+
+
+def _flatten_results(results: Dict[str, Any], prefix: str = '') -> Dict[str, np.ndarray]:
+    """ Flattens the nested results to arrays with keys like 'Components/Kessel/Q_th/flow_rate' """
+    flat = {}
+    for key, value in results.items():
+        label = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(_flatten_results(value, f'{label}/'))
+        elif value is not None:
+            array = np.asarray(value)
+            if array.dtype != object:
+                flat[label] = array
+    return flat
+
+
+if __name__ == '__main__':
+    sys.exit(main())
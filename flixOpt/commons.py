@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from .core import setup_logging, change_logging_level, TimeSeriesData
+from .core import setup_logging, change_logging_level, TimeSeriesData, set_precision
 
 from .elements import Flow, Bus
 from .effects import Effect
@@ -8,11 +8,13 @@ from .components import Source, Sink, SourceAndSink, Storage, LinearConverter
 from . import linear_converters
 
 from .flow_system import FlowSystem, create_datetime_array
-from .calculation import FullCalculation, SegmentedCalculation, AggregatedCalculation
+from .calculation import (FullCalculation, SegmentedCalculation, AggregatedCalculation, RecedingHorizonCalculation,
+                          ResultCache, SweepParameter)
+from .structure import ResultFilter
+from .service import OptimizationService, ServiceClient
 from . import solvers
 
 from .interface import InvestParameters, OnOffParameters
-from .aggregation import AggregationParameters
+from .aggregation import AggregationParameters, ClusteringCache, sweep_aggregation_settings
 
-from . import plotting
-from . import results
+# plotting and results are imported lazily in __init__.py, as they import plotly, matplotlib and pandas
@@ -264,14 +264,17 @@ class StorageModel(ComponentModel):
         self.element: Storage = element
         self.charge_state: Optional[VariableTS] = None
         self.netto_discharge: Optional[VariableTS] = None
+        self.eq_charge_state: Optional[Equation] = None
         self._investment: Optional[InvestmentModel] = None
 
     def do_modeling(self, system_model):
         super().do_modeling(system_model)
 
         lb, ub = self.absolute_charge_state_bounds
-        self.charge_state = create_variable('charge_state', self, system_model.nr_of_time_steps + 1, lower_bound=lb,
-                                            upper_bound=ub)
+        # One additional charge state after the last time step (of every scenario)
+        self.charge_state = create_variable('charge_state', self,
+                                            system_model.nr_of_time_steps + system_model.nr_of_scenarios,
+                                            lower_bound=lb, upper_bound=ub)
 
         self.netto_discharge = create_variable('netto_discharge', self, system_model.nr_of_time_steps,
                                                lower_bound=-np.inf)  # negative Werte zulässig!
@@ -283,7 +286,11 @@ class StorageModel(ComponentModel):
         eq_netto.add_summand(self.element.charging.model.flow_rate, 1)
         eq_netto.add_summand(self.element.discharging.model.flow_rate, -1)
 
-        indices_charge_state = range(system_model.indices.start, system_model.indices.stop + 1)  # additional
+        # Charge state before and after each time step. Every scenario has its own block of charge states
+        charge_state_before = np.arange(system_model.nr_of_time_steps)
+        charge_state_before += charge_state_before // system_model.nr_of_time_steps_per_scenario
+        charge_state_after = (charge_state_before + 1).tolist()
+        charge_state_before = charge_state_before.tolist()
 
         ############# Charge State Equation
         # charge_state(n+1)
@@ -292,11 +299,11 @@ class StorageModel(ComponentModel):
         # + discharging(n)  * 1 / eta_discharge * dt(n)
         # = 0
         eq_charge_state = create_equation('charge_state', self, eq_type='eq')
-        eq_charge_state.add_summand(self.charge_state, 1, indices_charge_state[1:])  # 1:end
+        self.eq_charge_state = eq_charge_state
+        eq_charge_state.add_summand(self.charge_state, 1, charge_state_after)  # 1:end
         eq_charge_state.add_summand(self.charge_state,
                                     (self.element.relative_loss_per_hour.active_data * system_model.dt_in_hours) - 1,
-                                    indices_charge_state
-                                    [:-1])  # sprich 0 .. end-1 % nach letztem Zeitschritt gibt es noch einen weiteren Ladezustand!
+                                    charge_state_before)  # sprich 0 .. end-1 % nach letztem Zeitschritt gibt es noch einen weiteren Ladezustand!
         eq_charge_state.add_summand(self.element.charging.model.flow_rate,
                                     -1 * self.element.eta_charge.active_data * system_model.dt_in_hours)
         eq_charge_state.add_summand(self.element.discharging.model.flow_rate,
@@ -313,18 +320,22 @@ class StorageModel(ComponentModel):
             self._model_initial_and_final_charge_state(system_model)
 
     def _model_initial_and_final_charge_state(self, system_model):
-        indices_charge_state = range(system_model.indices.start, system_model.indices.stop + 1)  # additional
+        # First, last and final charge state of every scenario
+        length_of_scenario = system_model.nr_of_time_steps_per_scenario + 1
+        first_indices = range(0, self.charge_state.length, length_of_scenario)
+        last_indices = range(length_of_scenario - 2, self.charge_state.length, length_of_scenario)
+        final_indices = range(length_of_scenario - 1, self.charge_state.length, length_of_scenario)
 
         if self.element.initial_charge_state is not None:
             eq_initial = create_equation('initial_charge_state', self, eq_type='eq')
             if utils.is_number(self.element.initial_charge_state):
                 # eq: Q_Ladezustand(1) = Q_Ladezustand_Start;
                 eq_initial.add_constant(self.element.initial_charge_state)  # chargeState_0 !
-                eq_initial.add_summand(self.charge_state, 1, system_model.indices[0])
+                eq_initial.add_summand(self.charge_state, 1, first_indices)
             elif self.element.initial_charge_state == 'lastValueOfSim':
                 # eq: Q_Ladezustand(1) - Q_Ladezustand(end) = 0;
-                eq_initial.add_summand(self.charge_state, 1, system_model.indices[0])
-                eq_initial.add_summand(self.charge_state, -1,  system_model.indices[-1])
+                eq_initial.add_summand(self.charge_state, 1, first_indices)
+                eq_initial.add_summand(self.charge_state, -1, last_indices)
             else:
                 raise Exception(f'initial_charge_state has undefined value: {self.element.initial_charge_state}')
                 # TODO: Validation in Storage Class, not in Model
@@ -334,13 +345,13 @@ class StorageModel(ComponentModel):
         # 1: eq:  Q_charge_state(end) <= Q_max
         if self.element.maximal_final_charge_state is not None:
             eq_max = create_equation('eq_final_charge_state_max', self, eq_type='ineq')
-            eq_max.add_summand(self.charge_state, 1, indices_charge_state[-1])
+            eq_max.add_summand(self.charge_state, 1, final_indices)
             eq_max.add_constant(self.element.maximal_final_charge_state)
 
         # 2: eq: - Q_charge_state(end) <= - Q_min
         if self.element.minimal_final_charge_state is not None:
             eq_min = create_equation('eq_charge_state_end_min', self, eq_type='ineq')
-            eq_min.add_summand(self.charge_state, -1, indices_charge_state[-1])
+            eq_min.add_summand(self.charge_state, -1, final_indices)
             eq_min.add_constant(- self.element.minimal_final_charge_state)
 
     @property
@@ -4,16 +4,26 @@ Created on Wed Mar 31 22:51:38 2021
 developed by Felix Panitz* and Peter Stange*
 * at Chair of Building Energy Systems and Heat Supply, Technische Universität Dresden
 """
-from typing import Union, Optional, List, Dict, Any, Literal
+from typing import Union, Optional, List, Dict, Any, Literal, TYPE_CHECKING
 import logging
 import inspect
+import hashlib
+import os
+import pathlib
+import tempfile
 
 import numpy as np
 
 from . import utils
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 logger = logging.getLogger('flixOpt')
 
+_FLOAT_DTYPES = {'float64': np.float64, 'float32': np.float32}
+_float_dtype = np.float64  # Precision of stored input time series, factors and results. See set_precision()
+
 Skalar = Union[int, float]  # Datatype
 Numeric = Union[int, float, np.ndarray]  # Datatype
 # zeitreihenbezogene Input-Daten:
@@ -63,6 +73,52 @@ class TimeSeriesData:
             raise Exception('Either <agg_group> or explicit <agg_weigth> can be used. Not both!')
         self.label: Optional[str] = None
 
+    @classmethod
+    def from_file(cls,
+                  path: Union[str, pathlib.Path],
+                  column: Optional[Union[int, str]] = None,
+                  agg_group: Optional[str] = None,
+                  agg_weight: Optional[float] = None,
+                  cache_directory: Optional[Union[str, pathlib.Path]] = None) -> 'TimeSeriesData':
+        """
+        Creates TimeSeriesData referencing a column in a .npy or .parquet file without loading it into memory.
+        The data is memory-mapped, so only the time steps of the active indices of a calculation
+        (e.g. a segment of a SegmentedCalculation) are actually read from disk.
+
+        Parameters
+        ----------
+        path : str or pathlib.Path
+            Path to a .npy file (1D, or 2D with one time series per column) or a .parquet file.
+        column : int or str, optional
+            Index of the column in a 2D .npy file, or name of the column in a .parquet file.
+        agg_group, agg_weight :
+            See TimeSeriesData.
+        cache_directory : str or pathlib.Path, optional
+            Directory for the .npy files of parquet columns. Default: 'flixOpt_parquet_columns' in the temp directory.
+
+        Notes
+        -----
+        Parquet files can not be memory-mapped directly. The column is converted to a .npy file in the
+        cache_directory once, row group by row group, and this file is memory-mapped. This needs pyarrow.
+        """
+        path = pathlib.Path(path)
+        if path.suffix == '.parquet':
+            if not isinstance(column, str):
+                raise ValueError(f'The name of the column must be given for parquet files: {path}')
+            path = _parquet_column_to_npy(path, column, cache_directory)
+            column = None
+        elif path.suffix != '.npy':
+            raise ValueError(f'Only .npy and .parquet files are supported, but got {path}')
+
+        data = np.load(path, mmap_mode='r')
+        if data.ndim == 2:
+            if not isinstance(column, int):
+                raise ValueError(f'The index of the column must be given for 2D arrays: {path}')
+            data = data[:, column]  # Still a memory-mapped (strided) view
+        elif data.ndim != 1 or column is not None:
+            raise ValueError(f'Expected a 1D array, or a 2D array and a column index, in {path}')
+        return cls(data, agg_group=agg_group, agg_weight=agg_weight)
+
     def __repr__(self):
         # Get the constructor arguments and their current values
         init_signature = inspect.signature(self.__init__)
@@ -79,6 +135,40 @@ class TimeSeriesData:
         return str(self.data)
 
 
+def _parquet_column_to_npy(path: pathlib.Path, column: str,
+                           cache_directory: Optional[Union[str, pathlib.Path]] = None) -> pathlib.Path:
+    """
+    Writes a column of a parquet file to a .npy file in the cache_directory, one row group at a time, so the column
+    is never fully loaded into memory. An existing .npy file is reused if it is newer than the parquet file.
+    """
+    if cache_directory is None:
+        cache_directory = pathlib.Path(tempfile.gettempdir()) / 'flixOpt_parquet_columns'
+    cache_directory = pathlib.Path(cache_directory)
+    cache_directory.mkdir(parents=True, exist_ok=True)
+    source = hashlib.sha256(f'{path.resolve()}|{column}'.encode()).hexdigest()[:16]  # Same names in other folders
+    npy_path = cache_directory / f'{path.stem}.{column}.{source}.npy'
+    if npy_path.exists() and npy_path.stat().st_mtime >= path.stat().st_mtime:
+        return npy_path
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError('Loading parquet files needs pyarrow. Install it with "pip install pyarrow"') from e
+
+    parquet_file = pq.ParquetFile(path)
+    partial_path = npy_path.with_name(f'{npy_path.name}.{os.getpid()}.partial')  # Concurrent readers see no half file
+    array = np.lib.format.open_memmap(partial_path, mode='w+', dtype=np.float64, shape=(parquet_file.metadata.num_rows,))
+    start = 0
+    for batch in parquet_file.iter_batches(columns=[column]):
+        values = batch.column(0).to_numpy(zero_copy_only=False)
+        array[start: start + len(values)] = values
+        start += len(values)
+    array.flush()
+    del array
+    os.replace(partial_path, npy_path)
+    logger.info(f'Converted column "{column}" of {path} to {npy_path}')
+    return npy_path
+
+
 class TimeSeries:
     """
     Class for data that applies to time series, stored as vector (np.ndarray) or scalar.
@@ -105,6 +195,7 @@ class TimeSeries:
 
     def __init__(self, label: str, data: Optional[Numeric_TS]):
         self.label: str = label
+        self._cache: Dict[str, Numeric] = {}  # active_data and active_data_vector of the current activation
         if isinstance(data, TimeSeriesData):
             self.data = self.make_scalar_if_possible(data.data)
             self.aggregation_weight, self.aggregation_group = data.agg_weight, data.agg_group
@@ -112,12 +203,15 @@ class TimeSeries:
         else:
             self.data = self.make_scalar_if_possible(data)
             self.aggregation_weight, self.aggregation_group = None, None
+        # Memory-mapped data is kept on disk. Only the active indices are read
+        self.is_memory_mapped: bool = isinstance(self.data, np.memmap)
 
         self.active_indices: Optional[Union[range, List[int]]] = None
-        self.aggregated_data: Optional[Numeric] = None
+        self._aggregated_data: Optional[Numeric] = None
 
     def activate_indices(self, indices: Optional[Union[range, List[int]]], aggregated_data: Optional[Numeric] = None):
         self.active_indices = indices
+        self._cache.clear()
 
         if aggregated_data is not None:
             assert len(aggregated_data) == len(self.active_indices) or len(aggregated_data) == 1, \
@@ -129,21 +223,81 @@ class TimeSeries:
         self.active_indices = None
         self.aggregated_data = None
 
+    def expand_to_scenarios(self, nr_of_scenarios: int, nr_of_time_steps: int):
+        """
+        Lays out the data of all scenarios one after another, as one vector of length
+        nr_of_scenarios * nr_of_time_steps (scenario blocks). Data of shape (nr_of_scenarios, nr_of_time_steps) holds
+        one row per scenario, data of length nr_of_time_steps is the same in all scenarios. Scalars stay scalars.
+        Already expanded data is left unchanged. Memory-mapped data is loaded into memory.
+        Data of more than one dimension is checked also without scenarios and raises a ValueError for any other shape.
+        """
+        if not self.is_array:
+            return
+        shape = np.shape(self.data)
+        if len(shape) == 1 and (nr_of_scenarios == 1 or shape == (nr_of_scenarios * nr_of_time_steps,)):
+            return
+        if shape == (nr_of_scenarios, nr_of_time_steps):
+            data = np.asarray(self.data, dtype=float_dtype()).reshape(-1)
+        elif shape == (nr_of_time_steps,):
+            data = np.tile(np.asarray(self.data, dtype=float_dtype()), nr_of_scenarios)
+        else:
+            raise ValueError(f'TimeSeries {self.label} has the shape {shape}, but needs the shape '
+                             f'({nr_of_time_steps},) or ({nr_of_scenarios}, {nr_of_time_steps}) for '
+                             f'{nr_of_scenarios} scenarios')
+        self.data = self.make_scalar_if_possible(data)
+        self.is_memory_mapped = False
+
+    @property
+    def data(self) -> Optional[Numeric]:
+        return self._data
+
+    @data.setter
+    def data(self, value: Optional[Numeric]):
+        self._data = value
+        self._cache.clear()
+
+    @property
+    def aggregated_data(self) -> Optional[Numeric]:
+        return self._aggregated_data
+
+    @aggregated_data.setter
+    def aggregated_data(self, value: Optional[Numeric]):
+        self._aggregated_data = value
+        self._cache.clear()
+
     @property
     def active_data(self) -> Numeric:
+        """
+        The data of the active indices, or the aggregated data if present. The result is cached until the indices or the
+        aggregated data change. Contiguous indices return a read-only view into the data instead of a copy.
+        """
+        if 'active_data' not in self._cache:
+            self._cache['active_data'] = self._compute_active_data()
+        return self._cache['active_data']
+
+    @property
+    def active_data_vector(self) -> np.ndarray:
+        # Always returns the active data as a vector.
+        if 'active_data_vector' not in self._cache:
+            self._cache['active_data_vector'] = utils.as_vector(self.active_data, len(self.active_indices))
+        return self._cache['active_data_vector']
+
+    def _compute_active_data(self) -> Numeric:
         if self.aggregated_data is not None:  # Aggregated data is always active, if present
             return self.aggregated_data
 
         indices_not_applicable = np.isscalar(self.data) or (self.data is None) or (self.active_indices is None)
         if indices_not_applicable:
             return self.data
-        else:
-            return self.data[self.active_indices]
 
-    @property
-    def active_data_vector(self) -> np.ndarray:
-        # Always returns the active data as a vector.
-        return utils.as_vector(self.active_data, len(self.active_indices))
+        indices = as_slice_if_possible(self.active_indices)
+        if self.is_memory_mapped:  # Reads only the active indices from disk, once per activation
+            return np.array(self.data[indices], dtype=float_dtype())
+        if isinstance(indices, slice):  # Basic indexing returns a view, not a copy
+            view = self.data[indices]
+            view.flags.writeable = False  # The view shares memory with self.data
+            return view
+        return self.data[indices]
 
     @property
     def is_scalar(self) -> bool:
@@ -155,7 +309,7 @@ class TimeSeries:
 
     def __repr__(self):
         # Retrieve all attributes and their values
-        attrs = vars(self)
+        attrs = {key.lstrip('_'): value for key, value in vars(self).items() if key != '_cache'}
         # Format each attribute as 'key=value'
         attrs_str = ', '.join(f"{key}={value!r}" for key, value in attrs.items())
         # Format the output as 'ClassName(attr1=value1, attr2=value2, ...)'
@@ -168,6 +322,7 @@ class TimeSeries:
     def make_scalar_if_possible(data: Optional[Numeric]) -> Optional[Numeric]:
         """
         Convert an array to a scalar if all values are equal, or return the array as-is.
+        Data of more than one dimension is returned as-is, as its shape is checked first (see expand_to_scenarios()).
         Can Return None if the passed data is None
 
         Parameters
@@ -183,12 +338,156 @@ class TimeSeries:
         #TODO: Should this really return None Values?
         if np.isscalar(data) or data is None:
             return data
-        data = np.array(data)
-        if np.all(data == data[0]):
+        if isinstance(data, np.memmap):  # Checking the values would read the whole file
+            return data
+        data = np.asarray(data)  # No copy, if already an array. The TimeSeriesStore copies it anyway
+        if data.ndim == 1 and len(data) > 0 and np.all(data == data[0]):
             return data[0]
         return data
 
 
+class TimeSeriesStore:
+    """
+    Holds the data of all array-valued TimeSeries of a FlowSystem as columns of one contiguous 2D float array
+    (time steps x unique time series), aligned to FlowSystem.time_series. The float type is set by set_precision().
+    Identical arrays are interned by their content hash: they are stored once, and all TimeSeries holding them share
+    the same read-only view of this array.
+    This allows to activate indices, export the data and insert aggregated data for all TimeSeries at once.
+
+    Attributes
+    ----------
+    data : np.ndarray
+        2D array of shape (nr_of_time_steps, nr_of_unique_time_series). Stored column-major and read-only.
+    labels : List[str]
+        Labels of the stored TimeSeries.
+    column_of : List[int]
+        Column in data of each stored TimeSeries (same order as labels).
+    aggregated_data : Optional[np.ndarray]
+        2D array of the aggregated data (same columns as data), if inserted.
+    """
+    def __init__(self, time_series: List[TimeSeries], nr_of_time_steps: int):
+        """
+        Parameters
+        ----------
+        time_series : List[TimeSeries]
+            TimeSeries to store. Only TimeSeries holding an array of length nr_of_time_steps are stored.
+            Memory-mapped TimeSeries are not stored, as this would load them into memory.
+        nr_of_time_steps : int
+            Number of time steps of the FlowSystem.
+        """
+        self.time_series: List[TimeSeries] = [ts for ts in time_series if ts.is_array and not ts.is_memory_mapped
+                                              and len(ts.data) == nr_of_time_steps]
+        self.labels: List[str] = [ts.label for ts in self.time_series]
+        self._ids = {id(ts) for ts in self.time_series}
+
+        unique_arrays: List[np.ndarray] = []
+        column_of_hash: Dict[bytes, int] = {}
+        self.column_of: List[int] = []
+        for ts in self.time_series:
+            array = np.asarray(ts.data, dtype=float_dtype())
+            content_hash = hashlib.blake2b(array.tobytes(), digest_size=16).digest()
+            column = column_of_hash.get(content_hash)
+            if column is None or not np.array_equal(unique_arrays[column], array):
+                column = len(unique_arrays)
+                column_of_hash.setdefault(content_hash, column)
+                unique_arrays.append(array)
+            self.column_of.append(column)
+
+        self.data = np.empty((nr_of_time_steps, len(unique_arrays)), dtype=float_dtype(), order='F')
+        for column, array in enumerate(unique_arrays):
+            self.data[:, column] = array
+        self.data.flags.writeable = False
+        self._set_views(self.data, 'data')
+
+        self.active_indices: Optional[Union[range, List[int]]] = None
+        self.aggregated_data: Optional[np.ndarray] = None
+        if len(unique_arrays) < len(self.time_series):
+            logger.debug(f'Interned {len(self.time_series)} TimeSeries into {len(unique_arrays)} unique arrays')
+
+    def activate_indices(self, indices: Optional[Union[range, List[int]]]) -> None:
+        """ Activates the indices of all stored TimeSeries and removes their aggregated data """
+        self.active_indices = indices
+        self.aggregated_data = None
+        for ts in self.time_series:
+            ts.clear_indices_and_aggregated_data()
+            ts.activate_indices(indices)
+
+    @property
+    def active_data(self) -> np.ndarray:
+        """ 2D array of the unique columns at the active indices. A view, if the indices are contiguous """
+        if self.active_indices is None:
+            return self.data
+        return self.data[as_slice_if_possible(self.active_indices)]
+
+    @property
+    def is_interned(self) -> bool:
+        """ True, if some TimeSeries share a column """
+        return self.data.shape[1] < len(self.time_series)
+
+    def to_dataframe(self, index: Optional[np.ndarray] = None) -> 'pd.DataFrame':
+        """
+        Returns the active data as a DataFrame with one column per label.
+        The data is only copied if some TimeSeries share a column.
+        """
+        import pandas as pd
+        active_data = self.active_data[:, self.column_of] if self.is_interned else self.active_data
+        return pd.DataFrame(active_data, index=index, columns=self.labels, copy=False)
+
+    def insert_aggregated_data(self, data: 'pd.DataFrame') -> None:
+        """
+        Inserts aggregated data for all stored TimeSeries at once. TimeSeries sharing a column of the original data
+        also share the aggregated data (the aggregated data of the first of them is used).
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Aggregated data with the labels of the TimeSeries as columns and one row per active index.
+            Missing columns raise a KeyError.
+        """
+        first_label_of_column = {}
+        for label, column in zip(self.labels, self.column_of):
+            first_label_of_column.setdefault(column, label)
+        labels = [first_label_of_column[column] for column in range(self.data.shape[1])]
+        self.aggregated_data = np.asfortranarray(data[labels].to_numpy(dtype=float_dtype()))
+        self.aggregated_data.flags.writeable = False
+        self._set_views(self.aggregated_data, 'aggregated_data')
+
+    def _set_views(self, array: np.ndarray, attribute: Literal['data', 'aggregated_data']) -> None:
+        """ Sets the attribute of every stored TimeSeries to the (shared) view of its column """
+        views = [array[:, column] for column in range(array.shape[1])]
+        for ts, column in zip(self.time_series, self.column_of):
+            setattr(ts, attribute, views[column])
+
+    def __contains__(self, time_series: TimeSeries) -> bool:
+        return id(time_series) in self._ids
+
+    def update_ids(self) -> None:
+        """ Updates the ids used by __contains__, after the stored TimeSeries were replaced by copies """
+        self._ids = {id(ts) for ts in self.time_series}
+
+    def __len__(self):
+        return len(self.time_series)
+
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} with {len(self)} TimeSeries ({self.data.shape[1]} unique) '
+                f'and {self.data.shape[0]} time steps>')
+
+
+def as_slice_if_possible(indices: Union[range, List[int], np.ndarray]) -> Union[slice, range, List[int], np.ndarray]:
+    """
+    Converts indices with a constant positive step (a range or an equally spaced list) into a slice.
+    Indexing a np.ndarray with a slice returns a view instead of a copy. Other indices are returned unchanged.
+    """
+    if isinstance(indices, range):
+        return slice(indices.start, indices.stop, indices.step) if indices.step > 0 and indices.start >= 0 else indices
+    if len(indices) < 2:
+        return indices
+    steps = np.diff(indices)
+    if steps[0] > 0 and indices[0] >= 0 and np.all(steps == steps[0]):
+        return slice(int(indices[0]), int(indices[-1]) + 1, int(steps[0]))
+    return indices
+
+
 def as_effect_dict(effect_values: Union[Numeric, TimeSeries, Dict]) -> Optional[Dict]:
     """
     Converts effect values into a dictionary. If a scalar value is provided, it is associated with a standard effect type.
@@ -347,3 +646,27 @@ def change_logging_level(level_name: Literal['DEBUG', 'INFO', 'WARNING', 'ERROR'
     logger.setLevel(logging_level)
     for handler in logger.handlers:
         handler.setLevel(logging_level)
+
+
+def set_precision(precision: Literal['float64', 'float32'] = 'float64') -> None:
+    """
+    Sets the precision used to store array-valued input TimeSeries, the factors of Summands and the results of
+    continuous Variables. 'float32' halves the memory of these arrays. The values are converted to python floats
+    when they are handed to the solver, and binary results are always stored as int8.
+    Applies to FlowSystems transformed and models created after the call.
+
+    Parameters
+    ----------
+    precision : 'float64' or 'float32'
+        Default is 'float64'.
+    """
+    global _float_dtype
+    if precision not in _FLOAT_DTYPES:
+        raise ValueError(f'Invalid precision {precision}. Choose from {list(_FLOAT_DTYPES)}')
+    _float_dtype = _FLOAT_DTYPES[precision]
+    logger.info(f'Set precision to {precision}')
+
+
+def float_dtype() -> type:
+    """ Returns the numpy float type of the current precision. See set_precision() """
+    return _float_dtype
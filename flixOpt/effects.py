@@ -292,8 +292,17 @@ class EffectCollectionModel(ElementModel):
         self.add_share_between_effects()
 
         self.objective = Equation('OBJECTIVE', 'OBJECTIVE', is_objective=True)
-        self.objective.add_summand(self._objective_effect_model.operation.sum, 1)
-        self.objective.add_summand(self._objective_effect_model.invest.sum, 1)
+        self.set_objective(self.element.objective_effect)
+
+    def set_objective(self, effect: Effect) -> None:
+        """
+        Minimizes the given Effect (plus the penalty). Changing the objective of an already translated model needs
+        SystemModel.update(objective) afterward, e.g. to compute anchor points of a pareto front.
+        """
+        effect_model = self._effect_models[effect]
+        self.objective.summands = []
+        self.objective.add_summand(effect_model.operation.sum, 1)
+        self.objective.add_summand(effect_model.invest.sum, 1)
         self.objective.add_summand(self.penalty.sum, 1)
 
     @property
@@ -10,7 +10,7 @@ import logging
 
 import numpy as np
 
-from .math_modeling import Variable, VariableTS
+from .math_modeling import Variable, VariableTS, Equation
 from .core import Numeric, Numeric_TS, Skalar
 from .interface import InvestParameters, OnOffParameters
 from .features import OnOffModel, InvestmentModel, PreventSimultaneousUsageModel
@@ -198,6 +198,9 @@ class Flow(Element):
             If the load-profile is just an upper limit, use relative_maximum instead.
         previous_flow_rate : scalar, array, optional
             previous flow rate of the component.
+            scalar: flow rate before the first time step.
+            array: history of flow rates before the first time step (each lasting as long as the first time step).
+                The last period of on or off is continued by the consecutive on/off hours of can_be_off.
         """
         super().__init__(label)
         self.size = size
@@ -315,7 +318,7 @@ class FlowModel(ElementModel):
         self.sum_flow_hours = create_variable('sumFlowHours', self, 1, lower_bound=self.element.flow_hours_total_min,
                                               upper_bound=self.element.flow_hours_total_max)
         eq_sum_flow_hours = create_equation('sumFlowHours', self, 'eq')
-        eq_sum_flow_hours.add_summand(self.flow_rate, system_model.dt_in_hours, as_sum=True)
+        eq_sum_flow_hours.add_summand(self.flow_rate, system_model.weighted_dt_in_hours, as_sum=True)
         eq_sum_flow_hours.add_summand(self.sum_flow_hours, -1)
 
         # Load factor
@@ -401,11 +404,13 @@ class BusModel(ElementModel):
         self.element: Bus
         self.excess_input: Optional[VariableTS] = None
         self.excess_output: Optional[VariableTS] = None
+        self.eq_bus_balance: Optional[Equation] = None
 
     def do_modeling(self, system_model: SystemModel) -> None:
         self.element: Bus
         # inputs = outputs
         eq_bus_balance = create_equation('busBalance', self)
+        self.eq_bus_balance = eq_bus_balance
         for flow in self.element.inputs:
             eq_bus_balance.add_summand(flow.model.flow_rate, 1)
         for flow in self.element.outputs:
@@ -413,7 +418,8 @@ class BusModel(ElementModel):
 
         # Fehlerplus/-minus:
         if self.element.with_excess:
-            excess_penalty = np.multiply(system_model.dt_in_hours, self.element.excess_penalty_per_flow_hour.active_data)
+            excess_penalty = np.multiply(system_model.weighted_dt_in_hours,
+                                         self.element.excess_penalty_per_flow_hour.active_data)
             self.excess_input = create_variable('excess_input', self, system_model.nr_of_time_steps, lower_bound=0)
             self.excess_output = create_variable('excess_output', self, system_model.nr_of_time_steps, lower_bound=0)
 
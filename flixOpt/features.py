@@ -10,6 +10,7 @@ import logging
 
 import numpy as np
 
+from . import utils
 from .math_modeling import Variable, VariableTS, Equation
 from .core import TimeSeries, Skalar, Numeric
 from .interface import InvestParameters, OnOffParameters
@@ -196,7 +197,7 @@ class OnOffModel(ElementModel):
                                                   lower_bound=self._on_off_parameters.on_hours_total_min,
                                                   upper_bound=self._on_off_parameters.on_hours_total_max)
             eq_total_on = create_equation('totalOnHours', self)
-            eq_total_on.add_summand(self.on, system_model.dt_in_hours, as_sum=True)
+            eq_total_on.add_summand(self.on, system_model.weighted_dt_in_hours, as_sum=True)
             eq_total_on.add_summand(self.total_on_hours, -1)
 
             self._add_on_constraints(system_model, system_model.indices)
@@ -210,7 +211,7 @@ class OnOffModel(ElementModel):
         if self._on_off_parameters.use_on_hours:
             self.consecutive_on_hours = create_variable('consecutiveOnHours', self, system_model.nr_of_time_steps,
                                                         lower_bound=0,
-                                                        upper_bound=self._on_off_parameters.consecutive_on_hours_max.active_data)
+                                                        upper_bound=self._on_off_parameters.consecutive_on_hours_max.active_data if self._on_off_parameters.consecutive_on_hours_max is not None else None)
             self._add_duration_constraints(self.consecutive_on_hours, self.on,
                                            self._on_off_parameters.consecutive_on_hours_min,
                                            system_model, system_model.indices)
@@ -218,7 +219,7 @@ class OnOffModel(ElementModel):
         if self._on_off_parameters.use_off_hours:
             self.consecutive_off_hours = create_variable('consecutiveOffHours', self, system_model.nr_of_time_steps,
                                                          lower_bound=0,
-                                                         upper_bound=self._on_off_parameters.consecutive_off_hours_max.active_data)
+                                                         upper_bound=self._on_off_parameters.consecutive_off_hours_max.active_data if self._on_off_parameters.consecutive_off_hours_max is not None else None)
 
             self._add_duration_constraints(self.consecutive_off_hours, self.off,
                                            self._on_off_parameters.consecutive_off_hours_min,
@@ -306,6 +307,9 @@ class OnOffModel(ElementModel):
                                             |-> min_onHours = 3!
 
         if you want to count zeros, define var_bin_off: = 1-binary_variable before!
+
+        If a history of previous values is given, the duration of the last period before the first time step is
+        continued (every previous value lasting as long as the first time step).
         """
         assert duration_variable is not None, f'Duration Variable of {self.element} must be defined to add constraints'
         assert binary_variable is not None, f'Duration Variable of {self.element} must be defined to add constraints'
@@ -314,7 +318,9 @@ class OnOffModel(ElementModel):
         # 1) eq: onHours(t) <= On(t)*Big | On(t)=0 -> onHours(t) = 0
         # mit Big = dt_in_hours_total
         label_prefix = duration_variable.label
-        mega = system_model.dt_in_hours_total
+        first_indices = system_model.first_indices
+        previous_duration = self._previous_duration(binary_variable, system_model.dt_in_hours[first_indices[0]])
+        mega = system_model.dt_in_hours_total + previous_duration
         constraint_1 = create_equation(f'{label_prefix}_constraint_1', self, eq_type='ineq')
         constraint_1.add_summand(duration_variable, 1)
         constraint_1.add_summand(binary_variable, -1 * mega)
@@ -323,18 +329,19 @@ class OnOffModel(ElementModel):
         #    on(t)=1 -> ...<= dt(t)
         #    on(t)=0 -> onHours(t-1)>=
         constraint_2a = create_equation(f'{label_prefix}_constraint_2a', self, eq_type='ineq')
-        constraint_2a.add_summand(duration_variable, 1, time_indices[1:])  # onHours(t)
-        constraint_2a.add_summand(duration_variable, -1, time_indices[0:-1])  # onHours(t-1)
-        constraint_2a.add_constant(system_model.dt_in_hours[1:])  # dt(t)
+        following_indices, preceding_indices = system_model.following_indices, system_model.preceding_indices
+        constraint_2a.add_summand(duration_variable, 1, following_indices)  # onHours(t)
+        constraint_2a.add_summand(duration_variable, -1, preceding_indices)  # onHours(t-1)
+        constraint_2a.add_constant(system_model.dt_in_hours[following_indices])  # dt(t)
 
         # 2b) eq:  onHours(t) - onHours(t-1)             >=  dt(t) - Big*(1-On(t)))
         #    eq: -onHours(t) + onHours(t-1) + On(t)*Big <= -dt(t) + Big
         # with Big = dt_in_hours_total # (Big = maxOnHours, should be usable, too!)
         constraint_2b = create_equation(f'{label_prefix}_constraint_2b', self, eq_type='ineq')
-        constraint_2b.add_summand(duration_variable, -1, time_indices[1:])  # onHours(t)
-        constraint_2b.add_summand(duration_variable, 1, time_indices[0:-1])  # onHours(t-1)
-        constraint_2b.add_summand(binary_variable, mega, time_indices[1:])  # on(t)
-        constraint_2b.add_constant(-1 + system_model.dt_in_hours[1:] + mega)  # dt(t)
+        constraint_2b.add_summand(duration_variable, -1, following_indices)  # onHours(t)
+        constraint_2b.add_summand(duration_variable, 1, preceding_indices)  # onHours(t-1)
+        constraint_2b.add_summand(binary_variable, mega, following_indices)  # on(t)
+        constraint_2b.add_constant(-1 + system_model.dt_in_hours[following_indices] + mega)  # dt(t)
 
         # 3) check minimum_duration before switchOff-step
         # (last on-time period of timeseries is not checked and can be shorter)
@@ -343,18 +350,26 @@ class OnOffModel(ElementModel):
             # eq:  onHours(t-1) >= minOnHours * -1 * [On(t)-On(t-1)]
             # eq: -onHours(t-1) - minimum_duration * On(t) + minimum_duration*On(t-1) <= 0
             eq_min_duration = create_equation(f'{label_prefix}_minimum_duration', self, eq_type='ineq')
-            eq_min_duration.add_summand(duration_variable, -1, time_indices[0:-1])  # onHours(t-1)
-            eq_min_duration.add_summand(binary_variable, -1 * minimum_duration.active_data, time_indices[1:])  # on(t)
-            eq_min_duration.add_summand(binary_variable, minimum_duration.active_data, time_indices[0:-1])  # on(t-1)
+            minimum = utils.as_vector(minimum_duration.active_data, system_model.nr_of_time_steps)[following_indices]
+            eq_min_duration.add_summand(duration_variable, -1, preceding_indices)  # onHours(t-1)
+            eq_min_duration.add_summand(binary_variable, -1 * minimum, following_indices)  # on(t)
+            eq_min_duration.add_summand(binary_variable, minimum, preceding_indices)  # on(t-1)
+
+            # A previous period shorter than minimum_duration must be continued
+            # eq: -On(t=0) <= -1, if 0 < previous_duration < minimum_duration
+            first_minimum = utils.as_vector(minimum_duration.active_data, system_model.nr_of_time_steps)[first_indices]
+            eq_min_previous = create_equation(f'{label_prefix}_minimum_duration_previous', self, eq_type='ineq')
+            eq_min_previous.add_summand(binary_variable, -1, first_indices)  # on(0)
+            eq_min_previous.add_constant(-1 * ((0 < previous_duration) & (previous_duration < first_minimum)))
 
         # TODO: Maximum Duration?? Is this not modeled yet?!!
 
-        # 4) first index:
-        #    eq: onHours(t=0)= dt(0) * On(0)
-        first_index = time_indices[0]  # only first element
+        # 4) first index (of every scenario):
+        #    eq: onHours(t=0)= (dt(0) + previous_duration) * On(0)
         eq_first = create_equation(f'{label_prefix}_firstTimeStep', self)
-        eq_first.add_summand(duration_variable, 1, first_index)
-        eq_first.add_summand(binary_variable, -1 * system_model.dt_in_hours[first_index], first_index)
+        eq_first.add_summand(duration_variable, 1, first_indices)
+        eq_first.add_summand(binary_variable, -1 * (system_model.dt_in_hours[first_indices] + previous_duration),
+                             first_indices)
 
     def _add_switch_constraints(self, system_model: SystemModel):
         assert self.switch_on is not None, f'Switch On Variable of {self.element} must be defined to add constraints'
@@ -364,17 +379,18 @@ class OnOffModel(ElementModel):
         # % Schaltänderung aus On-Variable
         # % SwitchOn(t)-SwitchOff(t) = On(t)-On(t-1)
         eq_switch = create_equation('Switch', self)
-        eq_switch.add_summand(self.switch_on, 1, system_model.indices[1:])  # SwitchOn(t)
-        eq_switch.add_summand(self.switch_off, -1, system_model.indices[1:])  # SwitchOff(t)
-        eq_switch.add_summand(self.on, -1, system_model.indices[1:])  # On(t)
-        eq_switch.add_summand(self.on, +1, system_model.indices[0:-1])  # On(t-1)
+        eq_switch.add_summand(self.switch_on, 1, system_model.following_indices)  # SwitchOn(t)
+        eq_switch.add_summand(self.switch_off, -1, system_model.following_indices)  # SwitchOff(t)
+        eq_switch.add_summand(self.on, -1, system_model.following_indices)  # On(t)
+        eq_switch.add_summand(self.on, +1, system_model.preceding_indices)  # On(t-1)
 
-        # Initital switch on
+        # Initital switch on (of every scenario)
         # eq: SwitchOn(t=0)-SwitchOff(t=0) = On(t=0) - On(t=-1)
+        first_indices = system_model.first_indices
         eq_initial_switch = create_equation('Initial_Switch', self)
-        eq_initial_switch.add_summand(self.switch_on, 1, indices_of_variable=0)  # SwitchOn(t=0)
-        eq_initial_switch.add_summand(self.switch_off, -1, indices_of_variable=0)  # SwitchOff(t=0)
-        eq_initial_switch.add_summand(self.on, -1, indices_of_variable=0)  # On(t=0)
+        eq_initial_switch.add_summand(self.switch_on, 1, indices_of_variable=first_indices)  # SwitchOn(t=0)
+        eq_initial_switch.add_summand(self.switch_off, -1, indices_of_variable=first_indices)  # SwitchOff(t=0)
+        eq_initial_switch.add_summand(self.on, -1, indices_of_variable=first_indices)  # On(t=0)
         eq_initial_switch.add_constant(-1 * self.on.previous_values[-1])  # On(t-1)
 
         ## Entweder SwitchOff oder SwitchOn
@@ -388,7 +404,7 @@ class OnOffModel(ElementModel):
         # eq: nrSwitchOn = sum(SwitchOn(t))
         eq_nr_switch_on = create_equation('NrSwitchOn', self)
         eq_nr_switch_on.add_summand(self.nr_switch_on, 1)
-        eq_nr_switch_on.add_summand(self.switch_on, -1, as_sum=True)
+        eq_nr_switch_on.add_summand(self.switch_on, -1 * system_model.time_step_weights, as_sum=True)
 
     def _create_shares(self, system_model: SystemModel):
         # Anfahrkosten:
@@ -403,6 +419,18 @@ class OnOffModel(ElementModel):
             effect_collection.add_share_to_operation('running_hour_effects', self.element, effects_per_running_hour,
                                                      system_model.dt_in_hours, self.on)
 
+    def _previous_duration(self, binary_variable: VariableTS, dt_in_hours: Skalar) -> Skalar:
+        """
+        Duration of the last period of ones in the previous values. 0 if no history (an array of previous values)
+        is given for any defining Variable, as a scalar only describes the state before the first time step.
+        """
+        if all(var.previous_values is None or np.ndim(var.previous_values) == 0 for var in self._defining_variables):
+            return 0
+        previous_values = np.asarray(binary_variable.previous_values).reshape(-1)
+        zeros = np.flatnonzero(previous_values == 0)
+        nr_of_ones = len(previous_values) if len(zeros) == 0 else len(previous_values) - 1 - zeros[-1]
+        return nr_of_ones * dt_in_hours
+
     def _previous_on_values(self, epsilon: float = 1e-5) -> np.ndarray:
         # Gather previous values, ignoring empty (None) entries
         previous_values_of_variables = np.array([
@@ -555,8 +583,8 @@ class ShareAllocationModel(ElementModel):
             self._eq_time_series = create_equation(f'{self.label}_time_series', self)
             self._eq_time_series.add_summand(self.sum_TS, -1)
 
-            # eq: sum = sum(sum_TS(t)) # additionaly to self.sum
-            self._eq_sum.add_summand(self.sum_TS, 1, as_sum=True)
+            # eq: sum = sum(sum_TS(t)) # additionaly to self.sum. Weighted by the scenario of each time step
+            self._eq_sum.add_summand(self.sum_TS, system_model.time_step_weights, as_sum=True)
 
     def add_share(self,
                    system_model: SystemModel,
@@ -589,6 +617,7 @@ class ShareAllocationModel(ElementModel):
 
     def results(self):
         return {**{variable.label_short: variable.result for variable in self.variables.values()},
+                **self._marginal_results(),
                 **{'Shares': {variable.label_short: variable.result for variable in self.shares.values()}}}
 
 
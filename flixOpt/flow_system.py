@@ -4,15 +4,17 @@ Created on Wed Dec 16 12:40:23 2020
 developed by Felix Panitz* and Peter Stange*
 * at Chair of Building Energy Systems and Heat Supply, Technische Universität Dresden
 """
+import copy
 import pathlib
-from typing import List, Set, Tuple, Dict, Union, Optional, Literal
+from typing import List, Tuple, Dict, Union, Optional, Literal, Any
 import logging
 
 import numpy as np
 
 from . import utils
-from .core import TimeSeries
-from .structure import Element, SystemModel, get_object_infos_as_dict
+from .core import TimeSeries, TimeSeriesStore
+from .structure import Element, ElementModel, SystemModel, get_object_infos_as_dict
+from .math_modeling import MathModel
 from .elements import Bus, Flow, Component
 from .effects import Effect, EffectCollection
 
@@ -25,7 +27,9 @@ class FlowSystem:
     """
     def __init__(self,
                  time_series: np.ndarray[np.datetime64],
-                 last_time_step_hours: Optional[Union[int, float]] = None):
+                 last_time_step_hours: Optional[Union[int, float]] = None,
+                 scenarios: Optional[List[str]] = None,
+                 scenario_weights: Optional[Union[List[float], np.ndarray]] = None):
         """
           Parameters
           ----------
@@ -36,6 +40,16 @@ class FlowSystem:
               Storages needs this time-duration for calculation of charge state
               after last time step.
               If None, then last time increment of time_series is used.
+          scenarios : List[str], optional
+              Labels of the scenarios (e.g. weather years or price scenarios). Time series data can then be passed
+              with the shape (nr_of_scenarios, nr_of_time_steps), one row per scenario. Data of length
+              nr_of_time_steps and scalars are the same in all scenarios.
+              All scenarios are modeled in one model: Every VariableTS holds one block of time steps per scenario,
+              while investment decisions (sizes) are shared by all scenarios.
+          scenario_weights : List[float] or np.ndarray, optional
+              Probabilities of the scenarios, weighting the operation part of the effects, the penalty and all totals
+              over time (e.g. flow hours), which are the expected values over the scenarios. They must sum up to 1,
+              so the bounds of totals keep their meaning. If None, all scenarios have the same weight.
         """
         self.time_series = time_series
         self.last_time_step_hours = self.time_series[-1] - self.time_series[-2] if last_time_step_hours is None else last_time_step_hours
@@ -43,15 +57,34 @@ class FlowSystem:
 
         utils.check_time_series('time series of FlowSystem', self.time_series_with_end)
 
+        self.scenarios = list(scenarios) if scenarios is not None else None
+        if scenario_weights is not None:
+            if self.scenarios is None or len(scenario_weights) != len(self.scenarios):
+                raise ValueError('scenario_weights need one weight per scenario')
+            if np.any(np.asarray(scenario_weights) < 0):
+                raise ValueError('scenario_weights must not be negative')
+            if not np.isclose(np.sum(scenario_weights), 1):
+                raise ValueError(f'scenario_weights must sum up to 1, but sum up to {np.sum(scenario_weights)}')
+        self.scenario_weights = scenario_weights
+
         # defaults:
         self.components: List[Component] = []
         self.effect_collection: EffectCollection = EffectCollection('Effects')  # Organizes Effects, Penalty & Objective
         self.model: Optional[SystemModel] = None
+        self.time_series_store: Optional[TimeSeriesStore] = None  # Holds the data of all array-valued TimeSeries
+
+        # Topology, updated when adding Elements. Dicts are used as ordered sets
+        self._elements_by_label: Dict[str, Element] = {}  # label_full -> Element
+        self._flows: Dict[Flow, None] = {}
+        self._buses: Dict[Bus, None] = {}
+        self._all_elements: Optional[List[Element]] = None  # Cache, reset when adding Elements
 
     def add_effects(self, *args: Effect) -> None:
         for new_effect in list(args):
             logger.info(f'Registered new Effect: {new_effect.label}')
             self.effect_collection.add_effect(new_effect)
+            self._elements_by_label.setdefault(new_effect.label_full, new_effect)
+        self._all_elements = None
 
     def add_components(self, *args: Component) -> None:
         # Komponenten registrieren:
@@ -61,7 +94,19 @@ class FlowSystem:
             self._check_if_element_is_unique(new_component)  # check if already exists:
             new_component.register_component_in_flows()  # Komponente in Flow registrieren
             new_component.register_flows_in_bus()  # Flows in Bus registrieren:
+            self._register_topology(new_component)
         self.components.extend(new_components)  # Add to existing list of components
+        self._all_elements = None
+
+    def _register_topology(self, component: Component) -> None:
+        """ Adds the component, its flows and their buses to the label index """
+        self._elements_by_label[component.label_full] = component
+        for flow in component.inputs + component.outputs:
+            self._flows[flow] = None
+            self._elements_by_label.setdefault(flow.label_full, flow)
+            if flow.bus not in self._buses:
+                self._buses[flow.bus] = None
+                self._elements_by_label.setdefault(flow.bus.label_full, flow.bus)
 
     def add_elements(self, *args: Element) -> None:
         """
@@ -84,12 +129,110 @@ class FlowSystem:
     def transform_data(self):
         for element in self.all_elements:
             element.transform_data()
+        all_time_series = self.all_time_series
+        store = self.time_series_store
+        if store is None or not all(ts in store for ts in all_time_series if ts.is_array):
+            for time_series in all_time_series:
+                time_series.expand_to_scenarios(self.nr_of_scenarios, len(self.time_series))
+            self.time_series_store = TimeSeriesStore(all_time_series, len(self.time_series) * self.nr_of_scenarios)
+
+    def activate_indices(self, time_indices: Optional[Union[List[int], range]] = None) -> None:
+        """
+        Activates the time indices of all TimeSeries and removes their aggregated data.
+        Array-valued TimeSeries are activated through the time_series_store.
+        With scenarios, the time indices are activated in every scenario block.
+        """
+        time_indices = self.indices_of_all_scenarios(time_indices)
+        self.time_series_store.activate_indices(time_indices)
+        for time_series in self.all_time_series:
+            if time_series not in self.time_series_store:
+                time_series.clear_indices_and_aggregated_data()
+                time_series.activate_indices(time_indices)
+
+    @property
+    def nr_of_scenarios(self) -> int:
+        return len(self.scenarios) if self.scenarios is not None else 1
+
+    @property
+    def weights_of_scenarios(self) -> np.ndarray:
+        """ The scenario_weights, or equal weights summing up to 1 """
+        if self.scenario_weights is None:
+            return np.full(self.nr_of_scenarios, 1 / self.nr_of_scenarios)
+        return np.asarray(self.scenario_weights, dtype=float)
+
+    def indices_of_all_scenarios(self, time_indices: Optional[Union[List[int], range]]
+                                 ) -> Optional[Union[List[int], range]]:
+        """ Maps time indices to the indices of the expanded time series data, i.e. to the time indices in every scenario block """
+        if self.scenarios is None or time_indices is None:
+            return time_indices
+        nr_of_time_steps = len(self.time_series)
+        return [scenario * nr_of_time_steps + index
+                for scenario in range(self.nr_of_scenarios) for index in time_indices]
+
+    def snapshot(self) -> 'FlowSystem':
+        """
+        Returns an independent copy of the FlowSystem, to be used by a single calculation.
+        Calculations change the state of the Elements (TimeSeries, models, start values, ...). Calculations on
+        different snapshots of one FlowSystem do not share any of this state and can run concurrently, e.g. in threads.
+        Only modeling, translation and result extraction run in parallel: The solver calls of threads are serialized,
+        as pyomo redirects the output of the whole process while solving (see Solver.redirects_output). To solve in
+        parallel, use processes (e.g. PortfolioSolver or the OptimizationService).
+        The snapshot is cheap: Only the objects of flixOpt (Elements, TimeSeries, parameters, ...) and their
+        containers are copied shallowly. Everything else (numpy arrays of time series data and profiles, pandas
+        objects, ...) is shared with the original, and models of previous calculations are not copied.
+
+        Examples
+        --------
+        >>> with concurrent.futures.ThreadPoolExecutor() as executor:
+        ...     calculations = [FullCalculation(f'Calc_{i}', flow_system.snapshot(), time_indices=indices)
+        ...                     for i, indices in enumerate([range(0, 96), range(96, 192)])]
+        ...     executor.map(lambda calc: (calc.do_modeling(), calc.solve(solver)), calculations)
+        """
+        snapshot = _copy_for_snapshot(self, copies={})
+        for time_series in snapshot.all_time_series:  # Active data belongs to the calculations of the original
+            time_series.clear_indices_and_aggregated_data()
+        return snapshot
+
+    def to_file(self, path: Union[str, pathlib.Path]) -> None:
+        """
+        Saves the FlowSystem (topology, parameters and time series) to a compact file, which can be loaded
+        with FlowSystem.from_file(). Parameters are stored as a JSON document and numpy arrays in a binary
+        .npz container. Results and models of calculations are not stored.
+        """
+        from .serialization import flow_system_to_file
+        flow_system_to_file(self, str(path))
+
+    @classmethod
+    def from_file(cls, path: Union[str, pathlib.Path]) -> 'FlowSystem':
+        """ Loads a FlowSystem, which was saved with FlowSystem.to_file() """
+        from .serialization import flow_system_from_file
+        return flow_system_from_file(str(path))
+
+    def to_bytes(self) -> bytes:
+        """ Same format as FlowSystem.to_file(), e.g. to send the FlowSystem to worker processes """
+        from .serialization import flow_system_to_bytes
+        return flow_system_to_bytes(self)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'FlowSystem':
+        """ Creates a FlowSystem from the bytes of FlowSystem.to_bytes() """
+        from .serialization import flow_system_from_bytes
+        return flow_system_from_bytes(data)
+
+    def fingerprint(self) -> str:
+        """
+        Deterministic content hash of the FlowSystem: Equal topologies, parameters and time series lead to the same
+        fingerprint, independent of the python session. Only compare FlowSystems in the same state
+        (e.g. both after transform_data()), as the transformed data is encoded differently.
+        """
+        from .serialization import fingerprint
+        return fingerprint(self)
 
     def network_infos(self) -> Tuple[Dict[str, Dict[str, str]], Dict[str, Dict[str, str]]]:
         nodes = {node.label_full: {'label': node.label,
                                    'class': 'Bus' if isinstance(node, Bus) else 'Component',
                                    'infos':  node.__str__()}
-                 for node in self.components + list(self.all_buses)}
+                 for node in self.components + self.all_buses}
 
         edges = {flow.label_full: {'label': flow.label,
                                    'start': flow.bus.label_full if flow.is_input_in_comp else flow.comp.label_full,
@@ -163,12 +306,19 @@ class FlowSystem:
         element : Element
             new element to check
         """
-        if element in self.all_elements:
+        if self._elements_by_label.get(element.label_full) is element:
             raise Exception(f'Element {element.label} already added to FlowSystem!')
         # check if name is already used:
-        if element.label_full in [elem.label_full for elem in self.all_elements]:
+        if element.label_full in self._elements_by_label:
             raise Exception(f'Label of Element {element.label} already used in another element!')
 
+    def element_by_label(self, label_full: str) -> Element:
+        """ Returns the Component, Flow, Bus or Effect with the given full label """
+        try:
+            return self._elements_by_label[label_full]
+        except KeyError:
+            raise KeyError(f'No Element with label "{label_full}" in FlowSystem') from None
+
     def get_time_data_from_indices(self, time_indices: Optional[Union[List[int], range]] = None
                                    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.float64]:
         """
@@ -222,16 +372,21 @@ class FlowSystem:
         return f"FlowSystem with components:\n{components}\nand effects:\n{effects}"
 
     @property
-    def all_flows(self) -> Set[Flow]:
-        return {flow for comp in self.components for flow in comp.inputs + comp.outputs}
+    def all_flows(self) -> List[Flow]:
+        """ All Flows of the Components, in the order they were added """
+        return list(self._flows)
 
     @property
-    def all_buses(self) -> Set[Bus]:
-        return {flow.bus for flow in self.all_flows}
+    def all_buses(self) -> List[Bus]:
+        """ All Buses connected to the Flows, in the order they were added """
+        return list(self._buses)
 
     @property
     def all_elements(self) -> List[Element]:
-        return self.components + self.effect_collection.effects + list(self.all_flows) + list(self.all_buses)
+        if self._all_elements is None:
+            self._all_elements = (self.components + self.effect_collection.effects +
+                                  list(self._flows) + list(self._buses))
+        return self._all_elements
 
     @property
     def all_time_series(self) -> List[TimeSeries]:
@@ -239,6 +394,42 @@ class FlowSystem:
 
 
 
+def _copy_for_snapshot(obj: Any, copies: Dict[int, Any]) -> Any:
+    """
+    Copies the objects of flixOpt and the containers referencing them (see FlowSystem.snapshot()).
+    Other objects are shared, models are dropped. copies maps the ids of the originals to their copies.
+    """
+    if id(obj) in copies:
+        return copies[id(obj)]
+    if isinstance(obj, (ElementModel, MathModel)):
+        return None
+    if isinstance(obj, (dict, list, set)):
+        new = copy.copy(obj)
+        copies[id(obj)] = new
+        new.clear()
+        if isinstance(obj, dict):
+            new.update((_copy_for_snapshot(key, copies), _copy_for_snapshot(value, copies))
+                       for key, value in obj.items())
+        elif isinstance(obj, list):
+            new.extend(_copy_for_snapshot(item, copies) for item in obj)
+        else:
+            new.update(_copy_for_snapshot(item, copies) for item in obj)
+        return new
+    if isinstance(obj, tuple):
+        items = [_copy_for_snapshot(item, copies) for item in obj]
+        new = type(obj)(*items) if hasattr(obj, '_fields') else type(obj)(items)
+        copies[id(obj)] = new
+        return new
+    if type(obj).__module__.startswith(__package__) and hasattr(obj, '__dict__'):
+        new = copy.copy(obj)
+        copies[id(obj)] = new
+        vars(new).update({name: _copy_for_snapshot(value, copies) for name, value in vars(obj).items()})
+        if isinstance(new, TimeSeriesStore):
+            new.update_ids()
+        return new
+    return obj
+
+
 def create_datetime_array(start: str,
                           steps: Optional[int] = None,
                           freq: Literal['Y', 'M', 'W', 'D', 'h', 'm', 's'] = 'h',
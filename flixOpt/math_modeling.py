@@ -5,20 +5,47 @@ developed by Felix Panitz* and Peter Stange*
 * at Chair of Building Energy Systems and Heat Supply, Technische Universität Dresden
 """
 
+import contextlib
+import inspect
+import itertools
 import logging
+import os
+import pathlib
 import re
+import signal
+import threading
+import time
 import timeit
-from typing import List, Dict, Optional, Union, Literal, Any
+from typing import List, Dict, Optional, Union, Literal, Any, Tuple, Callable, TYPE_CHECKING
 from abc import ABC, abstractmethod
 
 import numpy as np
-import pyomo.environ as pyo
+
+try:
+    import resource  # Not available on windows
+except ImportError:
+    resource = None
 
 from . import utils
-from .core import Numeric
+from .core import Numeric, float_dtype
+
+if TYPE_CHECKING:  # pyomo is imported lazily, as importing it is slow
+    import pyomo.environ as pyo
 
 logger = logging.getLogger('flixOpt')
 
+# Pyomo wraps every solver call (SolverFactory().solve() and appsi's set_instance() and solve()) in capture_output(),
+# which replaces sys.stdout/sys.stderr and, for appsi, the file descriptors 1 and 2 of the whole process. Concurrent
+# solver calls would restore the streams of each other and lose or mix the output. So the solver calls of one process
+# are serialized (see _solver_call()), while building and translating models (see FlowSystem.snapshot()) and
+# extracting the results run concurrently
+_SOLVE_LOCK = threading.Lock()
+
+
+def _solver_call(solver: 'Solver') -> contextlib.AbstractContextManager:
+    """ Holds _SOLVE_LOCK during the solver call, if the solver redirects the output of this process """
+    return _SOLVE_LOCK if solver.redirects_output else contextlib.nullcontext()
+
 
 class Variable:
     """
@@ -48,8 +75,10 @@ class Variable:
 
         self.indices = range(self.length)
         self.fixed = False
+        self.index_aliases: Optional[np.ndarray] = None  # index -> index of the shared solver column
 
         self.result = None  # Ergebnis-Speicher
+        self.reduced_cost: Optional[Numeric] = None  # Only extracted on request (see MathModel.solve_duals())
 
         if self.fixed_value is not None:   # Check if value is within bounds, element-wise
             above = self.lower_bound is None or np.all(np.asarray(self.fixed_value) >= np.asarray(self.lower_bound))
@@ -76,6 +105,33 @@ class Variable:
 
     def reset_result(self):
         self.result = None
+        self.reduced_cost = None
+
+    def alias_indices(self, indices: np.ndarray, aliases: np.ndarray) -> None:
+        """
+        Maps the given indices to the indices in aliases, so that both share one column in the solver.
+        Aliases of aliases are resolved, so every index points directly to its representative index.
+
+        Parameters
+        ----------
+        indices : np.ndarray
+            Indices of the variable, that should not get an own column in the solver.
+        aliases : np.ndarray
+            Indices of the variable, whose column is used instead. Same length as indices.
+        """
+        assert len(indices) == len(aliases), f'The length of the indices must match!!'
+        if self.index_aliases is None:
+            self.index_aliases = np.arange(self.length)
+        self.index_aliases[np.asarray(indices, dtype=int)] = self.index_aliases[np.asarray(aliases, dtype=int)]
+        while not np.array_equal(self.index_aliases[self.index_aliases], self.index_aliases):
+            self.index_aliases = self.index_aliases[self.index_aliases]  # resolving chains of aliases
+
+    @property
+    def solver_indices(self) -> Union[range, List[int]]:
+        """ The indices, which get an own column in the solver """
+        if self.index_aliases is None:
+            return self.indices
+        return np.unique(self.index_aliases).tolist()
 
 
 class VariableTS(Variable):
@@ -120,6 +176,7 @@ class _Constraint:
         self.summands: List[SumOfSummand] = []
         self.parts_of_constant: List[Numeric] = []
         self.constant: Numeric = 0  # Total of right side
+        self.dual: Optional[Numeric] = None  # Only extracted on request (see MathModel.solve_duals())
 
         self.length = 1  # Anzahl der Gleichungen
 
@@ -319,6 +376,8 @@ class Summand:
         self.length = self._check_length()   # Länge ermitteln:
 
         self.factor_vec = utils.as_vector(factor, self.length)   # Faktor als Vektor:
+        if np.issubdtype(self.factor_vec.dtype, np.floating):  # Speichern in eingestellter Genauigkeit
+            self.factor_vec = self.factor_vec.astype(float_dtype(), copy=False)
 
     def description(self, at_index=0):
         i = 0 if self.length == 1 else at_index
@@ -494,14 +553,54 @@ class MathModel:
             raise NotImplementedError('Modeling Language cvxpy is not yet implemented')
         self.duration['Translation'] = round(timeit.default_timer() - t_start, 2)
 
-    def solve(self, solver: 'Solver') -> None:
+    def update(self, *parts: Union[Variable, Equation, Inequation],
+               indices: Optional[Dict[Union[Variable, Equation, Inequation], np.ndarray]] = None) -> None:
+        """
+        Transfers changes of already translated parts to the modeling language: The bounds and fixed values of
+        Variables, the factors and constants of Constraints and the summands of the objective. The rest of the
+        translated model is kept, so solvers can reuse their previous solution (see Solver.warm_start).
+        indices limits the update of a part to the changed indices of a Variable or the changed rows of a Constraint.
+        Parts without indices are updated completely.
+        """
+        indices = indices or {}
+        for part in parts:
+            if isinstance(part, Variable):
+                self.model.update_variable(part, indices.get(part))
+            elif isinstance(part, Equation) and part.is_objective:
+                self.model.update_objective(part)
+            elif isinstance(part, (Equation, Inequation)):
+                self.model.update_constraint(part, indices.get(part))
+            else:
+                raise TypeError(f'{part} cant be updated!')
+
+    def solve(self, solver: 'Solver', variables: Optional[List[Variable]] = None) -> None:
+        """
+        Solves the model. The results of the variables are extracted afterward.
+        If variables are given, only the results of these variables are extracted. All others remain None.
+        """
         self.solver = solver
         t_start = timeit.default_timer()
         for variable in self.variables:
             variable.reset_result()  # altes Ergebnis löschen (falls vorhanden)
-        self.model.solve(self, solver)
+        for constraint in self._constraints:
+            constraint.dual = None
+        self.model.solve(self, solver, variables)
         self.duration['Solving'] = round(timeit.default_timer() - t_start, 2)
 
+    def solve_duals(self,
+                    constraints: List[Union[Equation, Inequation]],
+                    variables: List[Variable]) -> None:
+        """
+        Extracts the dual values of the given constraints and the reduced costs of the given variables after solve().
+        Duals only exist for LPs. Therefore, the binary variables are fixed to their solution and the
+        remaining LP is solved once more with the same solver. The results of solve() are kept.
+        The duals are the change of the objective per unit of the constant of a constraint (∂objective/∂constant).
+        """
+        assert self.solver is not None, 'The model must be solved before extracting the duals'
+        t_start = timeit.default_timer()
+        self.model.solve_duals(self, self.solver, constraints, variables)
+        self.duration['Duals'] = round(timeit.default_timer() - t_start, 2)
+
     def results(self) -> Dict[str, Numeric]:
         return {variable.label: variable.result for variable in self.variables}
 
@@ -517,7 +616,9 @@ class MathModel:
                     'No. of Vars. (single)': self.nr_of_single_variables,
                     'No. of Vars. (TS)': len(self.ts_variables),
                 },
-                'Solver Log': self.solver.log.infos if isinstance(self.solver.log, SolverLog) else self.solver.log}
+                'Solver Log': self.solver.log.infos if isinstance(self.solver.log, SolverLog) else self.solver.log,
+                'Solver Statistics': self.solver.statistics.infos if self.solver.statistics is not None else None,
+                'Solver Progress': [progress.infos() for progress in self.solver.progress]}
 
     @property
     def variables(self) -> List[Variable]:
@@ -581,6 +682,8 @@ class SolverLog:
         presolved_continuous (Optional[int]): Number of continuous variables after presolving.
         presolved_integer (Optional[int]): Number of integer variables after presolving.
         presolved_binary (Optional[int]): Number of binary variables after presolving.
+        iterations (Optional[int]): Number of simplex iterations.
+        nodes (Optional[int]): Number of explored branch and bound nodes.
     """
     def __init__(self, solver_name: str, filename: str):
         with open(filename, 'r') as file:
@@ -595,6 +698,9 @@ class SolverLog:
         self.presolved_continuous = None
         self.presolved_integer = None
         self.presolved_binary = None
+
+        self.iterations = None
+        self.nodes = None
         self.parse_infos()
 
     @property
@@ -607,7 +713,9 @@ class SolverLog:
                 'binary': self.presolved_binary,
                 'rows': self.presolved_rows,
                 'nonzeros': self.presolved_nonzeros,
-            }
+            },
+            'iterations': self.iterations,
+            'nodes': self.nodes,
         }
 
     # Suche infos aus log:
@@ -641,6 +749,12 @@ class SolverLog:
                 self.presolved_integer = int(match.group(5))
                 self.presolved_binary = int(match.group(6))
 
+            # string: Explored 1 nodes (152 simplex iterations) in 0.05 seconds (0.01 work units)
+            match = re.search(r'Explored (\d+) nodes \((\d+) simplex iterations\)', self.log)
+            if match:
+                self.nodes = int(match.group(1))
+                self.iterations = int(match.group(2))
+
         elif self.solver_name == 'cbc':
 
             # string: Presolve 1623 (-1079) rows, 1430 (-1078) columns and 4296 (-3306) elements
@@ -657,13 +771,290 @@ class SolverLog:
                 self.presolved_binary = int(match.group(2))
                 self.presolved_continuous = self.presolved_cols - self.presolved_integer
 
+            # string: Enumerated nodes:               0
+            #         Total iterations:               152
+            match = re.search(r'Enumerated nodes:\s+(\d+)\s+Total iterations:\s+(\d+)', self.log)
+            if not match is None:
+                self.nodes = int(match.group(1))
+                self.iterations = int(match.group(2))
+
+        elif self.solver_name == 'highs':
+
+            # string: Presolve reductions: rows 237(-259); columns 380(-308); nonzeros 807(-944)
+            match = re.search(r'Presolve reductions: rows (\d+)\(-?\d+\); columns (\d+)\(-?\d+\); '
+                              r'nonzeros (\d+)', self.log)
+            if not match is None:
+                self.presolved_rows = int(match.group(1))
+                self.presolved_cols = int(match.group(2))
+                self.presolved_nonzeros = int(match.group(3))
+
+            # string: Solving MIP model with:
+            #            237 rows
+            #            380 cols (142 binary, 0 integer, 0 implied int., 238 continuous, 0 domain fixed)
+            match = re.search(r'Solving MIP model with:\s+(\d+) rows\s+(\d+) cols \((\d+) binary, (\d+) integer, '
+                              r'(\d+) implied int\., (\d+) continuous', self.log)
+            if not match is None:
+                self.presolved_rows = int(match.group(1))
+                self.presolved_cols = int(match.group(2))
+                self.presolved_binary = int(match.group(3))
+                self.presolved_integer = int(match.group(3)) + int(match.group(4)) + int(match.group(5))
+                self.presolved_continuous = int(match.group(6))
+
+        elif self.solver_name == 'cplex':
+
+            # string: Reduced MIP has 237 rows, 380 columns, and 807 nonzeros.
+            #         Reduced MIP has 142 binaries, 0 generals, 0 SOSs, and 0 indicators.
+            match = re.search(r'Reduced MIP has (\d+) rows, (\d+) columns, and (\d+) nonzeros\.\s*'
+                              r'Reduced MIP has (\d+) binaries, (\d+) generals', self.log)
+            if not match is None:
+                self.presolved_rows = int(match.group(1))
+                self.presolved_cols = int(match.group(2))
+                self.presolved_nonzeros = int(match.group(3))
+                self.presolved_binary = int(match.group(4))
+                self.presolved_integer = int(match.group(4)) + int(match.group(5))
+                self.presolved_continuous = self.presolved_cols - self.presolved_integer
+
+            # string: Solution time =    0.05 sec.  Iterations = 152  Nodes = 0
+            match = re.search(r'Iterations = (\d+)\s+Nodes = (\d+)', self.log)
+            if not match is None:
+                self.iterations = int(match.group(1))
+                self.nodes = int(match.group(2))
+
         elif self.solver_name == 'glpk':
-            logger.warning(f'{"":#^80}\n')
-            logger.warning(f'{" No solver-log parsing implemented for glpk yet! ":#^80}\n')
+
+            # string: Preprocessing...
+            #          237 rows, 380 columns, 807 non-zeros
+            #          142 integer variables, all of which are binary
+            match = re.search(r'Preprocessing\.\.\.\s+(\d+) rows?, (\d+) columns?, (\d+) non-zeros?'
+                              r'(?:\s+(\d+) integer variables?, (?:(all) of which are binary|(\d+) of which))?',
+                              self.log)
+            if not match is None:
+                self.presolved_rows = int(match.group(1))
+                self.presolved_cols = int(match.group(2))
+                self.presolved_nonzeros = int(match.group(3))
+                if match.group(4) is not None:
+                    self.presolved_integer = int(match.group(4))
+                    self.presolved_binary = self.presolved_integer if match.group(5) else int(match.group(6))
+                    self.presolved_continuous = self.presolved_cols - self.presolved_integer
+
+            # string: +   561: mip =   4.517234043e+03 >=     tree is empty   0.0% (0; 53)
+            matches = re.findall(r'^[+*]\s*(\d+): .*\((\d+); (\d+)\)\s*$', self.log, flags=re.MULTILINE)
+            if matches:
+                self.iterations = int(matches[-1][0])
+                self.nodes = int(matches[-1][1]) + int(matches[-1][2])
         else:
             raise Exception('SolverLog.parse_infos() is not defined for solver ' + self.solver_name)
 
 
+class SolverStatistics:
+    """
+    Statistics of a solve, filled the same way by every Solver, to compare solver performance across runs.
+    Values, which are not reported by a solver, are None.
+
+    Attributes:
+        termination_status (Optional[str]): Pyomo's termination condition (e.g. 'optimal', 'maxTimeLimit').
+        wall_time (Optional[float]): Wall clock time of the solve in seconds.
+        cpu_time (Optional[float]): CPU time of the solve in seconds, including solver executables
+            (child processes are only measured on unix).
+        iterations (Optional[int]): Number of simplex iterations.
+        nodes (Optional[int]): Number of explored branch and bound nodes.
+        presolved_rows (Optional[int]): Number of rows after presolving.
+        presolved_cols (Optional[int]): Number of columns after presolving.
+        presolved_nonzeros (Optional[int]): Number of nonzeros after presolving.
+        binaries (Optional[int]): Number of binary variables after presolving.
+        objective (Optional[float]): Objective value of the solution.
+        best_bound (Optional[float]): Best bound from the solver.
+        gap (Optional[float]): Final relative gap between objective and best bound.
+    """
+    def __init__(self,
+                 termination_status: Optional[str] = None,
+                 wall_time: Optional[float] = None,
+                 cpu_time: Optional[float] = None,
+                 iterations: Optional[int] = None,
+                 nodes: Optional[int] = None,
+                 objective: Optional[float] = None,
+                 best_bound: Optional[float] = None,
+                 gap: Optional[float] = None,
+                 log: Optional[SolverLog] = None):
+        """ Values, which are not given, are taken from the parsed log (if available) """
+        self.termination_status = termination_status
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.iterations = iterations if iterations is not None or log is None else log.iterations
+        self.nodes = nodes if nodes is not None or log is None else log.nodes
+        self.presolved_rows = None if log is None else log.presolved_rows
+        self.presolved_cols = None if log is None else log.presolved_cols
+        self.presolved_nonzeros = None if log is None else log.presolved_nonzeros
+        self.binaries = None if log is None else log.presolved_binary
+        self.objective = _float_or_none(objective)
+        self.best_bound = _float_or_none(best_bound)
+        if gap is None and self.objective is not None and self.best_bound is not None:
+            gap = abs(self.objective - self.best_bound) / max(abs(self.objective), 1e-10)
+        self.gap = gap
+
+    @property
+    def infos(self) -> Dict[str, Union[str, int, float, None]]:
+        return {'termination_status': self.termination_status,
+                'wall_time': self.wall_time,
+                'cpu_time': self.cpu_time,
+                'iterations': self.iterations,
+                'nodes': self.nodes,
+                'presolved_rows': self.presolved_rows,
+                'presolved_cols': self.presolved_cols,
+                'presolved_nonzeros': self.presolved_nonzeros,
+                'binaries': self.binaries,
+                'objective': self.objective,
+                'best_bound': self.best_bound,
+                'gap': self.gap}
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__}>: {self.infos}'
+
+
+def _cpu_time() -> float:
+    """ CPU time of this process and its terminated child processes (solver executables) """
+    cpu_time = time.process_time()
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_time += children.ru_utime + children.ru_stime
+    return cpu_time
+
+
+class SolverProgress:
+    """
+    State of a running solver, reported to the callbacks of the Solver.
+
+    Attributes:
+        elapsed_seconds (float): Time since the start of the solve.
+        objective (Optional[float]): Objective of the best solution found so far (incumbent).
+        best_bound (Optional[float]): Best bound of the objective.
+        gap (Optional[float]): Relative gap between objective and best bound.
+        nodes (Optional[int]): Number of explored branch and bound nodes.
+    """
+    def __init__(self,
+                 elapsed_seconds: float,
+                 objective: Optional[float] = None,
+                 best_bound: Optional[float] = None,
+                 gap: Optional[float] = None,
+                 nodes: Optional[int] = None):
+        self.elapsed_seconds = elapsed_seconds
+        self.objective = objective
+        self.best_bound = best_bound
+        if gap is None and objective is not None and best_bound is not None:
+            gap = abs(objective - best_bound) / max(abs(objective), 1e-10)
+        self.gap = gap
+        self.nodes = nodes
+
+    def infos(self) -> Dict[str, Optional[float]]:
+        return {'elapsed_seconds': self.elapsed_seconds, 'objective': self.objective, 'best_bound': self.best_bound,
+                'gap': self.gap, 'nodes': self.nodes}
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}>: {self.infos()}"
+
+
+class EarlyStop:
+    """
+    Callback for Solver.callbacks, which stops the solver, once the gap is reached after a minimum solving time.
+    Early stopping needs native callbacks of the solver, which are only available for the HighsSolver.
+
+    Examples:
+        >>> solver = HighsSolver(mip_gap=0.001)
+        >>> solver.callbacks.append(EarlyStop(gap=0.02, after_seconds=60))  # stop when gap < 2% after 60 s
+    """
+    def __init__(self, gap: float, after_seconds: float = 0):
+        self.gap = gap
+        self.after_seconds = after_seconds
+
+    def __call__(self, progress: SolverProgress) -> bool:
+        return (progress.elapsed_seconds >= self.after_seconds and
+                progress.gap is not None and progress.gap < self.gap)
+
+
+class _LogTailer:
+    """
+    Reads the log file of a solver while it is solving and reports the progress to the solver.
+    Used for solvers, which are called as executables without callbacks. Early stopping is not possible this way.
+    """
+    _PATTERNS = {
+        # H    12     5               4600.0000 4517.23404  1.81%   2.0    3s
+        'gurobi': re.compile(r'^[H* ]?\s*(?P<nodes>\d+)\s+\d+\s.*?(?P<objective>-?\d[\d.e+-]*|-)\s+'
+                             r'(?P<bound>-?\d[\d.e+-]*)\s+(?P<gap>[\d.]+)%\s+\S+\s+(?P<seconds>\d+)s\s*$'),
+        # Cbc0010I After 100 nodes, 12 on tree, 4600 best solution, best possible 4517.2 (0.52 seconds)
+        'cbc': re.compile(r'Cbc0010I After (?P<nodes>\d+) nodes, \d+ on tree, (?P<objective>\S+) best solution, '
+                          r'best possible (?P<bound>\S+) \((?P<seconds>[\d.]+) seconds\)'),
+        # +   561: mip =   4.600000000e+03 >=   4.517234043e+03   1.8% (26; 0)
+        'glpk': re.compile(r'^[+*]\s*\d+: (?:mip =|>>>>>)\s+(?P<objective>not found yet|\S+)\s+[<>]=\s+(?P<bound>\S+)'
+                           r'(?:\s+(?P<gap>[\d.]+)%)?.*\((?P<nodes>\d+);'),
+    }
+
+    def __init__(self, solver: 'Solver', solver_name: str):
+        self.solver = solver
+        self.pattern = self._PATTERNS[solver_name]
+        self.path = pathlib.Path(solver.logfile_name) if solver.logfile_name is not None else None
+        self._position = 0
+        self._incomplete_line = ''
+        self._t_start = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._warned = False
+
+    def __enter__(self):
+        self.solver._reset_progress()
+        self._t_start = timeit.default_timer()
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)  # The log of a previous solve would be read otherwise
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._read()
+
+    def _run(self) -> None:
+        while not self._stop.wait(0.5):
+            self._read()
+
+    def _read(self) -> None:
+        try:
+            with open(self.path, 'r', errors='replace') as file:
+                file.seek(self._position)
+                text = file.read()
+                self._position = file.tell()
+        except OSError:  # Not yet created by the solver
+            return
+        *lines, self._incomplete_line = (self._incomplete_line + text).split('\n')
+        for line in lines:
+            match = self.pattern.search(line)
+            if match is not None:
+                self._report(match.groupdict())
+
+    def _report(self, values: Dict[str, Optional[str]]) -> None:
+        seconds = values.get('seconds')
+        progress = SolverProgress(
+            elapsed_seconds=float(seconds) if seconds else round(timeit.default_timer() - self._t_start, 2),
+            objective=_float_or_none(values['objective']),
+            best_bound=_float_or_none(values['bound']),
+            gap=float(values['gap']) / 100 if values.get('gap') else None,
+            nodes=int(values['nodes']))
+        if self.solver._report_progress(progress) and not self._warned:
+            logger.warning(f'Early stopping is not supported by the {self.solver.__class__.__name__}. '
+                           f'Solving continues.')
+            self._warned = True
+
+
+def _float_or_none(value: Optional[str]) -> Optional[float]:
+    """ Converts values of solver logs. Missing values ('-', 'not found yet', 1e50, ...) are returned as None """
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if abs(number) < 1e50 else None
+
+
 class Solver(ABC):
     """
     Abstract base class for solvers.
@@ -676,7 +1067,21 @@ class Solver(ABC):
         objective (Optional[float]): Objective value from the solution.
         best_bound (Optional[float]): Best bound from the solver.
         termination_message (Optional[str]): Solver's termination message.
+        callbacks (List[Callable[[SolverProgress], Optional[bool]]]): Called with the progress during solving.
+            If a callback returns True, the solver is stopped early (only supported by the HighsSolver).
+        progress (List[SolverProgress]): Trajectory of the last solve (incumbent, bound, gap, nodes over time).
+            Reported by native callbacks (HiGHS) or read from the log file (Gurobi, CBC, GLPK).
+        statistics (Optional[SolverStatistics]): Statistics of the last solve (status, times, iterations, nodes, ...).
+        warm_start (bool): If True, the solver starts from the solution of the previous solve of the same model.
+            HiGHS keeps its instance and only receives the changes of the model, Gurobi, CPLEX and CBC receive the
+            previous solution as start values. Used for sweeps (see FullCalculation.sweep()).
+        supports_marginal_values (bool): If the solver provides duals and reduced costs (see dual_values()).
+        redirects_output (bool): If pyomo redirects the output of this process while solving. The solver calls of
+            these solvers are serialized between threads (see _SOLVE_LOCK).
     """
+    supports_marginal_values = True
+    redirects_output = True
+
     def __init__(self,
                  mip_gap: float,
                  solver_output_to_console: bool,
@@ -690,13 +1095,108 @@ class Solver(ABC):
         self.best_bound: Optional[float] = None
         self.termination_message: Optional[str] = None
         self.log: Optional[str, SolverLog] = None
+        self.callbacks: List[Callable[[SolverProgress], Optional[bool]]] = []
+        self.progress: List[SolverProgress] = []
+        self.statistics: Optional[SolverStatistics] = None
+        self.warm_start = False
 
         self._solver = None
         self._results: Optional[float, str] = None
+        self._stop_requested = False
+        self._times: Tuple[float, float] = (0, 0)  # Wall and CPU time of the last solve
 
     def solve(self, modeling_language: 'ModelingLanguage'):
         raise NotImplementedError(f' Solving is not possible with this Abstract class')
 
+    @contextlib.contextmanager
+    def _measure_time(self):
+        """ Measures the wall and CPU time of the solve for the statistics """
+        wall_start, cpu_start = timeit.default_timer(), _cpu_time()
+        yield
+        self._times = (round(timeit.default_timer() - wall_start, 3), round(_cpu_time() - cpu_start, 3))
+
+    def _load_log(self, solver_name: str) -> Optional[SolverLog]:
+        try:
+            return SolverLog(solver_name, self.logfile_name)
+        except Exception as e:
+            logger.warning(f'SolverLog could not be loaded. {e}')
+            return None
+
+    def _create_statistics(self, termination_status: str, **values) -> SolverStatistics:
+        return SolverStatistics(termination_status=termination_status,
+                                wall_time=self._times[0],
+                                cpu_time=self._times[1],
+                                objective=self.objective,
+                                best_bound=self.best_bound,
+                                log=self.log if isinstance(self.log, SolverLog) else None,
+                                **values)
+
+    def _reset_progress(self) -> None:
+        self.progress = []
+        self._stop_requested = False
+
+    def _report_progress(self, progress: SolverProgress) -> bool:
+        """ Stores the progress and calls the callbacks. Returns True, if a callback requested to stop """
+        self.progress.append(progress)
+        for callback in self.callbacks:
+            if callback(progress) and not self._stop_requested:
+                logger.info(f'{self.__class__.__name__}: Early stop requested by {callback!r} at {progress!r}')
+                self._stop_requested = True
+        return self._stop_requested
+
+    def primal_values(self, pyomo_vars: List[Any]) -> np.ndarray:
+        """
+        Solution of all columns of the given pyomo variables (in this order) as one array.
+        By default, the values are read from the pyomo model, into which the solver loaded the solution.
+        """
+        nr_of_columns = sum(len(pyomo_var) for pyomo_var in pyomo_vars)
+        # fromiter() with count allocates the array once and is 5-7x faster than np.array(list(...))
+        return np.fromiter(itertools.chain.from_iterable(pyomo_var.extract_values().values()
+                                                         for pyomo_var in pyomo_vars),
+                           dtype=np.float64, count=nr_of_columns)
+
+    def dual_values(self, pyomo_constraints: List[Any]) -> np.ndarray:
+        """
+        Duals of all rows of the given pyomo constraints (in this order) as one array.
+        By default, the duals are read from the 'dual' suffix of the pyomo model.
+        """
+        return np.fromiter((constraint_data.model().dual[constraint_data] for pyomo_constraint in pyomo_constraints
+                            for constraint_data in pyomo_constraint.values()),
+                           dtype=np.float64, count=sum(len(pyomo_constraint) for pyomo_constraint in pyomo_constraints))
+
+    def reduced_costs(self, pyomo_vars: List[Any]) -> np.ndarray:
+        """
+        Reduced costs of all columns of the given pyomo variables (in this order) as one array.
+        By default, the reduced costs are read from the 'rc' suffix of the pyomo model.
+        """
+        return np.fromiter((var_data.model().rc[var_data] for pyomo_var in pyomo_vars for var_data in pyomo_var.values()),
+                           dtype=np.float64, count=sum(len(pyomo_var) for pyomo_var in pyomo_vars))
+
+    @contextlib.contextmanager
+    def _keeping_results(self):
+        """
+        Restores the results of the current solve after an additional solve, e.g. for duals. Nothing is logged.
+        The additional solve gets its own solver instance, so the instance of the current solve (used for its
+        solution and later warm starts) is not altered.
+        """
+        names = ('objective', 'best_bound', 'termination_message', 'log', 'progress', 'statistics', 'logfile_name',
+                 '_solver', '_results')
+        kept = {name: getattr(self, name) for name in names}
+        self.logfile_name = None
+        self._solver = None
+        try:
+            yield
+        finally:
+            for name, value in kept.items():
+                setattr(self, name, value)
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """ The parameters of the Solver, which influence the solution (logging parameters are excluded) """
+        parameters = inspect.signature(type(self).__init__).parameters
+        return {name: getattr(self, name) for name in parameters
+                if name not in ('self', 'logfile_name', 'solver_output_to_console')}
+
     def __repr__(self):
         return (f"{self.__class__.__name__}("
                 f"mip_gap={self.mip_gap}, "
@@ -726,21 +1226,21 @@ class GurobiSolver(Solver):
         self.time_limit_seconds = time_limit_seconds
 
     def solve(self, modeling_language: 'ModelingLanguage'):
+        import pyomo.environ as pyo
         if isinstance(modeling_language, PyomoModel):
             self._solver = pyo.SolverFactory('gurobi')
-            self._results = self._solver.solve(
-                modeling_language.model, tee=self.solver_output_to_console, keepfiles=True, logfile=self.logfile_name,
-                options={"mipgap": self.mip_gap, "TimeLimit": self.time_limit_seconds}
-            )
+            with _LogTailer(self, 'gurobi'), self._measure_time():
+                self._results = self._solver.solve(
+                    modeling_language.model, tee=self.solver_output_to_console, keepfiles=True,
+                    logfile=self.logfile_name, warmstart=self.warm_start,
+                    options={"mipgap": self.mip_gap, "TimeLimit": self.time_limit_seconds}
+                )
 
             self.objective = modeling_language.model.objective.expr()
             self.termination_message = self._results['Solver'][0]['Termination message']
             self.best_bound = self._results['Problem'][0]['Lower bound']
-            try:
-                self.log = SolverLog('gurobi', self.logfile_name)
-            except Exception as e:
-                self.log = None
-                logger.warning(f'SolverLog could not be loaded. {e}')
+            self.log = self._load_log('gurobi')
+            self.statistics = self._create_statistics(str(self._results.solver.termination_condition))
         else:
             raise NotImplementedError(f'Only Pyomo is implemented for GUROBI solver.')
 
@@ -764,17 +1264,22 @@ class CplexSolver(Solver):
         self.time_limit_seconds = time_limit_seconds
 
     def solve(self, modeling_language: 'ModelingLanguage'):
+        import pyomo.environ as pyo
         if isinstance(modeling_language, PyomoModel):
             self._solver = pyo.SolverFactory('cplex')
-            self._results = self._solver.solve(
-                modeling_language.model, tee=self.solver_output_to_console, keepfiles=True, logfile=self.logfile_name,
-                options={"mipgap": self.mip_gap, "timelimit": self.time_limit_seconds}
-            )
+            with self._measure_time():
+                self._results = self._solver.solve(
+                    modeling_language.model, tee=self.solver_output_to_console, keepfiles=True,
+                    logfile=self.logfile_name, warmstart=self.warm_start,
+                    options={"mipgap": self.mip_gap, "timelimit": self.time_limit_seconds}
+                )
 
             self.objective = modeling_language.model.objective.expr()
-            self.termination_message: Optional[str] = f'Not Implemented for {self.__class__.__name__} yet'
+            termination_status = str(self._results.solver.termination_condition)
+            self.termination_message = self._results.solver.termination_message or termination_status
             self.best_bound = self._results['Problem'][0]['Lower bound']
-            self.log = f'Not Implemented for {self.__class__.__name__} yet'
+            self.log = self._load_log('cplex')
+            self.statistics = self._create_statistics(termination_status)
         else:
             raise NotImplementedError(f'Only Pyomo is implemented for CPLEX solver.')
 
@@ -803,23 +1308,104 @@ class HighsSolver(Solver):
     def solve(self, modeling_language: 'ModelingLanguage'):
         if isinstance(modeling_language, PyomoModel):
             from pyomo.contrib import appsi
-            self._solver = appsi.solvers.Highs()
+            # With warm_start, the instance is kept. It only receives the changes of the model and reuses the basis
+            keep_instance = (self.warm_start and self._solver is not None and
+                             getattr(self._solver, '_model', None) is modeling_language.model)
+            if not keep_instance:
+                self._solver = appsi.solvers.Highs()
             self._solver.highs_options = {"mip_rel_gap": self.mip_gap,
                                           "time_limit": self.time_limit_seconds,
-                                          "log_file": "results/highs.log",
+                                          "log_file": str(self.logfile_name) if self.logfile_name else '',
                                           "log_to_console": self.solver_output_to_console,
                                           "threads": self.threads,
                                           "parallel": "on",
                                           "presolve": "on",
                                           "output_flag": True}
-            self._results = self._solver.solve(modeling_language.model)
-            self.objective = modeling_language.model.objective.expr()
-            self.termination_message: Optional[str] = f'Not Implemented for {self.__class__.__name__} yet'
+            self._solver.config.load_solution = False  # Loaded below, as early stopped solves are not loaded by pyomo
+            if self.logfile_name:
+                pathlib.Path(self.logfile_name).unlink(missing_ok=True)  # HiGHS appends to existing logs
+            if not keep_instance:  # A kept instance is updated by pyomo in solve()
+                self._solver.set_instance(modeling_language.model)
+            highs = _highspy_instance_of(self._solver)
+            self._reset_progress()
+            # The callback API of highspy (>= 1.8.0) reports the progress, which is needed for early stopping
+            native_callbacks = hasattr(highs, 'cbMipInterrupt')
+            if not native_callbacks and self.callbacks:
+                raise ImportError('Callbacks of the HighsSolver need highspy >= 1.8.0. '
+                                  'Upgrade it with "pip install -U highspy"')
+            if native_callbacks:
+                highs.cbMipInterrupt.subscribe(self._on_mip_interrupt)
+            try:
+                with self._measure_time():
+                    self._results = self._solver.solve(modeling_language.model)
+            finally:
+                if native_callbacks:
+                    highs.cbMipInterrupt.unsubscribe(self._on_mip_interrupt)
+            self.termination_message = highs.modelStatusToString(highs.getModelStatus())
+            if not highs.getSolution().value_valid:
+                raise Exception(f'HiGHS found no feasible solution. Model status: {self.termination_message}')
+            # The solution is not loaded into the pyomo model, but pulled directly from HiGHS (see primal_values())
+            info = highs.getInfo()
+            self.objective = info.objective_function_value
             self.best_bound = self._results.best_objective_bound
-            self.log = f'Not Implemented for {self.__class__.__name__} yet'
+            self.log = self._load_log('highs') if self.logfile_name else None
+            self.statistics = self._create_statistics(
+                self._results.termination_condition.name,
+                iterations=sum(count for count in (info.simplex_iteration_count, info.ipm_iteration_count) if count > 0),
+                nodes=info.mip_node_count if info.mip_node_count >= 0 else None)
         else:
             raise NotImplementedError(f'Only Pyomo is implemented for HIGHS solver.')
 
+    def primal_values(self, pyomo_vars: List[Any]) -> np.ndarray:
+        """ Takes the solution from the column values of HiGHS, which is much faster than loading it into pyomo """
+        column_of_var = getattr(self._solver, '_pyomo_var_to_solver_var_map', None)  # Private in pyomo
+        if column_of_var is None:
+            self._solver.load_vars()
+            return super().primal_values(pyomo_vars)
+        nr_of_columns = sum(len(pyomo_var) for pyomo_var in pyomo_vars)
+        columns = np.fromiter((column_of_var[id(var_data)] for pyomo_var in pyomo_vars for var_data in pyomo_var.values()),
+                              dtype=np.int64, count=nr_of_columns)
+        return np.asarray(_highspy_instance_of(self._solver).getSolution().col_value)[columns]
+
+    def dual_values(self, pyomo_constraints: List[Any]) -> np.ndarray:
+        constraints = [constraint_data for pyomo_constraint in pyomo_constraints
+                       for constraint_data in pyomo_constraint.values()]
+        duals = self._solver.get_duals(constraints)
+        return np.fromiter((duals[constraint_data] for constraint_data in constraints),
+                           dtype=np.float64, count=len(constraints))
+
+    def reduced_costs(self, pyomo_vars: List[Any]) -> np.ndarray:
+        variables = [var_data for pyomo_var in pyomo_vars for var_data in pyomo_var.values()]
+        reduced_costs = self._solver.get_reduced_costs(variables)
+        return np.fromiter((reduced_costs[var_data] for var_data in variables),
+                           dtype=np.float64, count=len(variables))
+
+    def _on_mip_interrupt(self, event) -> None:
+        """ Native HiGHS callback, called regularly during branch and bound """
+        data = event.data_out
+        progress = SolverProgress(elapsed_seconds=round(data.running_time, 2),
+                                  objective=_float_or_none(data.mip_primal_bound),
+                                  best_bound=_float_or_none(data.mip_dual_bound),
+                                  gap=_float_or_none(data.mip_gap),
+                                  nodes=int(data.mip_node_count))
+        # Reported if the state changed, or at least every second (for rules depending on the time)
+        last = self.progress[-1] if self.progress else None
+        if (last is None or progress.elapsed_seconds - last.elapsed_seconds >= 1 or
+                (progress.objective, progress.best_bound, progress.nodes) != (last.objective, last.best_bound, last.nodes)):
+            self._report_progress(progress)
+        if self._stop_requested:
+            event.interrupt()
+
+
+
+def _highspy_instance_of(appsi_solver: Any) -> Any:
+    """ The highspy instance of pyomo's appsi Highs interface. It is private in pyomo, so its presence is checked """
+    highs = getattr(appsi_solver, '_solver_model', None)
+    if highs is None:
+        import pyomo.version
+        raise NotImplementedError(f'The HighsSolver needs the highspy instance of pyomo.contrib.appsi.solvers.Highs, '
+                                  f'which is not available in Pyomo {pyomo.version.version}')
+    return highs
 
 class CbcSolver(Solver):
     """
@@ -840,16 +1426,21 @@ class CbcSolver(Solver):
         self.time_limit_seconds = time_limit_seconds
 
     def solve(self, modeling_language: 'ModelingLanguage'):
+        import pyomo.environ as pyo
         if isinstance(modeling_language, PyomoModel):
             self._solver = pyo.SolverFactory('cbc')
-            self._results = self._solver.solve(
-                modeling_language.model, tee=self.solver_output_to_console, keepfiles=True, logfile=self.logfile_name,
-                options={"ratio": self.mip_gap, "sec": self.time_limit_seconds}
-            )
+            with _LogTailer(self, 'cbc'), self._measure_time():
+                self._results = self._solver.solve(
+                    modeling_language.model, tee=self.solver_output_to_console, keepfiles=True,
+                    logfile=self.logfile_name, warmstart=self.warm_start,
+                    options={"ratio": self.mip_gap, "sec": self.time_limit_seconds}
+                )
             self.objective = modeling_language.model.objective.expr()
-            self.termination_message: Optional[str] = f'Not Implemented for {self.__class__.__name__} yet'
+            termination_status = str(self._results.solver.termination_condition)
+            self.termination_message = self._results.solver.termination_message or termination_status
             self.best_bound = self._results['Problem'][0]['Lower bound']
-            self.log = f'Not Implemented for {self.__class__.__name__} yet'
+            self.log = self._load_log('cbc')
+            self.statistics = self._create_statistics(termination_status)
         else:
             raise NotImplementedError(f'Only Pyomo is implemented for Cbc solver.')
 
@@ -864,25 +1455,223 @@ class GlpkSolver(Solver):
         super().__init__(mip_gap, solver_output_to_console, logfile_name)
 
     def solve(self, modeling_language: 'ModelingLanguage'):
+        import pyomo.environ as pyo
         if isinstance(modeling_language, PyomoModel):
             self._solver = pyo.SolverFactory('glpk')
-            self._results = self._solver.solve(
-                modeling_language.model, tee=self.solver_output_to_console, keepfiles=True, logfile=self.logfile_name,
-                options={"mipgap": self.mip_gap}
-            )
+            with _LogTailer(self, 'glpk'), self._measure_time():
+                self._results = self._solver.solve(
+                    modeling_language.model, tee=self.solver_output_to_console, keepfiles=True,
+                    logfile=self.logfile_name, options={"mipgap": self.mip_gap}
+                )
 
             self.objective = modeling_language.model.objective.expr()
             self.termination_message = self._results['Solver'][0]['Status']
             self.best_bound = self._results['Problem'][0]['Lower bound']
-            try:
-                self.log = SolverLog('glpk', self.logfile_name)
-            except Exception as e:
-                self.log = None
-                logger.warning(f'SolverLog could not be loaded. {e}')
+            self.log = self._load_log('glpk')
+            self.statistics = self._create_statistics(str(self._results.solver.termination_condition))
         else:
             raise NotImplementedError(f'Only Pyomo is implemented for Cbc solver.')
 
 
+class PortfolioSolver(Solver):
+    """
+    Races several solvers on the same model. Each solver runs in its own process on a copy of the translated model
+    and writes its own log. The first solver, which reaches the mip_gap, wins and the other processes are killed.
+    If no solver reaches the mip_gap within the time limit, the running solvers are stopped and report their
+    incumbents (for a grace period of up to 10 s), and the best solution found is used.
+    The processes are started with 'forkserver' or 'spawn', so scripts need an `if __name__ == '__main__':` guard.
+
+    Attributes:
+        solvers (List[Solver]): The competing solvers. Each solver uses its own settings (mip_gap, time limit, ...).
+        time_limit_seconds (Optional[int]): Time limit for the whole race. If None, the race ends when all solvers
+            finished, or the first solver reached the mip_gap.
+        winner (Optional[Solver]): The solver, whose solution was used.
+        durations (Dict[str, Optional[float]]): Solving time of each solver. None, if the solver was killed.
+
+    Examples:
+        >>> solver = PortfolioSolver([HighsSolver(), CbcSolver(), GurobiSolver()], mip_gap=0.01)
+        >>> calculation.solve(solver)
+        >>> solver.winner
+    """
+    supports_marginal_values = False  # Only the solution of the winner is sent back
+    redirects_output = False  # The solvers run in their own processes
+
+    def __init__(self,
+                 solvers: List[Solver],
+                 mip_gap: Optional[float] = None,
+                 time_limit_seconds: Optional[int] = None,
+                 logfile_name: str = 'portfolio.log',
+                 solver_output_to_console: bool = False,
+                 ):
+        """
+        mip_gap: The gap a solution must reach to win the race. If None, the largest mip_gap of the solvers is used,
+            so every solver, which finishes regularly, reaches it.
+        """
+        assert len(solvers) > 0, 'At least one solver is needed'
+        super().__init__(max(solver.mip_gap for solver in solvers) if mip_gap is None else mip_gap,
+                         solver_output_to_console, logfile_name)
+        self.solvers = solvers
+        self.time_limit_seconds = time_limit_seconds
+        self.winner: Optional[Solver] = None
+        self.durations: Dict[str, Optional[float]] = {}
+        self._values: Dict[str, np.ndarray] = {}  # Solution of the winner per pyomo variable
+
+    def solve(self, modeling_language: 'ModelingLanguage'):
+        import multiprocessing
+        import queue as queue_module
+        if not isinstance(modeling_language, PyomoModel):
+            raise NotImplementedError(f'Only Pyomo is implemented for {self.__class__.__name__}.')
+
+        for i, solver in enumerate(self.solvers):  # Every solver gets its own log file
+            if self.logfile_name is not None:
+                base = pathlib.Path(self.logfile_name)
+                solver.logfile_name = str(base.with_name(f'{base.stem}_{self._label(i)}{base.suffix or ".log"}'))
+            solver.solver_output_to_console = self.solver_output_to_console
+
+            solver._solver, solver._results = None, None  # State of previous solves is not sent to the processes
+
+        # The pyomo model is pickled to the processes. Forking is avoided, as solver threads of previous solves
+        # (e.g. HiGHS) would deadlock in the forked processes
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        context = multiprocessing.get_context(start_method)
+        results_queue = context.Queue()
+        stop_event = context.Event()
+        processes = [context.Process(target=_solve_in_subprocess,
+                                     args=(i, solver, modeling_language.model, results_queue, stop_event,
+                                           self.time_limit_seconds), daemon=True)
+                     for i, solver in enumerate(self.solvers)]
+        t_start = timeit.default_timer()
+        for process in processes:
+            process.start()
+
+        results: Dict[int, Dict[str, Any]] = {}
+        winner_index: Optional[int] = None
+        deadline = t_start + self.time_limit_seconds if self.time_limit_seconds is not None else None
+        try:
+            while len(results) < len(processes):
+                if deadline is not None and timeit.default_timer() > deadline:
+                    if stop_event.is_set():
+                        logger.warning(f'{self.__class__.__name__}: Not all solvers reported their incumbents')
+                        break
+                    logger.warning(f'{self.__class__.__name__}: Time limit of {self.time_limit_seconds}s reached. '
+                                   f'Stopping the running solvers')
+                    stop_event.set()
+                    deadline += _INCUMBENT_GRACE_SECONDS
+                try:
+                    index, result = results_queue.get(timeout=1)
+                except queue_module.Empty:
+                    if not any(process.is_alive() for process in processes) and results_queue.empty():
+                        break  # Processes died without sending a result
+                    continue
+                results[index] = result
+                if 'error' in result:
+                    logger.warning(f'{self._label(index)} failed: {result["error"]}')
+                elif self._gap_of(result) <= self.mip_gap:
+                    winner_index = index
+                    break
+        finally:
+            for process in processes:
+                _kill_process(process)
+
+        if winner_index is None:  # No solver reached the gap: Using the best solution
+            solved = [index for index, result in results.items() if 'error' not in result]
+            if not solved:
+                raise Exception(f'{self.__class__.__name__}: No solver found a solution')
+            winner_index = min(solved, key=lambda index: results[index]['objective'])
+
+        result = results[winner_index]
+        self._values = result['values']
+
+        self.winner = self.solvers[winner_index]
+        for name in ('objective', 'best_bound', 'termination_message', 'log', 'progress', 'statistics'):
+            setattr(self.winner, name, result[name])
+        self.progress = result['progress']
+        self.statistics = result['statistics']
+        self.objective = result['objective']
+        self.best_bound = result['best_bound']
+        self.termination_message = f'{self._label(winner_index)}: {result["termination_message"]}'
+        self.durations = {self._label(i): results[i]['duration'] if i in results else None
+                          for i in range(len(self.solvers))}
+        self.log = {'Winner': self._label(winner_index),
+                    'Durations': self.durations,
+                    'Winner Log': result['log'].infos if isinstance(result['log'], SolverLog) else result['log']}
+        logger.info(f'{self.__class__.__name__}: {self._label(winner_index)} won the race. Durations: {self.durations}')
+
+    def primal_values(self, pyomo_vars: List[Any]) -> np.ndarray:
+        """ Solution of the winner, sent as one array per pyomo variable """
+        return np.concatenate([self._values[pyomo_var.name] for pyomo_var in pyomo_vars])
+
+    def dual_values(self, pyomo_constraints: List[Any]) -> np.ndarray:
+        raise NotImplementedError(f'Duals are not supported by the {self.__class__.__name__}. '
+                                  f'Use one of the competing solvers instead.')
+
+    def reduced_costs(self, pyomo_vars: List[Any]) -> np.ndarray:
+        raise NotImplementedError(f'Reduced costs are not supported by the {self.__class__.__name__}. '
+                                  f'Use one of the competing solvers instead.')
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        return {'solvers': [(solver.__class__.__name__, solver.settings) for solver in self.solvers],
+                'mip_gap': self.mip_gap,
+                'time_limit_seconds': self.time_limit_seconds}
+
+    def _label(self, index: int) -> str:
+        return f'{index}_{self.solvers[index].__class__.__name__}'
+
+    @staticmethod
+    def _gap_of(result: Dict[str, Any]) -> float:
+        """ Relative gap of a solution. If the solver reports no bound, a regular termination is assumed """
+        if result['best_bound'] is None or result['objective'] is None:
+            return 0
+        return abs(result['objective'] - result['best_bound']) / max(abs(result['objective']), 1e-10)
+
+
+_INCUMBENT_GRACE_SECONDS = 10  # Time for the solvers of a PortfolioSolver to report their incumbents when stopped
+
+
+def _solve_in_subprocess(index: int, solver: Solver, model: 'pyo.ConcreteModel', results_queue, stop_event,
+                         time_limit_seconds: Optional[float]) -> None:
+    """
+    Solves the model in a worker process of the PortfolioSolver and sends the values of all variables back.
+    The solver is limited to the time limit of the race, so it returns its incumbent in time. Solvers with native
+    callbacks (HiGHS) also stop early, once the stop_event is set.
+    """
+    import pyomo.environ as pyo
+    if hasattr(os, 'setsid'):
+        os.setsid()  # Own process group, so solver executables started by this process can be killed as well
+    t_start = timeit.default_timer()
+    if time_limit_seconds is not None and getattr(solver, 'time_limit_seconds', None) is not None:
+        solver.time_limit_seconds = min(solver.time_limit_seconds, time_limit_seconds)
+    solver.callbacks.append(lambda progress: stop_event.is_set())
+    try:
+        modeling_language = PyomoModel(model)  # The solvers only need the pyomo model
+        solver.solve(modeling_language)
+        pyomo_vars = list(modeling_language.model.component_objects(pyo.Var))
+        values = solver.primal_values(pyomo_vars)
+        ends = np.cumsum([len(pyomo_var) for pyomo_var in pyomo_vars])
+        values = {pyomo_var.name: array for pyomo_var, array in zip(pyomo_vars, np.split(values, ends[:-1]))}
+        log = solver.log if isinstance(solver.log, (SolverLog, str, dict)) or solver.log is None else str(solver.log)
+        result = {'values': values, 'objective': solver.objective, 'best_bound': solver.best_bound,
+                  'termination_message': solver.termination_message, 'log': log, 'progress': solver.progress,
+                  'statistics': solver.statistics}
+    except Exception as e:
+        result = {'error': f'{e.__class__.__name__}: {e}'}
+    result['duration'] = round(timeit.default_timer() - t_start, 2)
+    results_queue.put((index, result))
+
+
+def _kill_process(process) -> None:
+    """ Kills the process and its process group (solver executables) """
+    if process.is_alive() and hasattr(os, 'killpg'):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    if process.is_alive():
+        process.kill()
+    process.join()
+
+
 class ModelingLanguage(ABC):
     """
     Abstract base class for modeling languages.
@@ -894,7 +1683,20 @@ class ModelingLanguage(ABC):
     def translate_model(self, model: MathModel):
         raise NotImplementedError
 
-    def solve(self, math_model: MathModel, solver: Solver):
+    def solve(self, math_model: MathModel, solver: Solver, variables: Optional[List[Variable]] = None):
+        raise NotImplementedError
+
+    def solve_duals(self, math_model: MathModel, solver: Solver,
+                    constraints: List[Union[Equation, Inequation]], variables: List[Variable]):
+        raise NotImplementedError
+
+    def update_variable(self, variable: Variable, indices: Optional[np.ndarray] = None):
+        raise NotImplementedError
+
+    def update_constraint(self, constraint: Union[Equation, Inequation], rows: Optional[np.ndarray] = None):
+        raise NotImplementedError
+
+    def update_objective(self, objective: Equation):
         raise NotImplementedError
 
 
@@ -909,34 +1711,95 @@ class PyomoModel(ModelingLanguage):
         _counter (int): Counter for naming Pyomo components.
     """
 
-    def __init__(self):
+    def __init__(self, model: Optional['pyo.ConcreteModel'] = None):
+        """
+        model: An already translated pyomo model, e.g. to solve it in another process. If None, an empty model is
+            created, which is filled by translate_model().
+        """
+        import pyomo.environ as pyo
         logger.debug('Loaded pyomo modules')
 
-        self.model = pyo.ConcreteModel(name="(Minimalbeispiel)")
+        self.model = pyo.ConcreteModel(name="(Minimalbeispiel)") if model is None else model
 
         self.mapping: Dict[Union[Variable, Equation], Any] = {}  # Mapping to Pyomo Units
         self._counter = 0
 
-    def solve(self, math_model: MathModel, solver: Solver):
+    def solve(self, math_model: MathModel, solver: Solver, variables: Optional[List[Variable]] = None):
         if self._counter == 0:
             raise Exception(f' First, call .translate_model(). Else PyomoModel cant solve()')
-        solver.solve(self)
+        with _solver_call(solver):
+            solver.solve(self)
 
         # write results
-        math_model.result_of_objective = self.model.objective.expr()
-        for variable in math_model.variables:
-            raw_results = self.mapping[variable].get_values().values()  # .values() of dict, because {0:0.1, 1:0.3,...}
+        math_model.result_of_objective = solver.objective
+        self.extract_results(math_model.variables if variables is None else variables, solver)
+
+    def extract_results(self, variables: List[Variable], solver: Solver) -> None:
+        """
+        Pulls the solution of the given variables from the solver at once. The results of continuous variables are
+        views into one array (float_dtype()), the results of binary variables views into one int8 array.
+        Only variables with aliased indices get a copy, as their shared columns are expanded.
+        """
+        variables = ([variable for variable in variables if not variable.is_binary] +
+                     [variable for variable in variables if variable.is_binary])
+        pyomo_vars = [self.mapping[variable] for variable in variables]
+        values = solver.primal_values(pyomo_vars)
+        nr_of_continuous = sum(len(pyomo_var) for variable, pyomo_var in zip(variables, pyomo_vars)
+                               if not variable.is_binary)
+        continuous = values[:nr_of_continuous].astype(float_dtype(), copy=False)
+        binary = np.rint(values[nr_of_continuous:]).astype(np.int8)
+
+        start = 0
+        for variable, pyomo_var in zip(variables, pyomo_vars):
+            end = start + len(pyomo_var)
             if variable.is_binary:
-                dtype = np.int8  # geht das vielleicht noch kleiner ???
-            else:
-                dtype = float
-            # transform to np-array (fromiter() is 5-7x faster than np.array(list(...)) )
-            result = np.fromiter(raw_results, dtype=dtype)
-            # Falls skalar:
-            if len(result) == 1:
-                variable.result = result[0]
+                result = binary[start - nr_of_continuous: end - nr_of_continuous]
             else:
-                variable.result = result
+                result = continuous[start: end]
+            start = end
+            if variable.index_aliases is not None:  # Expanding the shared columns to the full length
+                result = result[np.searchsorted(variable.solver_indices, variable.index_aliases)]
+            variable.result = result[0] if len(result) == 1 else result
+
+    def solve_duals(self, math_model: MathModel, solver: Solver,
+                    constraints: List[Union[Equation, Inequation]], variables: List[Variable]):
+        """ Fixes the binary variables to their solution, solves the remaining LP and extracts the duals """
+        import pyomo.environ as pyo
+        binary_vars = [self.mapping[variable] for variable in math_model.variables if variable.is_binary]
+        binary_values = np.rint(solver.primal_values(binary_vars))
+        binary_var_datas = [var_data for pyomo_var in binary_vars for var_data in pyomo_var.values()]
+        already_fixed = [var_data.fixed for var_data in binary_var_datas]
+        for var_data, value in zip(binary_var_datas, binary_values.tolist()):
+            var_data.domain = pyo.Reals
+            var_data.fix(value)
+        self.model.dual = pyo.Suffix(direction=pyo.Suffix.IMPORT)
+        self.model.rc = pyo.Suffix(direction=pyo.Suffix.IMPORT)
+        try:
+            with solver._keeping_results():
+                with _solver_call(solver):
+                    solver.solve(self)
+                duals = solver.dual_values([self.mapping[constraint] for constraint in constraints])
+                reduced_costs = solver.reduced_costs([self.mapping[variable] for variable in variables])
+        finally:
+            self.model.del_component(self.model.dual)
+            self.model.del_component(self.model.rc)
+            for var_data, fixed in zip(binary_var_datas, already_fixed):
+                var_data.domain = pyo.Binary
+                if not fixed:
+                    var_data.unfix()
+
+        start = 0
+        for constraint in constraints:
+            result = duals[start: start + constraint.length].astype(float_dtype(), copy=False)
+            start += constraint.length
+            constraint.dual = result[0] if len(result) == 1 else result
+        start = 0
+        for variable, pyomo_var in zip(variables, (self.mapping[variable] for variable in variables)):
+            result = reduced_costs[start: start + len(pyomo_var)].astype(float_dtype(), copy=False)
+            start += len(pyomo_var)
+            if variable.index_aliases is not None:  # Expanding the shared columns to the full length
+                result = result[np.searchsorted(variable.solver_indices, variable.index_aliases)]
+            variable.reduced_cost = result[0] if len(result) == 1 else result
 
     def translate_model(self, math_model: MathModel):
         for variable in math_model.variables:   # Variablen erstellen
@@ -954,21 +1817,62 @@ class PyomoModel(ModelingLanguage):
         self.translate_objective(obj)
 
     def translate_variable(self, variable: Variable):
+        import pyomo.environ as pyo
         assert isinstance(variable, Variable), 'Wrong type of variable'
 
         if variable.is_binary:
-            pyomo_comp = pyo.Var(variable.indices, domain=pyo.Binary)
+            pyomo_comp = pyo.Var(variable.solver_indices, domain=pyo.Binary)
         else:
-            pyomo_comp = pyo.Var(variable.indices, within=pyo.Reals)
+            pyomo_comp = pyo.Var(variable.solver_indices, within=pyo.Reals)
         self.mapping[variable] = pyomo_comp
 
         # Register in pyomo-model:
         self._register_pyomo_comp(pyomo_comp, variable)
 
+        self._set_bounds(variable)
+
+    def update_variable(self, variable: Variable, indices: Optional[np.ndarray] = None):
+        """
+        Applies the current bounds and fixed values of the Variable to the translated pyomo variable,
+        only at the given indices, if passed
+        """
+        self._set_bounds(variable, indices)
+
+    def update_constraint(self, constraint: Union[Equation, Inequation], rows: Optional[np.ndarray] = None):
+        """
+        Applies the current factors and constants of the constraint to the translated pyomo constraint.
+        If rows are passed, only these rows are replaced in place. Persistent solvers (e.g. appsi) then only
+        exchange these rows. Otherwise, the whole pyomo constraint is translated again.
+        """
+        if rows is None:
+            self.model.del_component(self.mapping[constraint])
+            if isinstance(constraint, Equation):
+                self.translate_equation(constraint)
+            else:
+                self.translate_inequation(constraint)
+            return
+        pyomo_comp = self.mapping[constraint]
+        constant_vector = constraint.constant_vector
+        for i in rows.tolist():
+            lhs = sum(self._summand_math_expression(summand, i) for summand in constraint.summands)
+            pyomo_comp[i].set_value(lhs == constant_vector[i] if isinstance(constraint, Equation)
+                                    else lhs <= constant_vector[i])
+
+    def update_objective(self, objective: Equation):
+        """ Replaces the translated objective """
+        self.model.del_component(self.model.objective)
+        self.translate_objective(objective)
+
+    def _set_bounds(self, variable: Variable, indices: Optional[np.ndarray] = None):
+        pyomo_comp = self.mapping[variable]
         lower_bound_vector = utils.as_vector(variable.lower_bound, variable.length)
         upper_bound_vector = utils.as_vector(variable.upper_bound, variable.length)
         fixed_value_vector = utils.as_vector(variable.fixed_value, variable.length)
-        for i in variable.indices:
+        if variable.index_aliases is not None:
+            lower_bound_vector, upper_bound_vector, fixed_value_vector = self._bounds_of_aliased_variable(
+                variable, lower_bound_vector, upper_bound_vector, fixed_value_vector)
+            indices = None  # The changed indices would need to be mapped to the shared columns
+        for i in (variable.solver_indices if indices is None else indices.tolist()):
             # Wenn Vorgabe-Wert vorhanden:
             if variable.fixed and (fixed_value_vector[i] != None):
                 # Fixieren:
@@ -976,10 +1880,42 @@ class PyomoModel(ModelingLanguage):
                 pyomo_comp[i].fix()
             else:
                 # Boundaries:
+                pyomo_comp[i].unfix()
                 pyomo_comp[i].setlb(lower_bound_vector[i])  # min
                 pyomo_comp[i].setub(upper_bound_vector[i])  # max
 
+    @staticmethod
+    def _bounds_of_aliased_variable(variable: Variable,
+                                    lower_bound_vector: np.ndarray,
+                                    upper_bound_vector: np.ndarray,
+                                    fixed_value_vector: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Combines the bounds of all indices sharing one column in the solver.
+        The tightest bounds of the group are stored at the representative index.
+        """
+        lower_bound_vector = np.array(lower_bound_vector, dtype=object)
+        upper_bound_vector = np.array(upper_bound_vector, dtype=object)
+        fixed_value_vector = np.array(fixed_value_vector, dtype=object)
+        groups: Dict[int, List[int]] = {}
+        for index, alias in enumerate(variable.index_aliases.tolist()):
+            groups.setdefault(alias, []).append(index)
+
+        for alias, members in groups.items():
+            if len(members) == 1:
+                continue
+            lower_bounds = [lb for lb in lower_bound_vector[members] if lb is not None]
+            upper_bounds = [ub for ub in upper_bound_vector[members] if ub is not None]
+            lower_bound_vector[alias] = max(lower_bounds) if lower_bounds else None
+            upper_bound_vector[alias] = min(upper_bounds) if upper_bounds else None
+            fixed_values = [value for value in fixed_value_vector[members] if value is not None]
+            if fixed_values and not np.allclose(fixed_values, fixed_values[0]):
+                raise Exception(f'Fixed values of Variable {variable.label} differ between indices, '
+                                f'which share one column in the solver: {members}')
+            fixed_value_vector[alias] = fixed_values[0] if fixed_values else None
+        return lower_bound_vector, upper_bound_vector, fixed_value_vector
+
     def translate_equation(self, equation: Equation):
+        import pyomo.environ as pyo
         if not isinstance(equation, Equation):
             raise TypeError(f'Wrong Class: {equation.__class__.__name__}')
 
@@ -1001,6 +1937,7 @@ class PyomoModel(ModelingLanguage):
         self._register_pyomo_comp(pyomo_comp, equation)
 
     def translate_inequation(self, inequation: Inequation):
+        import pyomo.environ as pyo
         if not isinstance(inequation, Inequation):
             raise TypeError(f'Wrong Class: {inequation.__class__.__name__}')
 
@@ -1023,6 +1960,7 @@ class PyomoModel(ModelingLanguage):
         self._register_pyomo_comp(pyomo_comp, inequation)
 
     def translate_objective(self, objective: Equation):
+        import pyomo.environ as pyo
         if not isinstance(objective, Equation):
             raise TypeError(f'Class {objective.__class__.__name__} Can not be the objective!')
         if not objective.is_objective:
@@ -1039,21 +1977,37 @@ class PyomoModel(ModelingLanguage):
 
         self.model.objective = pyo.Objective(rule=_rule_linear_sum_skalar, sense=pyo.minimize)
         self.mapping[objective] = self.model.objective
+        self._remove_rule(self.model.objective)
 
     def _summand_math_expression(self, summand: Summand, at_index: int = 0) -> 'pyo.Expression':
-        pyomo_variable = self.mapping[summand.variable]
+        # Factors are converted to python floats, as they might be stored with lower precision (see set_precision())
+        variable = summand.variable
         if isinstance(summand, SumOfSummand):
-            return sum(pyomo_variable[summand.indices[j]] * summand.factor_vec[j] for j in summand.indices)
+            return sum(self._pyomo_variable_at(variable, summand.indices[j]) * float(summand.factor_vec[j])
+                       for j in summand.indices)
 
         # Ausdruck für i-te Gleichung (falls Skalar, dann immer gleicher Ausdruck ausgegeben)
         if summand.length == 1:
             # ignore argument at_index, because Skalar is used for every single equation
-            return pyomo_variable[summand.indices[0]] * summand.factor_vec[0]
+            return self._pyomo_variable_at(variable, summand.indices[0]) * float(summand.factor_vec[0])
         if len(summand.indices) == 1:
-            return pyomo_variable[summand.indices[0]] * summand.factor_vec[at_index]
-        return pyomo_variable[summand.indices[at_index]] * summand.factor_vec[at_index]
+            return self._pyomo_variable_at(variable, summand.indices[0]) * float(summand.factor_vec[at_index])
+        return self._pyomo_variable_at(variable, summand.indices[at_index]) * float(summand.factor_vec[at_index])
+
+    def _pyomo_variable_at(self, variable: Variable, index: int):
+        """ Returns the pyomo variable at the index, respecting the index aliases of the variable """
+        if variable.index_aliases is not None:
+            index = int(variable.index_aliases[index])
+        return self.mapping[variable][index]
 
     def _register_pyomo_comp(self, pyomo_comp, part: Union[Variable, Equation, Inequation]) -> None:
         self._counter += 1  # Counter to guarantee unique names
         self.model.add_component(f'{part.label}__{self._counter}', pyomo_comp)
         self.mapping[part] = pyomo_comp
+        self._remove_rule(pyomo_comp)
+
+    @staticmethod
+    def _remove_rule(pyomo_comp) -> None:
+        """ The rules of constructed components are not needed anymore. They are closures, which can't be pickled """
+        if getattr(pyomo_comp, '_rule', None) is not None:
+            pyomo_comp._rule = None
@@ -62,13 +62,14 @@ class CalculationResults:
         self._construct_effect_results()
 
     def _construct_component_results(self):
+        """ Results saved with a ResultFilter may lack Elements and Variables. Missing Elements get empty results """
         comp_results = self.all_results['Components']
         comp_infos = self.all_infos['FlowSystem']['Components']
-        assert comp_results.keys() == comp_infos.keys(), \
-            f'Missing Component or mismatched keys: {comp_results.keys() ^ comp_infos.keys()}'
+        assert comp_results.keys() <= comp_infos.keys(), \
+            f'Results of unknown Components: {comp_results.keys() - comp_infos.keys()}'
 
-        for key in comp_results.keys():
-            infos, results = comp_infos[key], comp_results[key]
+        for key in comp_infos.keys():
+            infos, results = comp_infos[key], comp_results.get(key, {})
             res = ComponentResults(infos, results)
             self.component_results[res.label] = res
 
@@ -76,11 +77,11 @@ class CalculationResults:
         effect_results = self.all_results['Effects']
         effect_infos = self.all_infos['FlowSystem']['Effects']
         effect_infos['penalty'] = {'label': 'Penalty'}
-        assert effect_results.keys() == effect_infos.keys(), \
-            f'Missing Effect or mismatched keys: {effect_results.keys() ^ effect_infos.keys()}'
+        assert effect_results.keys() <= effect_infos.keys(), \
+            f'Results of unknown Effects: {effect_results.keys() - effect_infos.keys()}'
 
-        for key in effect_results.keys():
-            infos, results = effect_infos[key], effect_results[key]
+        for key in effect_infos.keys():
+            infos, results = effect_infos[key], effect_results.get(key, {})
             res = EffectResults(infos, results)
             self.effect_results[res.label] = res
 
@@ -88,11 +89,11 @@ class CalculationResults:
         """ This has to be called after _construct_component_results(), as its using the Flows from the Components"""
         bus_results = self.all_results['Buses']
         bus_infos = self.all_infos['FlowSystem']['Buses']
-        assert bus_results.keys() == bus_infos.keys(), \
-            f'Missing Bus or mismatched keys: {bus_results.keys() ^ bus_infos.keys()}'
+        assert bus_results.keys() <= bus_infos.keys(), \
+            f'Results of unknown Buses: {bus_results.keys() - bus_infos.keys()}'
 
-        for bus_label in bus_results.keys():
-            infos, results = bus_infos[bus_label], bus_results[bus_label]
+        for bus_label in bus_infos.keys():
+            infos, results = bus_infos[bus_label], bus_results.get(bus_label, {})
             inputs = [flow for flow in self.flow_results().values() if bus_label==flow.bus_label and not flow.is_input_in_component]
             outputs = [flow for flow in self.flow_results().values() if bus_label==flow.bus_label and flow.is_input_in_component]
             res = BusResults(infos, results, inputs, outputs)
@@ -330,7 +331,8 @@ class ComponentResults(ElementResults):
 
     def _create_flow_results(self) -> Tuple[List[FlowResults], List[FlowResults]]:
         flow_infos = {flow['label']: flow for flow in self.all_infos['inputs'] + self.all_infos['outputs']}
-        flow_results = {flow_info['label']: self.all_results[flow_info['label']] for flow_info in flow_infos.values()}
+        flow_results = {flow_info['label']: self.all_results.get(flow_info['label'], {})
+                        for flow_info in flow_infos.values()}
         flows = [FlowResults(flow_info, flow_result, self.label)
                  for flow_info, flow_result in zip(flow_infos.values(), flow_results.values())]
         inputs = [flow for flow in flows if flow.is_input_in_component]
@@ -343,9 +345,11 @@ class ComponentResults(ElementResults):
                      output_factor: Optional[Literal[1, -1]] = 1) -> pd.DataFrame:
         inputs, outputs = {}, {}
         if input_factor is not None:
-            inputs = {flow.label_full: (flow.variables[variable_name] * input_factor) for flow in self.inputs}
+            inputs = {flow.label_full: (flow.variables[variable_name] * input_factor) for flow in self.inputs
+                      if variable_name in flow.variables}
         if output_factor is not None:
-            outputs = {flow.label_full: flow.variables[variable_name] * output_factor for flow in self.outputs}
+            outputs = {flow.label_full: flow.variables[variable_name] * output_factor for flow in self.outputs
+                       if variable_name in flow.variables}
 
         return pd.DataFrame(data={**inputs, **outputs})
 
@@ -363,11 +367,15 @@ class BusResults(ElementResults):
                      output_factor: Optional[Literal[1, -1]] = 1) -> pd.DataFrame:
         inputs, outputs = {}, {}
         if input_factor is not None:
-            inputs = {flow.label_full: (flow.variables[variable_name] * input_factor) for flow in self.inputs}
-            inputs['Excess Input'] = self.variables['excess_input'] * input_factor
+            inputs = {flow.label_full: (flow.variables[variable_name] * input_factor) for flow in self.inputs
+                      if variable_name in flow.variables}
+            if 'excess_input' in self.variables:
+                inputs['Excess Input'] = self.variables['excess_input'] * input_factor
         if output_factor is not None:
-            outputs = {flow.label_full: flow.variables[variable_name] * output_factor for flow in self.outputs}
-            outputs['Excess Output'] = self.variables['excess_output'] * output_factor
+            outputs = {flow.label_full: flow.variables[variable_name] * output_factor for flow in self.outputs
+                       if variable_name in flow.variables}
+            if 'excess_output' in self.variables:
+                outputs['Excess Output'] = self.variables['excess_output'] * output_factor
 
         return pd.DataFrame(data={**inputs, **outputs})
 
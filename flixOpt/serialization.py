@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+developed by Felix Panitz* and Peter Stange*
+* at Chair of Building Energy Systems and Heat Supply, Technische Universität Dresden
+
+Compact serialization of a FlowSystem, e.g. to send it to worker processes or to cache it on disk.
+The topology and all parameters are stored as a JSON document, the numpy arrays (profiles, time series, ...)
+in a binary .npz container next to it. Identical arrays are stored only once.
+The same encoding is used for the fingerprint of a FlowSystem, which identifies its content, e.g. for caching results.
+"""
+
+import hashlib
+import importlib
+import inspect
+import io
+import json
+import logging
+from typing import Dict, Any, List, Union, Tuple, Optional, BinaryIO, TYPE_CHECKING
+
+import numpy as np
+
+from .core import TimeSeries, TimeSeriesData
+from .structure import Element
+
+if TYPE_CHECKING:
+    from .flow_system import FlowSystem
+
+logger = logging.getLogger('flixOpt')
+
+FORMAT_VERSION = 1
+
+# Constructor arguments, which are stored under a different attribute name
+_ATTRIBUTE_OF_ARGUMENT: Dict[str, Dict[str, str]] = {
+    'Flow': {'can_be_off': 'on_off_parameters'},
+    'Storage': {'prevent_simultaneous_charge_and_discharge': 'prevent_simultaneous_flows'},
+    'InvestParameters': {'minimum_size': '_minimum_size', 'maximum_size': '_maximum_size'},
+}
+
+
+def flow_system_to_bytes(flow_system: 'FlowSystem') -> bytes:
+    buffer = io.BytesIO()
+    _write(flow_system, buffer)
+    return buffer.getvalue()
+
+
+def flow_system_from_bytes(data: bytes) -> 'FlowSystem':
+    return _read(io.BytesIO(data))
+
+
+def flow_system_to_file(flow_system: 'FlowSystem', path: str) -> None:
+    with open(path, 'wb') as file:
+        _write(flow_system, file)
+
+
+def flow_system_from_file(path: str) -> 'FlowSystem':
+    with open(path, 'rb') as file:
+        return _read(file)
+
+
+def fingerprint(flow_system: 'FlowSystem', settings: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Deterministic content hash of a FlowSystem (topology, parameters and time series) and further settings,
+    e.g. of the Calculation. Settings can contain numbers, strings, arrays and flixOpt objects.
+    """
+    encoder = _Encoder(flow_system)
+    document = {'flow_system': encoder.encode_flow_system(), 'settings': encoder.encode(settings)}
+    hasher = hashlib.sha256(json.dumps(document, sort_keys=True).encode('utf-8'))
+    # The arrays are only referenced in the document and are hashed by their content
+    hasher.update(repr(sorted((key, content_key) for content_key, key in encoder.array_keys.items())).encode())
+    return hasher.hexdigest()
+
+
+def _write(flow_system: 'FlowSystem', file: BinaryIO) -> None:
+    encoder = _Encoder(flow_system)
+    document = json.dumps(encoder.encode_flow_system()).encode('utf-8')
+    np.savez(file, document=np.frombuffer(document, dtype=np.uint8), **encoder.arrays)
+
+
+def _read(file: BinaryIO) -> 'FlowSystem':
+    with np.load(file, allow_pickle=False) as container:
+        arrays = {key: container[key] for key in container.files}
+    document = json.loads(arrays.pop('document').tobytes().decode('utf-8'))
+    if document.get('version') != FORMAT_VERSION:
+        raise ValueError(f'Unsupported FlowSystem format version: {document.get("version")}')
+    return _Decoder(document, arrays).decode_flow_system()
+
+
+class _Encoder:
+    """
+    Encodes the Elements of a FlowSystem by their constructor arguments.
+    Effects, Buses and Flows are encoded once and referenced by their index, as they are shared between Elements.
+    """
+
+    def __init__(self, flow_system: 'FlowSystem'):
+        self.flow_system = flow_system
+        self.arrays: Dict[str, np.ndarray] = {}
+        self.array_keys: Dict[Tuple, str] = {}  # (dtype, shape, hash of the content) -> key in self.arrays
+        self._references: Dict[Element, List[Union[str, int]]] = {}
+        for section, elements in self._sections().items():
+            for index, element in enumerate(elements):
+                self._references[element] = [section, index]
+
+    def _sections(self) -> Dict[str, List[Element]]:
+        return {'effects': self.flow_system.effect_collection.effects,
+                'buses': self.flow_system.all_buses,
+                'flows': self.flow_system.all_flows}
+
+    def encode_flow_system(self) -> Dict[str, Any]:
+        document = {'version': FORMAT_VERSION,
+                    'time_series': self.encode(self.flow_system.time_series),
+                    'last_time_step_hours': self.encode(self.flow_system.last_time_step_hours),
+                    'scenarios': self.encode(self.flow_system.scenarios),
+                    'scenario_weights': self.encode(self.flow_system.scenario_weights)}
+        for section, elements in self._sections().items():
+            document[section] = [self._encode_object(element) for element in elements]
+        document['components'] = [self._encode_object(component) for component in self.flow_system.components]
+        return document
+
+    def encode(self, value: Any) -> Any:
+        if isinstance(value, (np.integer, np.floating, np.bool_)) and not isinstance(value, np.timedelta64):
+            return value.item()
+        elif isinstance(value, (np.ndarray, np.generic)):
+            return {'__array__': self._add_array(np.asarray(value))}
+        elif value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        elif isinstance(value, TimeSeries):
+            return self._encode_time_series(value.data, value.aggregation_group, value.aggregation_weight)
+        elif isinstance(value, TimeSeriesData):
+            return self._encode_time_series(value.data, value.agg_group, value.agg_weight)
+        elif isinstance(value, Element) and value in self._references:
+            return {'__ref__': self._references[value]}
+        elif isinstance(value, list):
+            return [self.encode(item) for item in value]
+        elif isinstance(value, tuple):
+            return {'__tuple__': [self.encode(item) for item in value]}
+        elif isinstance(value, dict):
+            return {'__dict__': [[self.encode(key), self.encode(item)] for key, item in value.items()]}
+        elif type(value).__module__.startswith(__package__):
+            return self._encode_object(value)
+        raise TypeError(f'Objects of type {type(value).__name__} can not be serialized')
+
+    def _encode_time_series(self, data: Any, agg_group: Optional[str], agg_weight: Optional[float]) -> Any:
+        if agg_group is None and agg_weight is None:  # Plain data is enough to recreate the TimeSeries
+            return self.encode(data)
+        return {'__time_series__': self.encode(data), 'agg_group': agg_group, 'agg_weight': agg_weight}
+
+    def _encode_object(self, obj: Any) -> Dict[str, Any]:
+        cls = type(obj)
+        aliases = {argument: attribute for klass in reversed(cls.__mro__)
+                   for argument, attribute in _ATTRIBUTE_OF_ARGUMENT.get(klass.__name__, {}).items()}
+        arguments = {}
+        for name, parameter in inspect.signature(cls.__init__).parameters.items():
+            if name == 'self' or parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+                continue
+            arguments[name] = self.encode(getattr(obj, aliases.get(name, name)))
+        return {'__object__': f'{cls.__module__}.{cls.__qualname__}', 'args': arguments}
+
+    def _add_array(self, array: np.ndarray) -> str:
+        if array.dtype == object:
+            raise TypeError('Arrays of python objects can not be serialized')
+        array = np.ascontiguousarray(array)
+        content_hash = hashlib.blake2b(array.reshape(-1).view(np.uint8), digest_size=16).hexdigest()
+        content_key = (array.dtype.str, array.shape, content_hash)
+        if content_key not in self.array_keys:
+            key = f'array_{len(self.arrays)}'
+            self.array_keys[content_key] = key
+            self.arrays[key] = array
+        return self.array_keys[content_key]
+
+
+class _Decoder:
+    """ Creates the Elements of a FlowSystem from an encoded document. Referenced Elements are created on first use """
+
+    def __init__(self, document: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        self.document = document
+        self.arrays = arrays
+        self._elements: Dict[Tuple[str, int], Element] = {}
+
+    def decode_flow_system(self) -> 'FlowSystem':
+        from .flow_system import FlowSystem
+        flow_system = FlowSystem(self.decode(self.document['time_series']),
+                                 self.decode(self.document['last_time_step_hours']),
+                                 self.decode(self.document.get('scenarios')),
+                                 self.decode(self.document.get('scenario_weights')))
+        flow_system.add_effects(*[self._element('effects', index) for index in range(len(self.document['effects']))])
+        flow_system.add_components(*[self.decode(component) for component in self.document['components']])
+        return flow_system
+
+    def decode(self, value: Any) -> Any:
+        if isinstance(value, list):
+            return [self.decode(item) for item in value]
+        elif not isinstance(value, dict):
+            return value
+        elif '__array__' in value:
+            array = self.arrays[value['__array__']]
+            return array[()] if array.ndim == 0 else array
+        elif '__time_series__' in value:
+            return TimeSeriesData(self.decode(value['__time_series__']),
+                                  agg_group=value['agg_group'], agg_weight=value['agg_weight'])
+        elif '__ref__' in value:
+            return self._element(*value['__ref__'])
+        elif '__tuple__' in value:
+            return tuple(self.decode(item) for item in value['__tuple__'])
+        elif '__dict__' in value:
+            return {self.decode(key): self.decode(item) for key, item in value['__dict__']}
+        elif '__object__' in value:
+            return self._decode_object(value)
+        raise ValueError(f'Invalid entry in FlowSystem document: {value}')
+
+    def _element(self, section: str, index: int) -> Element:
+        if (section, index) not in self._elements:
+            self._elements[(section, index)] = self._decode_object(self.document[section][index])
+        return self._elements[(section, index)]
+
+    def _decode_object(self, value: Dict[str, Any]) -> Any:
+        module_name, class_name = value['__object__'].rsplit('.', 1)
+        if module_name.split('.')[0] != __package__:  # Only flixOpt classes are created
+            raise ValueError(f'Class {value["__object__"]} is not part of {__package__}')
+        cls = getattr(importlib.import_module(module_name), class_name)
+        return cls(**{name: self.decode(argument) for name, argument in value['args'].items()})
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+"""
+Local optimization service, which keeps built and translated models in memory between requests.
+Answering a what-if question (change a price, disable a boiler) then only needs the update of the affected parts of
+the model and a warm started solve instead of building the whole model again.
+
+Start the service (blocking) and talk to it with the ServiceClient:
+>>> OptimizationService(port=8765, max_workers=4).run()
+>>> client = ServiceClient('127.0.0.1', 8765)
+>>> client.load('district', 'district.flixopt')
+>>> client.solve('district', patches=[(SweepParameter.flow_rate_max('Kessel__Q_th'), 0)])
+
+The protocol is one JSON object per line over a local TCP connection: requests {"operation": ..., ...} are answered
+with {"result": ...} or {"error": ...}. The service runs fully offline and binds to 127.0.0.1 by default.
+"""
+import asyncio
+import base64
+import concurrent.futures
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import pathlib
+import socket
+import threading
+import timeit
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from . import utils
+from .calculation import FullCalculation, SweepParameter, _main_results_as_row
+from .core import Skalar
+from .flow_system import FlowSystem
+from .structure import ResultFilter
+from .solvers import Solver, solver_from_config
+
+logger = logging.getLogger('flixOpt')
+
+_LINE_LIMIT = 2 ** 30  # Maximum size of one request in bytes. Requests can contain whole FlowSystems
+
+Patch = Tuple[SweepParameter, Skalar]
+
+
+class OptimizationService:
+    """
+    Asyncio server, which keeps FullCalculations built and translated in worker processes.
+    Every worker process holds its own models and handles their requests one after another. Requests for models of
+    different workers run in parallel. Connections are handled concurrently.
+
+    Operations (keys of the requests besides "operation"):
+        load:     name, and path (of FlowSystem.to_file()) or flow_system (base64 of FlowSystem.to_bytes()),
+                  optional time_indices. Builds and translates the model. Loading an existing name replaces it.
+        patch:    name, patches ([{"parameter": SweepParameter.to_dict(), "value": ...}], see ServiceClient.patch()).
+                  Changes the translated model. Patches are kept until reset.
+        reset:    name. Removes all patches of the model.
+        solve:    name, optional solver (see solvers.solver_from_config()), patches and with_results.
+                  Returns the main results (see FullCalculation.sweep()), and all results if with_results is true.
+        unload:   name. Removes the model.
+        models:   Returns the loaded models and their workers.
+        shutdown: Stops the service.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, max_workers: Optional[int] = None):
+        """
+        Parameters
+        ----------
+        host : str
+            Address to bind to. The default only accepts connections from the same machine.
+        port : int
+            Port to listen on. If 0, a free port is chosen (see address).
+        max_workers : int, optional
+            Number of worker processes. If None, the number of processors is used.
+        """
+        self.host = host
+        self.port = port
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.address: Optional[Tuple[str, int]] = None  # Set, when the service is listening
+
+        self._workers: List[concurrent.futures.ProcessPoolExecutor] = []
+        self._worker_of_model: Dict[str, int] = {}
+        self._stopped: Optional[asyncio.Event] = None
+        self._ready = threading.Event()
+
+    def run(self) -> None:
+        """ Runs the service until a shutdown request """
+        asyncio.run(self.serve())
+
+    def run_in_background(self, timeout: float = 60) -> Tuple[str, int]:
+        """ Runs the service in a daemon thread of this process and returns its address, once it is listening """
+        threading.Thread(target=self.run, name='flixOpt-service', daemon=True).start()
+        if not self._ready.wait(timeout):
+            raise TimeoutError(f'The service did not start within {timeout} seconds')
+        return self.address
+
+    async def serve(self) -> None:
+        # Forking is avoided, as solver threads (e.g. HiGHS) would deadlock in the workers
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        context = multiprocessing.get_context(start_method)
+        self._workers = [concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context)
+                         for _ in range(self.max_workers)]
+        self._stopped = asyncio.Event()
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port, limit=_LINE_LIMIT)
+        self.address = server.sockets[0].getsockname()[:2]
+        logger.info(f'Optimization service listening on {self.address[0]}:{self.address[1]} '
+                    f'with {self.max_workers} workers')
+        self._ready.set()
+        try:
+            async with server:
+                await self._stopped.wait()
+        finally:
+            for worker in self._workers:
+                worker.shutdown(wait=False, cancel_futures=True)
+            self._worker_of_model.clear()
+            self._ready.clear()
+            logger.info('Optimization service stopped')
+
+    async def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """ Handles one request and returns the response. Errors are returned, not raised """
+        operation = request.get('operation')
+        try:
+            if operation == 'models':
+                result = dict(self._worker_of_model)
+            elif operation == 'shutdown':
+                self._stopped.set()
+                result = None
+            elif operation == 'load':
+                name = request['name']
+                worker = self._worker_of_model.get(name, self._least_busy_worker())
+                flow_system = base64.b64decode(request['flow_system']) if 'flow_system' in request else None
+                result = await self._run(worker, _load_model, name, flow_system, request.get('path'),
+                                         request.get('time_indices'))
+                self._worker_of_model[name] = worker
+            elif operation == 'patch':
+                result = await self._run_for(request['name'], _patch_model, request['patches'])
+            elif operation == 'reset':
+                result = await self._run_for(request['name'], _reset_model)
+            elif operation == 'solve':
+                result = await self._run_for(request['name'], _solve_model, request.get('solver'),
+                                             request.get('patches'), request.get('with_results', False))
+            elif operation == 'unload':
+                result = await self._run_for(request['name'], _unload_model)
+                del self._worker_of_model[request['name']]
+            else:
+                raise ValueError(f'Unknown operation "{operation}"')
+        except Exception as e:
+            logger.warning(f'Request "{operation}" failed: {e.__class__.__name__}: {e}')
+            return {'error': f'{e.__class__.__name__}: {e}'}
+        return {'result': result}
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    line = await _read_line(reader)
+                except ValueError as e:  # The request exceeds _LINE_LIMIT
+                    response = {'error': f'Invalid request: {e}'}
+                else:
+                    if not line:
+                        break
+                    try:
+                        request = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        response = {'error': f'Invalid request: {e}'}
+                    else:
+                        response = await self.handle(request)
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _run_for(self, name: str, function, *args) -> Any:
+        if name not in self._worker_of_model:
+            raise KeyError(f'No model with name "{name}" loaded')
+        return await self._run(self._worker_of_model[name], function, name, *args)
+
+    async def _run(self, worker: int, function, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._workers[worker], functools.partial(function, *args))
+
+    def _least_busy_worker(self) -> int:
+        models_per_worker = [0] * len(self._workers)
+        for worker in self._worker_of_model.values():
+            models_per_worker[worker] += 1
+        return models_per_worker.index(min(models_per_worker))
+
+
+async def _read_line(reader: asyncio.StreamReader) -> bytes:
+    """
+    Reads one line (empty at the end of the stream). A line exceeding the limit of the reader is skipped and raises a
+    ValueError, so the connection stays usable for the next request.
+    """
+    try:
+        return await reader.readuntil(b'\n')
+    except asyncio.IncompleteReadError as e:
+        return e.partial
+    except asyncio.LimitOverrunError:
+        pass
+    while True:  # Discards the rest of the line
+        try:
+            await reader.readuntil(b'\n')
+            break
+        except asyncio.IncompleteReadError:
+            break
+        except asyncio.LimitOverrunError as e:
+            await reader.readexactly(e.consumed)
+    raise ValueError('The request exceeds the line limit of the service')
+
+
+class ServiceClient:
+    """
+    Blocking client of the OptimizationService. Each client uses one connection, so use one client per thread.
+    Errors of the service are raised as RuntimeError.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, timeout: Optional[float] = None):
+        self._socket = socket.create_connection((host, port), timeout=timeout)
+        self._file = self._socket.makefile('rwb')
+
+    def load(self, name: str, flow_system: Union[FlowSystem, str, pathlib.Path],
+             time_indices: Optional[Union[range, List[int]]] = None) -> Dict[str, Any]:
+        """
+        Builds and translates a model in the service. Pass a FlowSystem (sent to the service) or the path of a file
+        of FlowSystem.to_file() (read by the service).
+        """
+        request = {'operation': 'load', 'name': name,
+                   'time_indices': list(time_indices) if time_indices is not None else None}
+        if isinstance(flow_system, FlowSystem):
+            request['flow_system'] = base64.b64encode(flow_system.to_bytes()).decode('ascii')
+        else:
+            request['path'] = str(pathlib.Path(flow_system).resolve())
+        return self._request(request)
+
+    def patch(self, name: str, *patches: Patch) -> List[str]:
+        """ Changes the model, e.g. client.patch('district', (SweepParameter.share_factor('Gastarif__Q_Gas', 'costs'), 1.5)) """
+        return self._request({'operation': 'patch', 'name': name, 'patches': _encode_patches(patches)})
+
+    def reset(self, name: str) -> None:
+        """ Removes all patches of the model """
+        return self._request({'operation': 'reset', 'name': name})
+
+    def solve(self, name: str, solver: Optional[Dict[str, Any]] = None, patches: Optional[List[Patch]] = None,
+              with_results: bool = False) -> Dict[str, Any]:
+        """
+        Solves the model, after applying the patches (which are kept until reset).
+
+        Parameters
+        ----------
+        name : str
+            Name of the model
+        solver : dict, optional
+            Config of the solver (see solvers.solver_from_config()). HiGHS with default settings, if None.
+        patches : list of (SweepParameter, value), optional
+            Patches to apply before solving.
+        with_results : bool
+            If True, all results are returned in 'results'. Else only the main results.
+        """
+        return self._request({'operation': 'solve', 'name': name, 'solver': solver,
+                              'patches': _encode_patches(patches or []), 'with_results': with_results})
+
+    def unload(self, name: str) -> None:
+        return self._request({'operation': 'unload', 'name': name})
+
+    def models(self) -> Dict[str, int]:
+        """ The loaded models and the index of their worker """
+        return self._request({'operation': 'models'})
+
+    def shutdown(self) -> None:
+        self._request({'operation': 'shutdown'})
+
+    def close(self) -> None:
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self) -> 'ServiceClient':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _request(self, request: Dict[str, Any]) -> Any:
+        self._file.write(json.dumps(request).encode('utf-8') + b'\n')
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError('The service closed the connection')
+        response = json.loads(line)
+        if 'error' in response:
+            raise RuntimeError(f'Request "{request["operation"]}" failed in the service: {response["error"]}')
+        return response['result']
+
+
+def _encode_patches(patches: List[Patch]) -> List[Dict[str, Any]]:
+    return [{'parameter': parameter.to_dict(), 'value': value} for parameter, value in patches]
+
+
+class _HotModel:
+    """ A translated model in a worker process, with its applied patches and the solver of its last solve """
+    def __init__(self, calculation: FullCalculation):
+        self.calculation = calculation
+        self.parameters: Dict[str, SweepParameter] = {}
+        self.solver: Optional[Solver] = None
+        self.solver_config: Optional[Dict[str, Any]] = None
+
+
+_HOT_MODELS: Dict[str, _HotModel] = {}  # The models of the worker process
+
+
+def _hot_model(name: str) -> _HotModel:
+    try:
+        return _HOT_MODELS[name]
+    except KeyError:
+        raise KeyError(f'No model with name "{name}" in the worker') from None
+
+
+def _load_model(name: str, flow_system: Optional[bytes], path: Optional[str],
+                time_indices: Optional[List[int]]) -> Dict[str, Any]:
+    t_start = timeit.default_timer()
+    flow_system = FlowSystem.from_bytes(flow_system) if flow_system is not None else FlowSystem.from_file(path)
+    calculation = FullCalculation(name, flow_system, time_indices=time_indices)
+    calculation.do_modeling()
+    _HOT_MODELS[name] = _HotModel(calculation)
+    return {'modeling_seconds': round(timeit.default_timer() - t_start, 3),
+            'size': calculation.system_model.describe_size()}
+
+
+def _patch_model(name: str, patches: List[Dict[str, Any]]) -> List[str]:
+    model = _hot_model(name)
+    labels = []
+    for patch in patches:
+        parameter = SweepParameter.from_dict(patch['parameter'])
+        parameter = model.parameters.setdefault(parameter.label, parameter)  # Keeps the original state of the model
+        parameter.apply(model.calculation.system_model, patch['value'])
+        labels.append(parameter.label)
+    return labels
+
+
+def _reset_model(name: str) -> None:
+    model = _hot_model(name)
+    for parameter in model.parameters.values():
+        parameter.reset(model.calculation.system_model)
+    model.parameters.clear()
+
+
+def _solve_model(name: str, solver_config: Optional[Dict[str, Any]], patches: Optional[List[Dict[str, Any]]],
+                 with_results: bool) -> Dict[str, Any]:
+    model = _hot_model(name)
+    if patches:
+        _patch_model(name, patches)
+    solver_config = solver_config or {}
+    if model.solver is None or model.solver_config != solver_config:
+        # Logs of concurrent workers would overwrite each other, so they are only written if configured
+        model.solver = solver_from_config({'logfile_name': None, 'solver_output_to_console': False, **solver_config})
+        model.solver.warm_start = True  # Starts from the previous solution of the model
+        model.solver_config = solver_config
+
+    calculation = model.calculation
+    t_start = timeit.default_timer()
+    calculation.system_model.solve(model.solver, result_filter=None if with_results else ResultFilter(variables=[]))
+    row = {**_main_results_as_row(calculation.system_model.main_results),
+           'termination_message': model.solver.termination_message,
+           'solving_seconds': round(timeit.default_timer() - t_start, 3),
+           'patches': list(model.parameters)}
+    if with_results:
+        calculation._results = None
+        row['results'] = calculation.results()
+    return utils.convert_to_native_types(row)
+
+
+def _unload_model(name: str) -> None:
+    _hot_model(name)
+    del _HOT_MODELS[name]
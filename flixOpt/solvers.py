@@ -6,5 +6,29 @@ developed by Felix Panitz* and Peter Stange*
 """
 
 # This module is simply for convenience
+from typing import Dict, Any
 
-from .math_modeling import Solver, HighsSolver, GurobiSolver, CbcSolver, CplexSolver, GlpkSolver
\ No newline at end of file
+from .math_modeling import (Solver, HighsSolver, GurobiSolver, CbcSolver, CplexSolver, GlpkSolver, PortfolioSolver,
+                            SolverProgress, EarlyStop, SolverStatistics)
+
+_SOLVER_CLASSES = {'highs': HighsSolver, 'gurobi': GurobiSolver, 'cbc': CbcSolver, 'cplex': CplexSolver,
+                   'glpk': GlpkSolver}
+
+
+def solver_from_config(config: Dict[str, Any]) -> Solver:
+    """
+    Creates a Solver from a config, e.g. read from a JSON or YAML file.
+
+    Parameters
+    ----------
+    config : dict
+        'name' of the solver ('highs', 'gurobi', 'cbc', 'cplex' or 'glpk') and the arguments of its class,
+        e.g. {'name': 'highs', 'mip_gap': 0.001, 'time_limit_seconds': 60}
+    """
+    config = dict(config)
+    name = config.pop('name', 'highs')
+    try:
+        solver_class = _SOLVER_CLASSES[name.lower()]
+    except KeyError:
+        raise ValueError(f'Unknown solver "{name}". Choose from {list(_SOLVER_CLASSES)}') from None
+    return solver_class(**config)
@@ -5,7 +5,8 @@ developed by Felix Panitz* and Peter Stange*
 * at Chair of Building Energy Systems and Heat Supply, Technische Universität Dresden
 """
 
-from typing import List, Dict, Union, Optional, Literal, TYPE_CHECKING, Any
+from typing import List, Dict, Union, Optional, Literal, TYPE_CHECKING, Any, Type
+import fnmatch
 import logging
 import inspect
 import textwrap
@@ -39,12 +40,29 @@ class SystemModel(MathModel):
         self.time_series, self.time_series_with_end, self.dt_in_hours, self.dt_in_hours_total = (
             flow_system.get_time_data_from_indices(time_indices))
         self.nr_of_time_steps = len(self.time_series)
+
+        # Scenarios: Every VariableTS holds one block of time steps per scenario, one block after another
+        self.nr_of_scenarios = flow_system.nr_of_scenarios
+        self.nr_of_time_steps_per_scenario = self.nr_of_time_steps
+        self.time_step_weights: Numeric = 1  # Weight of each time step in the sums over time (scenario weight)
+        if flow_system.scenarios is not None:
+            self.nr_of_time_steps *= self.nr_of_scenarios
+            self.dt_in_hours = np.tile(self.dt_in_hours, self.nr_of_scenarios)
+            self.time_step_weights = np.repeat(flow_system.weights_of_scenarios, self.nr_of_time_steps_per_scenario)
         self.indices = range(self.nr_of_time_steps)
+        self.first_indices = self.indices[::self.nr_of_time_steps_per_scenario]  # First time step of every scenario
+        # Time steps t with a predecessor t-1 in the same scenario, and their predecessors
+        if self.nr_of_scenarios == 1:
+            self.following_indices, self.preceding_indices = self.indices[1:], self.indices[:-1]
+        else:
+            self.following_indices = [index for index in self.indices if index % self.nr_of_time_steps_per_scenario]
+            self.preceding_indices = [index - 1 for index in self.following_indices]
 
         self.effect_collection_model = flow_system.effect_collection.create_model(self)
         self.component_models: List['ComponentModel'] = []
         self.bus_models: List['BusModel'] = []
         self.other_models: List[ElementModel] = []
+        self.result_filter: Optional['ResultFilter'] = None  # Of the last solve
 
     def do_modeling(self):
         self.effect_collection_model.do_modeling(self)
@@ -55,7 +73,8 @@ class SystemModel(MathModel):
         for bus_model in self.bus_models:  # Buses after Components, because FlowModels are created in ComponentModels
             bus_model.do_modeling(self)
 
-    def solve(self, solver: Solver, excess_threshold: Union[int, float] = 0.1):
+    def solve(self, solver: Solver, excess_threshold: Union[int, float] = 0.1,
+              result_filter: Optional['ResultFilter'] = None, marginal_values: bool = False):
         """
         Parameters
         ----------
@@ -63,12 +82,23 @@ class SystemModel(MathModel):
             An Instance of the class Solver. Choose from flixOpt.solvers
         excess_threshold : float, positive!
             threshold for excess: If sum(Excess)>excess_threshold a warning is raised, that an excess occurs
+        result_filter : ResultFilter, optional
+            If given, only the results of the selected variables (and of the main results) are extracted.
+        marginal_values : bool
+            If True, the duals of the bus balances and storage balances and the reduced costs of the effect totals
+            and invested sizes are extracted (see marginal_constraints and marginal_variables).
+            For MILPs, the binaries are fixed and the LP is solved once more.
         """
 
+        if marginal_values and not solver.supports_marginal_values:
+            raise NotImplementedError(f'Marginal values are not supported by the {solver.__class__.__name__}')
         logger.info(f'{" starting solving ":#^80}')
         logger.info(f'{self.describe_size()}')
 
-        super().solve(solver)
+        self.result_filter = result_filter
+        super().solve(solver, result_filter.select(self) if result_filter is not None else None)
+        if marginal_values:
+            self.solve_duals(self.marginal_constraints, self.marginal_variables)
 
         logger.info(f'Termination message: "{self.solver.termination_message}"')
 
@@ -120,15 +150,27 @@ class SystemModel(MathModel):
                            for model in self.other_models}}
 
     def results(self):
-        return {'Components': {model.element.label: model.results() for model in self.component_models},
-                'Effects': self.effect_collection_model.results(),
-                'Buses': {model.element.label: model.results() for model in self.bus_models},
-                'Others': {model.element.label: model.results() for model in self.other_models},
+        results = {'Components': {model.element.label: model.results() for model in self.component_models},
+                   'Effects': self.effect_collection_model.results(),
+                   'Buses': {model.element.label: model.results() for model in self.bus_models},
+                   'Others': {model.element.label: model.results() for model in self.other_models}}
+        if self.result_filter is not None:  # The Variables, that were not extracted, and empty Elements are left out
+            results = {key: _without_empty(value) for key, value in results.items()}
+        return {**results,
                 'Objective': self.result_of_objective,
                 'Time': self.time_series_with_end,
-                'Time intervals in hours': self.dt_in_hours
+                'Time intervals in hours': self.dt_in_hours,
+                # The results of every VariableTS hold one block of time steps per scenario
+                **({'Scenarios': dict(zip(self.flow_system.scenarios, self.flow_system.weights_of_scenarios.tolist())),
+                    'Scenario index': np.repeat(np.arange(self.nr_of_scenarios), self.nr_of_time_steps_per_scenario)}
+                   if self.flow_system.scenarios is not None else {})
                 }
 
+    @property
+    def weighted_dt_in_hours(self) -> np.ndarray:
+        """ dt_in_hours multiplied with the weight of the scenario of each time step, to build weighted totals """
+        return np.multiply(self.dt_in_hours, self.time_step_weights)
+
     @property
     def main_results(self) -> Dict[str, Union[Skalar, Dict]]:
         main_results = {}
@@ -162,6 +204,42 @@ class SystemModel(MathModel):
 
         return main_results
 
+    @property
+    def main_variables(self) -> List[Variable]:
+        """ The Variables needed for the main results. They are always extracted, regardless of a ResultFilter """
+        from flixOpt.features import InvestmentModel
+        effect_models = [effect.model for effect in self.flow_system.effect_collection.effects]
+        return ([share_model.sum for effect_model in effect_models
+                 for share_model in (effect_model.operation, effect_model.invest, effect_model.all)] +
+                [self.effect_collection_model.penalty.sum] +
+                [variable for bus in self.flow_system.all_buses if bus.with_excess
+                 for variable in (bus.model.excess_input, bus.model.excess_output)] +
+                [sub_model.size for sub_model in self.sub_models if isinstance(sub_model, InvestmentModel)])
+
+    @property
+    def marginal_constraints(self) -> List[Equation]:
+        """
+        The Equations, whose duals are extracted with marginal_values: The balances of all Buses (marginal price per
+        flow rate and time step; divide by dt_in_hours for the price per flow hour) and the charge state equations
+        of all Storages.
+        """
+        from flixOpt.components import StorageModel
+        return ([bus_model.eq_bus_balance for bus_model in self.bus_models] +
+                [model.eq_charge_state for model in self.component_models if isinstance(model, StorageModel)])
+
+    @property
+    def marginal_variables(self) -> List[Variable]:
+        """
+        The Variables, whose reduced costs are extracted with marginal_values: The totals of all effects,
+        whose bounds are the limits of the effects, and all invested sizes.
+        """
+        from flixOpt.features import InvestmentModel
+        effect_models = [effect.model for effect in self.flow_system.effect_collection.effects]
+        return ([variable for effect_model in effect_models
+                 for share_model in (effect_model.operation, effect_model.invest, effect_model.all)
+                 for variable in (share_model.sum, share_model.sum_TS) if variable is not None] +
+                [sub_model.size for sub_model in self.sub_models if isinstance(sub_model, InvestmentModel)])
+
     @property
     def infos(self) -> Dict:
         infos = super().infos
@@ -391,8 +469,16 @@ class ElementModel:
 
     def results(self) -> Dict:
         return {**{variable.label_short: variable.result for variable in self.variables.values()},
+                **self._marginal_results(),
                 **{model.label: model.results() for model in self.sub_models}}
 
+    def _marginal_results(self) -> Dict[str, Numeric]:
+        """ Duals and reduced costs of this model. Only present, if they were extracted (see SystemModel.solve()) """
+        return {**{f'{constraint.label_short}_dual': constraint.dual for constraint in self.constraints.values()
+                   if constraint.dual is not None},
+                **{f'{variable.label_short}_reduced_cost': variable.reduced_cost
+                   for variable in self.variables.values() if variable.reduced_cost is not None}}
+
     @property
     def label_full(self) -> str:
         return f'{self.element.label_full}__{self._label}' if self._label else self.element.label_full
@@ -402,6 +488,84 @@ class ElementModel:
         return self._label or self.element.label
 
 
+class ResultFilter:
+    """
+    Selects the Variables whose results are extracted from the solver and saved.
+    A Variable is selected, if it matches all given criteria. Criteria that are None match every Variable.
+    The Variables of the main results (effects, penalty, excess of buses and invested sizes) are always selected.
+
+    Examples
+    --------
+    >>> ResultFilter(elements=['Kessel', 'Speicher'])  # All variables of the Components 'Kessel' and 'Speicher'
+    >>> ResultFilter(variables=['*flow_rate', '*charge_state'])  # Only flow rates and charge states
+    >>> ResultFilter(exclude_model_types=['SingleShareModel', 'SegmentModel'])  # Without internal helpers
+    """
+    def __init__(self,
+                 elements: Optional[List[str]] = None,
+                 model_types: Optional[List[Union[str, Type['ElementModel']]]] = None,
+                 variables: Optional[List[str]] = None,
+                 exclude_model_types: Optional[List[Union[str, Type['ElementModel']]]] = None):
+        """
+        Parameters
+        ----------
+        elements : list of str, optional
+            Labels of Elements. The Variables of their Flows are included, e.g. 'Kessel' includes 'Kessel__Q_th'.
+        model_types : list of str or type, optional
+            Types of the models holding the Variables, e.g. FlowModel or 'OnOffModel'.
+        variables : list of str, optional
+            Patterns for the full labels of the Variables, with shell-style wildcards (e.g. '*__Q_th_flow_rate').
+        exclude_model_types : list of str or type, optional
+            Types of the models, whose Variables are never selected.
+        """
+        self.elements = elements
+        self.model_types = model_types
+        self.variables = variables
+        self.exclude_model_types = exclude_model_types or []
+
+    def select(self, system_model: SystemModel) -> List[Variable]:
+        """ Returns the selected Variables of the SystemModel """
+        selected = {variable.label: variable for variable in system_model.main_variables}
+        for model in system_model.sub_models:
+            if not self._matches_model(model):
+                continue
+            for variable in model.variables.values():
+                if self.variables is None or any(fnmatch.fnmatchcase(variable.label, pattern)
+                                                 for pattern in self.variables):
+                    selected[variable.label] = variable
+        return list(selected.values())
+
+    def _matches_model(self, model: 'ElementModel') -> bool:
+        if _is_of_type(model, self.exclude_model_types):
+            return False
+        if self.model_types is not None and not _is_of_type(model, self.model_types):
+            return False
+        if self.elements is None:
+            return True
+        label = model.element.label_full
+        return any(label == element or label.startswith(f'{element}__') for element in self.elements)
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(elements={self.elements}, '
+                f'model_types={[_type_name(model_type) for model_type in self.model_types or []]}, '
+                f'variables={self.variables}, '
+                f'exclude_model_types={[_type_name(model_type) for model_type in self.exclude_model_types]})')
+
+
+def _is_of_type(model: 'ElementModel', model_types: List[Union[str, Type['ElementModel']]]) -> bool:
+    return any(isinstance(model, model_type) if isinstance(model_type, type) else type(model).__name__ == model_type
+               for model_type in model_types)
+
+
+def _type_name(model_type: Union[str, type]) -> str:
+    return model_type.__name__ if isinstance(model_type, type) else model_type
+
+
+def _without_empty(results: Dict) -> Dict:
+    """ Removes the results of Variables, that were not extracted (see ResultFilter), and empty sub-results """
+    results = {key: _without_empty(value) if isinstance(value, dict) else value for key, value in results.items()}
+    return {key: value for key, value in results.items() if value is not None and not (isinstance(value, dict) and not value)}
+
+
 def _create_time_series(label: str, data: Optional[Union[Numeric_TS, TimeSeries]], element: Element) -> Optional[TimeSeries]:
     """Creates a TimeSeries from Numeric Data and adds it to the list of time_series of an Element.
     If the data already is a TimeSeries, nothing happens and the TimeSeries gets cleaned and returned"""
@@ -6,6 +6,9 @@ developed by Felix Panitz* and Peter Stange*
 """
 
 import logging
+import pathlib
+import pickle
+from collections import OrderedDict
 from datetime import datetime
 from typing import Union, List, Optional, Dict, Literal, Any, Tuple
 
@@ -150,3 +153,88 @@ def convert_numeric_lists_to_arrays(d: Union[Dict[str, Any], List[Any], tuple])
         return convert_list_to_array_if_numeric(d)
     else:
         return d
+
+
+class PickleCache:
+    """
+    Least recently used cache, whose entries are held in memory and optionally pickled to a directory, so they
+    survive between python sessions. Entries are evicted, once their total size exceeds max_size.
+    Subclasses define the size of an entry in memory and on disk (by default 1 per entry, so max_size is a count).
+    The files are named after name_of_entries, so caches of different classes can share a directory.
+    """
+    name_of_entries = 'entry'  # For log messages and as prefix of the files
+
+    def __init__(self, max_size: float, path: Optional[Union[str, pathlib.Path]] = None):
+        assert max_size > 0, 'The maximum size of the cache must be positive'
+        self.max_size = max_size
+        self.path = pathlib.Path(path) if path is not None else None
+        self._entries: OrderedDict[str, Any] = OrderedDict()
+        self._sizes: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        file = self._file_of(key)
+        if file is not None and file.exists():
+            try:
+                with open(file, 'rb') as f:
+                    entry = pickle.load(f)
+            except Exception as e:
+                logger.warning(f'Could not load {self.name_of_entries} from {file}: {e}')
+            else:
+                file.touch()  # mark as recently used
+                self._store_in_memory(key, entry)
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def put(self, key: str, entry: Any) -> None:
+        self._store_in_memory(key, entry)
+        file = self._file_of(key)
+        if file is not None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            with open(file, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            files = sorted(self._stored_files(), key=lambda file: file.stat().st_mtime, reverse=True)
+            total_size = 0
+            for stored_file in files:  # Most recently used files are kept
+                total_size += self._size_of_file(stored_file)
+                if total_size > self.max_size and stored_file != file:
+                    stored_file.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        """ Removes all entries from memory and disk """
+        self._entries.clear()
+        self._sizes.clear()
+        if self.path is not None:
+            for file in self._stored_files():
+                file.unlink(missing_ok=True)
+
+    def _size_of(self, entry: Any) -> float:
+        return 1
+
+    def _size_of_file(self, file: pathlib.Path) -> float:
+        return 1
+
+    def _store_in_memory(self, key: str, entry: Any) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._sizes[key] = self._size_of(entry)
+        while sum(self._sizes.values()) > self.max_size and len(self._entries) > 1:
+            outdated_key, _ = self._entries.popitem(last=False)
+            del self._sizes[outdated_key]
+
+    def _file_of(self, key: str) -> Optional[pathlib.Path]:
+        return self.path / f'{self.name_of_entries}_{key}.pkl' if self.path is not None else None
+
+    def _stored_files(self) -> List[pathlib.Path]:
+        """ The files of this cache in path. Files of other caches in the same directory are ignored """
+        return list(self.path.glob(f'{self.name_of_entries}_*.pkl'))
+
+    def __len__(self):
+        return len(self._entries)
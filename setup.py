@@ -30,5 +30,6 @@ setup(
     packages=find_packages(exclude=['tests', 'docs', 'examples', 'examples.*', 'Tutorials',
                                     '.git', '.vscode', 'build', '.venv', 'venv/',
                                     ]),
-    install_requires=read_requirements('requirements.txt')
+    install_requires=read_requirements('requirements.txt'),
+    entry_points={'console_scripts': ['flixopt = flixOpt.cli:main']},
 )
\ No newline at end of file
@@ -0,0 +1,36 @@
+import subprocess
+import sys
+import unittest
+
+IMPORT_TIME_TARGET_SECONDS = 1.0  # Startup of worker processes and batch jobs should stay fast (about 0.3 s locally)
+NR_OF_RUNS = 5  # The fastest run is compared, so a busy machine doesnt fail the benchmark
+HEAVY_MODULES = ('pandas', 'tsam', 'pyomo', 'plotly', 'matplotlib', 'sklearn')  # Slow startup of workers and jobs
+
+BENCHMARK = f"""
+import sys, timeit
+start = timeit.default_timer()
+import flixOpt
+duration = timeit.default_timer() - start
+print(duration, *[module for module in {HEAVY_MODULES!r} if module in sys.modules])
+"""
+
+
+class TestImportTime(unittest.TestCase):
+    def benchmark_import(self):
+        """ Imports flixOpt in a fresh interpreter. Returns the duration and the loaded heavy modules """
+        output = subprocess.run([sys.executable, '-c', BENCHMARK], capture_output=True, text=True, check=True).stdout
+        duration, *loaded_modules = output.strip().split('\n')[-1].split()
+        return float(duration), loaded_modules
+
+    def test_no_heavy_imports(self):
+        _, loaded_modules = self.benchmark_import()
+        self.assertEqual(loaded_modules, [], 'Heavy dependencies should only be imported on first use')
+
+    def test_import_time(self):
+        duration = min(self.benchmark_import()[0] for _ in range(NR_OF_RUNS))
+        self.assertLess(duration, IMPORT_TIME_TARGET_SECONDS,
+                        f'Importing flixOpt took {duration:.2f} s (target: {IMPORT_TIME_TARGET_SECONDS} s)')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,17 @@
+import tempfile
 import unittest
 import os
 import datetime
-from typing import Literal
+from typing import Literal, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 
+import flixOpt.math_modeling
 import flixOpt.results
 from flixOpt import *
 from flixOpt.linear_converters import Boiler, CHP
-from flixOpt.aggregation import AggregationParameters
+from flixOpt.aggregation import AggregationParameters, ClusteringCache, sweep_aggregation_settings
 
 
 class BaseTest(unittest.TestCase):
@@ -19,6 +21,16 @@ class BaseTest(unittest.TestCase):
     def get_solver(self):
         return solvers.HighsSolver(mip_gap=0.0001, time_limit_seconds=3600, solver_output_to_console=False)
 
+    def solved_calculation(self, name: str, flow_system: Optional[FlowSystem] = None,
+                           solver: Optional[solvers.Solver] = None, time_indices: Optional[range] = None,
+                           **solve_kwargs) -> FullCalculation:
+        """ Models and solves a FullCalculation of the flow_system (default: create_flow_system()) """
+        calculation = FullCalculation(name, self.create_flow_system() if flow_system is None else flow_system,
+                                      time_indices=time_indices)
+        calculation.do_modeling()
+        calculation.solve(self.get_solver() if solver is None else solver, **solve_kwargs)
+        return calculation
+
     def assertAlmostEqualNumeric(self, actual, desired, err_msg, relative_error_range_in_percent=0.011,
                                  absolute_tolerance = 1e-9): # error_range etwas höher als mip_gap, weil unterschiedl. Bezugswerte
         '''
@@ -283,6 +295,30 @@ class TestComplex(BaseTest):
 
         return aCalc
 
+    def test_serialization_round_trip(self):
+        calculation = self.segments_of_flows_model()  # Serialized after solving, with transformed data
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'flow_system.npz')
+            calculation.flow_system.to_file(path)
+            from_file = FlowSystem.from_file(path)
+        from_bytes = FlowSystem.from_bytes(calculation.flow_system.to_bytes())
+
+        for flow_system in (from_file, from_bytes):
+            self.assertEqual([comp.label for comp in flow_system.components],
+                             [comp.label for comp in calculation.flow_system.components])
+            self.assertEqual([flow.label_full for flow in flow_system.all_flows],
+                             [flow.label_full for flow in calculation.flow_system.all_flows])
+            storage = flow_system.element_by_label('Speicher')
+            self.assertIs(storage.charging.bus, storage.discharging.bus)
+            self.assertIs(next(iter(storage.capacity_in_flow_hours.effects_in_segments[1])),
+                          flow_system.element_by_label('costs'))
+            copied = FullCalculation('Copy', flow_system, 'pyomo', None)
+            copied.do_modeling()
+            copied.solve(self.get_solver())
+            self.assertAlmostEqualNumeric(copied.system_model.result_of_objective,
+                                          calculation.system_model.result_of_objective,
+                                          'Objective of the loaded FlowSystem doesnt match')
+
     def segments_of_flows_model(self):
         # Define the components and flow_system
         Strom = Bus('Strom', excess_penalty_per_flow_hour=self.excessCosts)
@@ -344,16 +380,44 @@ class TestModelingTypes(BaseTest):
         comps = {comp.label: comp for comp in calculation.flow_system.components}
         self.assertAlmostEqualNumeric(effects['costs'].model.all.sum.result, 343613, "costs doesnt match expected value")
 
+    def test_full_float32(self):
+        set_precision('float32')
+        try:
+            calculation = self.calculate("full")
+        finally:
+            set_precision('float64')
+        effects = {effect.label: effect for effect in calculation.flow_system.effect_collection.effects}
+        self.assertEqual(calculation.flow_system.time_series_store.data.dtype, np.float32)
+        self.assertEqual(effects['costs'].model.all.sum.result.dtype, np.float32)
+        self.assertAlmostEqualNumeric(effects['costs'].model.all.sum.result, 343613, "costs doesnt match expected value")
+
     def test_aggregated(self):
         calculation = self.calculate("aggregated")
         effects = {effect.label: effect for effect in calculation.flow_system.effect_collection.effects}
         self.assertAlmostEqualNumeric(effects['costs'].model.all.sum.result, 342967.0, "costs doesnt match expected value")
 
+    def test_aggregated_with_index_aliasing(self):
+        calculation = self.calculate("aggregated", use_index_aliasing=True)
+        effects = {effect.label: effect for effect in calculation.flow_system.effect_collection.effects}
+        self.assertAlmostEqualNumeric(effects['costs'].model.all.sum.result, 342967.0, "costs doesnt match expected value")
+        self.assertEqual(calculation.system_model.other_models[0].constraints, {},
+                         "No equations should be needed for equating indices")
+
+    def test_aggregated_from_cache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ClusteringCache(path=tmp_dir)
+            self.calculate("aggregated", clustering_cache=cache)
+            calculation = self.calculate("aggregated", clustering_cache=ClusteringCache(path=tmp_dir))
+        self.assertTrue(calculation.durations['clustering_from_cache'], "Clustering was not loaded from cache")
+        effects = {effect.label: effect for effect in calculation.flow_system.effect_collection.effects}
+        self.assertAlmostEqualNumeric(effects['costs'].model.all.sum.result, 342967.0, "costs doesnt match expected value")
+
     def test_segmented(self):
         calculation = self.calculate("segmented")
         self.assertAlmostEqualNumeric(sum(calculation.results(combined_arrays=True)['Effects']['costs']['operation']['operation_sum_TS']), 343613, "costs doesnt match expected value")
 
-    def calculate(self, modeling_type: Literal["full", "segmented", "aggregated"]):
+    def calculate(self, modeling_type: Literal["full", "segmented", "aggregated"], use_index_aliasing: bool = False,
+                  clustering_cache: Optional[ClusteringCache] = None):
         doFullCalc, doSegmentedCalc, doAggregatedCalc = modeling_type == "full", modeling_type == "segmented", modeling_type == "aggregated"
         if not any([doFullCalc, doSegmentedCalc, doAggregatedCalc]): raise Exception("Unknown modeling type")
 
@@ -400,7 +464,9 @@ class TestModelingTypes(BaseTest):
                                                                percentage_of_period_freedom=0,
                                                                penalty_of_period_freedom=0,
                                                                time_series_for_low_peaks=[TS_P_el_Last, TS_Q_th_Last],
-                                                               time_series_for_high_peaks=[TS_Q_th_Last]))
+                                                               time_series_for_high_peaks=[TS_Q_th_Last],
+                                                               use_index_aliasing=use_index_aliasing),
+                                         clustering_cache=clustering_cache)
             calc.do_modeling()
             print(es)
             es.visualize_network()
@@ -411,5 +477,636 @@ class TestModelingTypes(BaseTest):
         return calc
 
 
+class TestFlowSystemTopology(BaseTest):
+    def test_lookup_and_duplicates(self):
+        flow_system = FlowSystem(create_datetime_array('2020-01-01', 3, 'h'))
+        costs = Effect('costs', '€', 'Kosten', is_standard=True, is_objective=True)
+        flow_system.add_effects(costs)
+        heat, gas = Bus('Fernwärme'), Bus('Gas')
+        boiler = Boiler('Kessel', eta=0.5, Q_th=Flow('Q_th', bus=heat), Q_fu=Flow('Q_fu', bus=gas))
+        sink = Sink('Wärmelast', sink=Flow('Q_th_Last', bus=heat, size=1, fixed_relative_profile=np.array([1, 2, 3])))
+        flow_system.add_components(boiler, sink)
+
+        self.assertIs(flow_system.element_by_label('Kessel__Q_th'), boiler.Q_th)
+        self.assertIs(flow_system.element_by_label('Gas'), gas)
+        self.assertIs(flow_system.element_by_label('costs'), costs)
+        self.assertEqual(flow_system.all_buses, [gas, heat])  # Inputs of a component come first
+        self.assertEqual(flow_system.all_flows, [boiler.Q_fu, boiler.Q_th, sink.sink])
+        with self.assertRaises(KeyError):
+            flow_system.element_by_label('Kessel__Q_el')
+        with self.assertRaisesRegex(Exception, 'already added'):
+            flow_system.add_components(boiler)
+        with self.assertRaisesRegex(Exception, 'already used'):
+            flow_system.add_components(Sink('Wärmelast', sink=Flow('Q_th_Last', bus=heat)))
+        with self.assertRaisesRegex(Exception, 'already used'):
+            flow_system.add_components(Source('Gas', source=Flow('Q_Gas', bus=gas)))
+
+
+class HeatingSystemTest(BaseTest):
+    """ Base of the tests using a small heating system: A boiler with on/off costs covers a rising demand """
+    def create_flow_system(self) -> FlowSystem:
+        flow_system = FlowSystem(create_datetime_array('2020-01-01', 48, 'h'))
+        costs = Effect('costs', '€', 'Kosten', is_standard=True, is_objective=True)
+        heat, gas = Bus('Fernwärme'), Bus('Gas')
+        flow_system.add_effects(costs)
+        flow_system.add_components(
+            Boiler('Kessel', eta=0.5, Q_th=Flow('Q_th', bus=heat, size=50),
+                   Q_fu=Flow('Q_fu', bus=gas, can_be_off=OnOffParameters(effects_per_switch_on=10))),
+            Sink('Wärmelast', sink=Flow('Q_th_Last', bus=heat, size=1,
+                                        fixed_relative_profile=np.linspace(0, 40, 48))),
+            Source('Gastarif', source=Flow('Q_Gas', bus=gas, effects_per_flow_hour={costs: np.linspace(1, 3, 48)})))
+        return flow_system
+
+
+class TestSnapshots(HeatingSystemTest):
+    def test_concurrent_calculations(self):
+        import concurrent.futures
+        flow_system = self.create_flow_system()
+        time_indices = [range(0, 24), range(12, 36), range(24, 48)]
+
+        def calculate(args):
+            i, snapshot = args
+            calculation = self.solved_calculation(f'Snapshot_{i}', snapshot, time_indices=time_indices[i])
+            return calculation.system_model.result_of_objective
+
+        with concurrent.futures.ThreadPoolExecutor(3) as executor:
+            concurrent_results = list(executor.map(calculate, enumerate(
+                [flow_system.snapshot() for _ in time_indices])))
+        sequential_results = [calculate((i, flow_system.snapshot())) for i in range(len(time_indices))]
+
+        self.assertAlmostEqualNumeric(np.array(concurrent_results), np.array(sequential_results),
+                                      'Concurrent calculations dont match sequential ones')
+        self.assertTrue(all(component.model is None for component in flow_system.components),
+                        'The original FlowSystem should not be modified')
+
+    def test_snapshot_shares_data(self):
+        flow_system = self.create_flow_system()
+        flow_system.transform_data()
+        snapshot = flow_system.snapshot()
+        for original, copied in zip(flow_system.all_time_series, snapshot.all_time_series):
+            self.assertIsNot(copied, original, 'TimeSeries hold the active indices and must be copied')
+            self.assertIs(copied.data, original.data, 'The data must be shared')
+            self.assertEqual(copied in snapshot.time_series_store, original in flow_system.time_series_store)
+            self.assertNotIn(copied, flow_system.time_series_store)
+        self.assertIsNot(snapshot.components[0], flow_system.components[0])
+        self.assertIs(snapshot.time_series, flow_system.time_series)
+
+    def test_only_solver_calls_are_serialized(self):
+        import threading
+        calculation = FullCalculation('Blocked', self.create_flow_system().snapshot())
+        solved = threading.Event()
+
+        def solve():
+            calculation.solve(self.get_solver())
+            solved.set()
+
+        with flixOpt.math_modeling._SOLVE_LOCK:  # Another thread is solving
+            modeling = threading.Thread(target=calculation.do_modeling)
+            modeling.start()
+            modeling.join(timeout=60)
+            self.assertFalse(modeling.is_alive(), 'Building and translating the model should not wait for the lock')
+            solving = threading.Thread(target=solve)
+            solving.start()
+            self.assertFalse(solved.wait(timeout=1), 'The solver call should wait for the lock')
+        solving.join(timeout=60)
+        self.assertTrue(solved.is_set())
+
+        self.assertFalse(solvers.PortfolioSolver.redirects_output, 'Races run in processes, so they are not serialized')
+
+
+class TestResultCache(HeatingSystemTest):
+    def calculate(self, cache: ResultCache, mip_gap: float = 0.0001,
+                  time_indices: range = range(0, 24)) -> Tuple[FullCalculation, solvers.Solver]:
+        solver = solvers.HighsSolver(mip_gap=mip_gap, solver_output_to_console=False)
+        return self.solved_calculation('Cached', solver=solver, time_indices=time_indices, cache=cache), solver
+
+    def test_fingerprint(self):
+        flow_system, other = self.create_flow_system(), self.create_flow_system()
+        self.assertEqual(flow_system.fingerprint(), other.fingerprint())
+        other.components[1].sink.fixed_relative_profile[5] += 1
+        self.assertNotEqual(flow_system.fingerprint(), other.fingerprint())
+
+    def test_hit_and_miss(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ResultCache(path=tmp_dir)
+            solved, _ = self.calculate(cache)
+            self.assertFalse(solved.durations['results_from_cache'])
+            self.assertEqual(len(cache), 1)
+            self.assertEqual(len(os.listdir(tmp_dir)), 1, 'The entry should be written to the directory')
+
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+            loading_cache = ResultCache(path=tmp_dir)  # A new cache loads the entry from the file
+            cached, solver = self.calculate(loading_cache)
+            self.assertTrue(cached.durations['results_from_cache'])
+            self.assertEqual((loading_cache.hits, loading_cache.misses), (1, 0))
+            self.assertIsNone(solver.statistics, 'The solver should not be called')
+            self.assertEqual(solver.progress, [])
+            self.assertEqual(solver.objective, cached.system_model.result_of_objective)
+            self.assertEqual(cached.system_model.result_of_objective, solved.system_model.result_of_objective)
+            for variable, solved_variable in zip(cached.system_model.variables, solved.system_model.variables):
+                np.testing.assert_array_equal(variable.result, solved_variable.result)
+            on = cached.flow_system.components[0].Q_fu.model._on.on
+            self.assertEqual(on.result.dtype, np.int8, 'Binary results should keep their type')
+
+            for mip_gap, time_indices in ((0.01, range(0, 24)), (0.0001, range(24, 48))):
+                other, solver = self.calculate(cache, mip_gap=mip_gap, time_indices=time_indices)
+                self.assertFalse(other.durations['results_from_cache'], 'Other settings should miss the cache')
+                self.assertIsNotNone(solver.statistics)
+            self.assertEqual(len(os.listdir(tmp_dir)), 3)
+
+    def test_size_based_eviction(self):
+        cache = ResultCache()
+        self.calculate(cache)
+        entry_size = cache.nbytes
+        self.assertGreater(entry_size, 0)
+        cache.max_bytes = int(entry_size * 1.5)
+        self.calculate(cache, mip_gap=0.01)
+        self.assertEqual(len(cache), 1, 'The least recently used entry should be evicted')
+        self.assertLessEqual(cache.nbytes, cache.max_bytes)
+        evicted, _ = self.calculate(cache)
+        self.assertFalse(evicted.durations['results_from_cache'], 'The first entry should be evicted')
+        kept, _ = self.calculate(cache)
+        self.assertTrue(kept.durations['results_from_cache'])
+
+    def test_shared_directory(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results, clusterings = ResultCache(path=tmp_dir), ClusteringCache(max_entries=1, path=tmp_dir)
+            self.calculate(results)
+            clusterings.put('first', 'clustering')
+            clusterings.put('second', 'clustering')  # Evicts only the first clustering
+            self.assertEqual(len(os.listdir(tmp_dir)), 2, 'The caches should only evict their own files')
+            cached, _ = self.calculate(ResultCache(path=tmp_dir))
+            self.assertTrue(cached.durations['results_from_cache'], 'The results should be loaded from the file')
+
+            clusterings.clear()
+            self.assertEqual(len(os.listdir(tmp_dir)), 1, 'The caches should only clear their own files')
+            self.assertIsNone(ClusteringCache(path=tmp_dir).get('second'))
+
+
+class TestPortfolioSolver(HeatingSystemTest):
+    def test_race(self):
+        objectives = []
+        for solver in (self.get_solver(), solvers.PortfolioSolver([self.get_solver(), self.get_solver()])):
+            calculation = self.solved_calculation('Portfolio', solver=solver)
+            objectives.append(calculation.system_model.result_of_objective)
+        self.assertAlmostEqualNumeric(objectives[1], objectives[0], 'The portfolio doesnt match a single solver')
+        self.assertIn(solver.winner, solver.solvers)
+        self.assertEqual(calculation.system_model.infos['Solver Log']['Winner'], solver.log['Winner'])
+        self.assertIsNotNone(solver.durations[solver.log['Winner']])
+
+
+class TestSolverProgress(HeatingSystemTest):
+    def solve(self, *callbacks) -> Tuple[FullCalculation, solvers.Solver]:
+        solver = self.get_solver()
+        solver.callbacks.extend(callbacks)
+        return self.solved_calculation('Progress', solver=solver), solver
+
+    def test_trajectory(self):
+        reported = []
+        calculation, solver = self.solve(reported.append)
+        self.assertGreater(len(solver.progress), 0)
+        self.assertEqual(reported, solver.progress)
+        self.assertEqual(len(calculation.system_model.infos['Solver Progress']), len(solver.progress))
+        self.assertAlmostEqualNumeric(solver.progress[-1].objective, calculation.system_model.result_of_objective,
+                                      'The last incumbent doesnt match the objective')
+        self.assertTrue(all(earlier.elapsed_seconds <= later.elapsed_seconds
+                            for earlier, later in zip(solver.progress, solver.progress[1:])))
+
+    def test_early_stop(self):
+        optimal, optimal_solver = self.solve()
+        early_stop = solvers.EarlyStop(gap=0.5)
+        stopped, solver = self.solve(early_stop)
+        stop_index = next(i for i, progress in enumerate(solver.progress) if early_stop(progress))
+        self.assertEqual(stop_index, len(solver.progress) - 1, 'The solver should stop once the gap is reached')
+        self.assertLessEqual(len(solver.progress), len(optimal_solver.progress))
+        self.assertLess(solver.progress[-1].gap, 0.5)
+        self.assertAlmostEqualNumeric(stopped.system_model.result_of_objective, solver.progress[-1].objective,
+                                      'The incumbent at the stop should be the solution')
+        self.assertGreaterEqual(stopped.system_model.result_of_objective,
+                                optimal.system_model.result_of_objective - 1e-6)
+        if solver.progress[-1].gap > solver.mip_gap:
+            self.assertEqual(solver.termination_message, 'Interrupted by user')
+
+    def test_log_tailing(self):
+        solver = solvers.CbcSolver()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            solver.logfile_name = os.path.join(tmp_dir, 'cbc.log')
+            with flixOpt.math_modeling._LogTailer(solver, 'cbc'):
+                with open(solver.logfile_name, 'w') as file:
+                    file.write('Cbc0010I After 0 nodes, 1 on tree, 1e+50 best solution, best possible 4500 (0.10 seconds)\n'
+                               'Cbc0010I After 100 nodes, 12 on tree, 4600 best solution, best possible 4517.2 '
+                               '(0.52 seconds)\n')
+        self.assertEqual(len(solver.progress), 2)
+        self.assertIsNone(solver.progress[0].objective)
+        self.assertEqual(solver.progress[1].nodes, 100)
+        self.assertAlmostEqual(solver.progress[1].gap, (4600 - 4517.2) / 4600)
+
+
+class TestSolverStatistics(HeatingSystemTest):
+    def test_statistics(self):
+        solver = self.get_solver()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            calculation = self.solved_calculation('Statistics', solver=solver, save_results=tmp_dir)
+            self.assertTrue(os.path.isfile(solver.logfile_name), 'HiGHS should write to the given log file')
+        statistics = solver.statistics
+        self.assertEqual(statistics.termination_status, 'optimal')
+        self.assertAlmostEqualNumeric(statistics.objective, calculation.system_model.result_of_objective,
+                                      'The objective doesnt match')
+        self.assertLessEqual(statistics.gap, solver.mip_gap)
+        self.assertGreater(statistics.wall_time, 0)
+        self.assertGreater(statistics.cpu_time, 0)
+        self.assertGreater(statistics.iterations, 0)
+        self.assertGreaterEqual(statistics.nodes, 0)
+        self.assertLess(statistics.presolved_rows, calculation.system_model.nr_of_single_equations +
+                        calculation.system_model.nr_of_single_inequations)
+        self.assertGreater(statistics.binaries, 0)
+        self.assertEqual(calculation.system_model.infos['Solver Statistics'], statistics.infos)
+
+
+class TestBulkResultExtraction(HeatingSystemTest):
+    def test_views_and_selection(self):
+        solver = self.get_solver()
+        system_model = self.solved_calculation('Bulk', solver=solver).system_model
+        flow_rate = system_model.flow_system.components[0].Q_th.model.flow_rate
+        on = system_model.flow_system.components[0].Q_fu.model._on.on
+        self.assertIsNotNone(flow_rate.result.base, 'Results should be views into one array')
+        self.assertEqual(on.result.dtype, np.int8)
+
+        # The solution loaded into pyomo must match the solution taken directly from HiGHS
+        pyomo_vars = [system_model.model.mapping[variable] for variable in system_model.variables]
+        solver._solver.load_vars()
+        np.testing.assert_allclose(solver.primal_values(pyomo_vars),
+                                   solvers.Solver.primal_values(solver, pyomo_vars), atol=1e-9)
+
+        expected = flow_rate.result.copy()
+        for variable in system_model.variables:
+            variable.reset_result()
+        system_model.model.extract_results([flow_rate], solver)
+        np.testing.assert_array_equal(flow_rate.result, expected)
+        self.assertIsNone(on.result, 'Only the selected variables should be extracted')
+
+
+class TestResultFilter(HeatingSystemTest):
+    def test_filter(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            result_filter = ResultFilter(elements=['Kessel'], variables=['*flow_rate'])
+            calculation = self.solved_calculation('Filtered', save_results=tmp_dir, result_filter=result_filter)
+            loaded = flixOpt.results.CalculationResults(calculation.name, tmp_dir)
+        self.assertEqual(set(loaded.component_results), {'Kessel', 'Wärmelast', 'Gastarif'},
+                         'Filtered results should be loadable, with empty results of the other elements')
+        heat_bus = loaded.to_dataframe('Fernwärme', input_factor=1, with_last_time_step=False)
+        self.assertAlmostEqualNumeric(heat_bus['Kessel__Q_th'],
+                                      calculation.flow_system.components[0].Q_th.model.flow_rate.result,
+                                      'The filtered results dont match')
+        boiler = calculation.flow_system.components[0]
+        self.assertIsNotNone(boiler.Q_th.model.flow_rate.result)
+        self.assertIsNone(boiler.Q_fu.model._on.on.result, 'Variables not matching the pattern should be skipped')
+        self.assertIsNone(calculation.flow_system.components[2].source.model.flow_rate.result,
+                          'Variables of other elements should be skipped')
+        results = calculation.results()
+        self.assertEqual(set(results['Components']), {'Kessel'})
+        self.assertEqual(set(results['Components']['Kessel']), {'Q_th', 'Q_fu'})
+        self.assertIn('operation_sum', results['Effects']['costs']['operation'], 'Main results are always extracted')
+
+    def test_all_elements_without_filter(self):
+        flow_system = self.create_flow_system()
+        bus_without_excess = Bus('Nahwärme', excess_penalty_per_flow_hour=None)
+        flow_system.add_components(Source('Wärmebezug', source=Flow('Q_th', bus=bus_without_excess)))
+        calculation = self.solved_calculation('Unfiltered', flow_system)
+        self.assertEqual(calculation.results()['Buses']['Nahwärme'], {},
+                         'Without a filter, Elements without Variables should be kept')
+
+    def test_exclude_model_types(self):
+        calculation = self.solved_calculation('Filtered',
+                                              result_filter=ResultFilter(exclude_model_types=['SingleShareModel']))
+        results = calculation.results()
+        self.assertNotIn('Shares', results['Effects']['costs']['operation'])
+        self.assertIsNotNone(calculation.flow_system.components[0].Q_fu.model._on.on.result)
+
+
+class TestMarginalValues(HeatingSystemTest):
+    def test_duals(self):
+        solver = self.get_solver()
+        calculation = self.solved_calculation('Duals', solver=solver, marginal_values=True)
+        system_model = calculation.system_model
+        objective = system_model.result_of_objective
+        self.assertEqual(solver.objective, objective, 'The results of the MILP should be kept')
+
+        gas_price = np.linspace(1, 3, 48)  # Price per flow hour of the source, with hourly time steps
+        gas_bus = next(bus for bus in calculation.flow_system.all_buses if bus.label == 'Gas')
+        # Without gas flow (the boiler is off), any price between 0 and the tariff is optimal, so the dual is degenerate
+        with_gas = calculation.flow_system.components[2].source.model.flow_rate.result > 1e-6
+        self.assertGreater(with_gas.sum(), 0)
+        self.assertAlmostEqualNumeric(gas_bus.model.eq_bus_balance.dual[with_gas], gas_price[with_gas],
+                                      'The marginal price doesnt match')
+
+        results = calculation.results()
+        self.assertAlmostEqualNumeric(results['Buses']['Gas']['busBalance_dual'][with_gas], gas_price[with_gas],
+                                      'The duals should be part of the results')
+        self.assertIn('operation_sum_reduced_cost', results['Effects']['costs']['operation'])
+        import pyomo.environ as pyo
+        binaries = [var_data for variable in system_model.variables if variable.is_binary
+                    for var_data in system_model.model.mapping[variable].values()]
+        self.assertTrue(all(var_data.domain is pyo.Binary and not var_data.fixed for var_data in binaries),
+                        'The binaries should be restored')
+        self.assertIsNot(solver._solver, None)
+        self.assertIs(solver._solver._model, system_model.model.model, 'The solver instance of the MILP should be kept')
+        solver.warm_start = True
+        calculation.solve(solver)
+        self.assertAlmostEqualNumeric(system_model.result_of_objective, objective,
+                                      'A warm start after the duals should solve the MILP')
+
+    def test_portfolio_is_rejected_before_solving(self):
+        solver = solvers.PortfolioSolver([self.get_solver(), self.get_solver()])
+        with self.assertRaises(NotImplementedError):
+            self.solved_calculation('Duals', solver=solver, marginal_values=True)
+        self.assertIsNone(solver.winner, 'The race should not be started')
+
+
+class TestParameterSweep(HeatingSystemTest):
+    def test_share_factor(self):
+        calculation = self.solved_calculation('Sweep')
+        original_objective = calculation.system_model.result_of_objective
+
+        parameter = SweepParameter.share_factor('Gastarif__Q_Gas', 'costs')
+        table = calculation.sweep(self.get_solver(), parameter, [1, 1.5, 2])
+        self.assertEqual(list(table[parameter.label]), [1, 1.5, 2])
+        self.assertAlmostEqualNumeric(table['objective'][0], original_objective, 'The first value is the original')
+        self.assertTrue(table['objective'].is_monotonic_increasing)
+        self.assertIn('costs [€] operation', table.columns)
+
+        calculation.solve(self.get_solver())
+        self.assertAlmostEqualNumeric(calculation.system_model.result_of_objective, original_objective,
+                                      'The model should be reset after the sweep')
+
+        parallel_table = FullCalculation('Sweep', self.create_flow_system()).sweep(
+            self.get_solver(), parameter, [1, 1.5, 2], max_workers=2)
+        self.assertAlmostEqualNumeric(parallel_table['objective'].to_numpy(), table['objective'].to_numpy(),
+                                      'Parallel sweeps should match sequential ones')
+
+    def test_effect_limit(self):
+        calculation = FullCalculation('Sweep', self.create_flow_system())
+        table = calculation.sweep(self.get_solver(), SweepParameter.effect_limit('costs', 'maximum_total'),
+                                  [1e6, 100])
+        self.assertAlmostEqual(table['penalty'][0], 0)
+        self.assertLessEqual(table['costs [€] sum'][1], 100 + 1e-6)
+        self.assertGreater(table['penalty'][1], 0, 'The missing heat should be covered by the excess of the bus')
+
+
+class TestParetoFront(HeatingSystemTest):
+    def create_flow_system(self) -> FlowSystem:
+        flow_system = super().create_flow_system()
+        co2 = Effect('CO2', 'kg', 'CO2 Emissionen')
+        flow_system.add_effects(co2)
+        gas_source = flow_system.components[2].source
+        gas_source.effects_per_flow_hour = {**gas_source.effects_per_flow_hour, co2: 0.2}
+        heat = flow_system.components[1].sink.bus
+        flow_system.add_components(
+            Source('Wärmebezug', source=Flow('Q_Bezug', bus=heat, effects_per_flow_hour=5)))
+        return flow_system
+
+    def test_front(self):
+        calculation = FullCalculation('Pareto', self.create_flow_system())
+        front = calculation.pareto_front(self.get_solver(), 'CO2', nr_of_points=4)
+        self.assertEqual(len(front), 4)
+        co2, costs = front['CO2 [kg] sum'].to_numpy(), front['costs [€] sum'].to_numpy()
+        self.assertTrue(np.all(np.diff(co2) < 0), 'The limit of CO2 should decrease along the front')
+        self.assertTrue(np.all(np.diff(costs) >= -1e-6), 'The costs should increase along the front')
+        self.assertAlmostEqual(co2[-1], 0, delta=1e-6, msg='The heat can be bought without CO2')
+        self.assertTrue((front['penalty'] < 1e-6).all(), 'Every point should be feasible within the tolerance')
+
+        calculation.solve(self.get_solver())
+        self.assertAlmostEqualNumeric(calculation.system_model.result_of_objective, costs[0],
+                                      'The objective should be restored after the front')
+
+
+class TestScenarios(BaseTest):
+    def create_flow_system(self) -> FlowSystem:
+        flow_system = FlowSystem(create_datetime_array('2020-01-01', 4, 'h'),
+                                 scenarios=['mild', 'cold'], scenario_weights=[0.25, 0.75])
+        costs = Effect('costs', '€', 'Kosten', is_standard=True, is_objective=True)
+        heat, gas = Bus('Fernwärme'), Bus('Gas')
+        flow_system.add_effects(costs)
+        flow_system.add_components(
+            Boiler('Kessel', eta=0.5, Q_fu=Flow('Q_fu', bus=gas),
+                   Q_th=Flow('Q_th', bus=heat, size=InvestParameters(specific_effects={costs: 1}, maximum_size=100,
+                                                                     optional=False))),
+            Sink('Wärmelast', sink=Flow('Q_th_Last', bus=heat, size=1,
+                                        fixed_relative_profile=np.array([[10, 20, 10, 10], [10, 10, 30, 10]]))),
+            Source('Gastarif', source=Flow('Q_Gas', bus=gas, effects_per_flow_hour={costs: 1})))
+        return flow_system
+
+    def test_shared_investment(self):
+        calculation = self.solved_calculation('Scenarios')
+        boiler = calculation.flow_system.components[0]
+
+        self.assertEqual(len(boiler.Q_th.model.flow_rate.result), 8, 'One block of time steps per scenario')
+        self.assertAlmostEqualNumeric(boiler.Q_th.model.flow_rate.result.reshape(2, 4),
+                                      np.array([[10, 20, 10, 10], [10, 10, 30, 10]]), 'The demand of each scenario')
+        self.assertAlmostEqualNumeric(boiler.Q_th.model._investment.size.result, 30,
+                                      'The size is shared and covers the peak of all scenarios')
+        self.assertAlmostEqualNumeric(calculation.system_model.result_of_objective, 30 + 0.25 * 100 + 0.75 * 120,
+                                      'The operation costs are weighted by the scenarios')
+        results = calculation.system_model.results()
+        self.assertEqual(results['Scenarios'], {'mild': 0.25, 'cold': 0.75})
+        self.assertEqual(results['Scenario index'].tolist(), [0, 0, 0, 0, 1, 1, 1, 1])
+
+    def test_wrong_shape(self):
+        flow_system = self.create_flow_system()
+        flow_system.components[1].sink.fixed_relative_profile = np.ones((3, 4))
+        with self.assertRaises(ValueError, msg='Equal rows should not hide the wrong shape'):
+            flow_system.transform_data()
+
+        flow_system = self.create_flow_system()
+        flow_system.components[1].sink.fixed_relative_profile = np.full((2, 4), 20.)
+        flow_system.transform_data()
+        self.assertEqual(flow_system.components[1].sink.fixed_relative_profile.data, 20.,
+                         'Equal values of all scenarios should be a scalar')
+
+        flow_system = FlowSystem(create_datetime_array('2020-01-01', 4, 'h'))
+        flow_system.add_components(Sink('Wärmelast', sink=Flow('Q_th_Last', bus=Bus('Fernwärme'), size=1,
+                                                               fixed_relative_profile=np.ones((2, 4)))))
+        with self.assertRaises(ValueError, msg='Without scenarios, 2D data should be rejected'):
+            flow_system.transform_data()
+
+    def test_weights_sum_up_to_one(self):
+        with self.assertRaises(ValueError):
+            FlowSystem(create_datetime_array('2020-01-01', 4, 'h'), scenarios=['mild', 'cold'], scenario_weights=[1, 3])
+
+
+class TestRecedingHorizon(HeatingSystemTest):
+    def test_steps(self):
+        flow_system = self.create_flow_system()
+        calculation = RecedingHorizonCalculation('MPC', flow_system, horizon=12, step_length=4)
+        for _ in range(3):
+            metrics = calculation.step(self.get_solver())
+        self.assertEqual(calculation.time_indices, range(8, 20))
+        self.assertEqual(list(calculation.metrics()['start_index']), [0, 4, 8])
+        self.assertGreater(metrics['updated_parts'], 0, 'The prices and the demand of the window changed')
+
+        # A model built from scratch for the same window and start values has the same solution
+        reference = self.solved_calculation('Reference', flow_system.snapshot(), time_indices=range(8, 20))
+        self.assertAlmostEqualNumeric(metrics['objective'], reference.system_model.result_of_objective,
+                                      'The updated model should match a new model of the window')
+
+    def test_forecast(self):
+        calculation = RecedingHorizonCalculation('MPC', self.create_flow_system(), horizon=12, step_length=4)
+        calculation.step(self.get_solver())
+        forecast = np.full(12, 15.)
+        calculation.step(self.get_solver(), forecasts={'Wärmelast__Q_th_Last__fixed_relative_profile': forecast})
+        demand = calculation.flow_system.components[1].sink
+        self.assertAlmostEqualNumeric(demand.model.flow_rate.result, forecast, 'The forecast should be used')
+
+    def test_rows_are_updated_in_place(self):
+        calculation = RecedingHorizonCalculation('MPC', self.create_flow_system(), horizon=12, step_length=4)
+        calculation.step(self.get_solver())
+        pyomo_model = calculation.system_model.model
+        translated = dict(pyomo_model.mapping)
+        calculation.step(self.get_solver())
+        self.assertIs(calculation.system_model.model, pyomo_model)
+        self.assertTrue(all(pyomo_model.mapping[part] is component for part, component in translated.items()
+                            if part is not calculation.system_model.objective),
+                        'Only the rows of the constraints should be replaced')
+
+    def test_storage_with_last_value_of_sim(self):
+        flow_system = self.create_flow_system()
+        heat = flow_system.components[1].sink.bus
+        flow_system.add_components(Storage('Speicher', charging=Flow('Q_th_load', bus=heat, size=20),
+                                           discharging=Flow('Q_th_unload', bus=heat, size=20),
+                                           capacity_in_flow_hours=50, initial_charge_state='lastValueOfSim'))
+        calculation = RecedingHorizonCalculation('MPC', flow_system, horizon=12, step_length=4)
+        for _ in range(3):
+            calculation.step(self.get_solver())
+            charge_state = flow_system.components[-1].model.charge_state.result
+            self.assertAlmostEqual(charge_state[0], charge_state[-2], 5, 'The storage should be cyclic in every window')
+        self.assertEqual(flow_system.components[-1].initial_charge_state, 'lastValueOfSim')
+
+    def test_on_hours_history(self):
+        def create_flow_system(previous_flow_rate: np.ndarray) -> FlowSystem:
+            flow_system = FlowSystem(create_datetime_array('2020-01-01', 8, 'h'))
+            heat, gas = Bus('Fernwärme'), Bus('Gas')
+            flow_system.add_effects(Effect('costs', '€', 'Kosten', is_standard=True, is_objective=True))
+            flow_system.add_components(
+                Boiler('Kessel', eta=0.5, Q_th=Flow('Q_th', bus=heat, size=50),
+                       Q_fu=Flow('Q_fu', bus=gas, size=100, relative_minimum=0.1, previous_flow_rate=previous_flow_rate,
+                                 can_be_off=OnOffParameters(consecutive_on_hours_min=3))),
+                Sink('Wärmelast', sink=Flow('Q_th_Last', bus=heat, size=1, fixed_relative_profile=np.zeros(8))),
+                Source('Gastarif', source=Flow('Q_Gas', bus=gas, effects_per_flow_hour=1)))
+            return flow_system
+
+        flow_system = create_flow_system(np.array([0, 50]))  # On for one hour
+        self.solved_calculation('History', flow_system)
+        on_off = flow_system.components[0].Q_fu.model._on
+        self.assertAlmostEqualNumeric(on_off.on.result[:3], np.array([1, 1, 0]),
+                                      'The boiler should stay on until the minimum duration is reached')
+        self.assertAlmostEqualNumeric(on_off.consecutive_on_hours.result[:2], np.array([2, 3]),
+                                      'The history should be part of the duration')
+
+        calculation = self.solved_calculation('Long history', create_flow_system(np.array([50, 50, 50])))
+        self.assertAlmostEqual(calculation.system_model.result_of_objective, 0, 5,
+                               'The minimum duration is reached, the boiler can switch off immediately')
+
+
+class TestOptimizationService(HeatingSystemTest):
+    def test_what_if(self):
+        service = OptimizationService(max_workers=2)
+        host, port = service.run_in_background()
+        with ServiceClient(host, port) as client:
+            try:
+                client.load('Base', self.create_flow_system())
+                client.load('Day', self.create_flow_system(), time_indices=range(0, 24))
+                self.assertEqual(sorted(client.models().values()), [0, 1], 'One model per worker')
+
+                solver = {'name': 'highs', 'mip_gap': 0.0001}
+                base = client.solve('Base', solver=solver)
+                reference = self.solved_calculation('Reference')
+                self.assertAlmostEqualNumeric(base['objective'], reference.system_model.result_of_objective,
+                                              'The service should solve like a FullCalculation')
+
+                disabled = client.solve('Base', solver, patches=[(SweepParameter.flow_rate_max('Kessel__Q_th'), 0)])
+                self.assertEqual(disabled['patches'], ['Kessel__Q_th__flow_rate_max'])
+                self.assertGreater(disabled['penalty'], 0, 'Without the boiler, the heat is missing')
+
+                client.reset('Base')
+                self.assertAlmostEqualNumeric(client.solve('Base', solver)['objective'], base['objective'],
+                                              'The reset model should have the original solution')
+                with self.assertRaises(RuntimeError):
+                    client.solve('Unknown')
+            finally:
+                client.shutdown()
+
+    def test_oversized_request(self):
+        from unittest import mock
+        import flixOpt.service
+        parameter = SweepParameter.flow_rate_max('Kessel__Q_th')
+        self.assertEqual(SweepParameter.from_dict(parameter.to_dict()).label, parameter.label)
+
+        with mock.patch.object(flixOpt.service, '_LINE_LIMIT', 1024):
+            service = OptimizationService(max_workers=1)
+            host, port = service.run_in_background()
+        with ServiceClient(host, port) as client:
+            with self.assertRaisesRegex(RuntimeError, 'exceeds the line limit'):
+                client.load('Base', self.create_flow_system())
+            self.assertEqual(client.models(), {}, 'The connection should stay usable')
+            client.shutdown()
+
+
+class TestAggregationSweep(BaseTest):
+    def test_sweep(self):
+        filename = os.path.join(os.path.dirname(__file__), "ressources", "Zeitreihen2020.csv")
+        data = pd.read_csv(filename, index_col=0).sort_index()['2020-01-01':'2020-01-06 23:45:00']
+        data.index = pd.to_datetime(data.index)
+        table, best = sweep_aggregation_settings(data, hours_per_time_step=0.25, hours_per_period=[6, 24],
+                                                 nr_of_periods=[2, 4], weights={'P_Netz/MW': 2},
+                                                 metric='RMSE', threshold=0.1, max_workers=2)
+        self.assertEqual(len(table), 4)
+        self.assertTrue(table['error'].isna().all(), 'No setting should fail')
+        self.assertLessEqual(best['RMSE'], 0.1)
+        self.assertEqual(best['aggregated_hours'], table[table['RMSE'] <= 0.1]['aggregated_hours'].min())
+        self.assertTrue((table['nr_of_extreme_periods'] == 0).all(), 'No peaks were selected')
+        for column in data.columns:
+            self.assertIn(f'RMSE_duration [{column}]', table.columns)
+
+        _, best_for_column = sweep_aggregation_settings(
+            data, hours_per_time_step=0.25, hours_per_period=[6, 24], nr_of_periods=[2, 4],
+            time_series_for_high_peaks=['P_Netz/MW'], threshold={'P_Netz/MW': 0.1}, max_workers=1)
+        self.assertLessEqual(best_for_column['RMSE [P_Netz/MW]'], 0.1)
+        self.assertEqual(best_for_column['aggregated_hours'],
+                         best_for_column['hours_per_period'] * (best_for_column['nr_of_periods'] +
+                                                                best_for_column['nr_of_extreme_periods']),
+                         'The extreme periods should be counted')
+
+
+class TestCommandLine(HeatingSystemTest):
+    def test_batch(self):
+        import json
+        from flixOpt import cli
+        reference = self.solved_calculation('Reference')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.create_flow_system().to_file(os.path.join(tmp_dir, 'flow_system.npz'))
+            config = {'flow_system': 'flow_system.npz', 'solver': {'name': 'highs', 'mip_gap': 0.0001},
+                      'calculations': [{'name': 'Full'},
+                                       {'name': 'Npz', 'results': {'format': 'npz'}},
+                                       {'name': 'Unknown', 'calculation': 'unknown'}]}
+            with open(os.path.join(tmp_dir, 'config.json'), 'w') as f:
+                json.dump(config, f)
+
+            configs = cli.load_configs(os.path.join(tmp_dir, 'config.json'))
+            self.assertEqual([config['name'] for config in configs], ['Full', 'Npz', 'Unknown'])
+            summaries = cli.run_calculations(configs, max_workers=2)
+            self.assertEqual([summary['status'] for summary in summaries], ['ok', 'ok', 'failed'])
+            for summary in summaries[:2]:
+                self.assertAlmostEqualNumeric(summary['objective'], reference.system_model.result_of_objective,
+                                              'The batch should solve the same model')
+            self.assertTrue(os.path.exists(os.path.join(tmp_dir, 'results', 'Full_data.json')))
+            npz = np.load(os.path.join(tmp_dir, 'results', 'Npz_results.npz'))
+            self.assertAlmostEqualNumeric(npz['Objective'], reference.system_model.result_of_objective, 'Objective')
+
+            self.assertEqual(cli.main([os.path.join(tmp_dir, 'config.json'), '-o', os.path.join(tmp_dir, 'out')]), 1,
+                             'A failed calculation should be reported by the exit code')
+            self.assertTrue(os.path.exists(os.path.join(tmp_dir, 'out', 'Full_data.json')))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from flixOpt import *
+from flixOpt.core import float_dtype
+
+
+class TestMemory(unittest.TestCase):
+    """ Memory benchmark of the stored input time series for the different precisions """
+    nr_of_time_steps = 4 * 8760  # One year with 15 minute resolution
+    nr_of_profiles = 100
+
+    def tearDown(self):
+        set_precision('float64')
+
+    def create_flow_system(self) -> FlowSystem:
+        rng = np.random.default_rng(seed=42)
+        flow_system = FlowSystem(create_datetime_array('2020-01-01', self.nr_of_time_steps, 'm'))
+        flow_system.add_effects(Effect('costs', '€', 'Kosten', is_standard=True, is_objective=True))
+        bus = Bus('Strom')
+        flow_system.add_components(*[
+            Sink(f'Last_{i}', sink=Flow('P_el', bus=bus, size=1, fixed_relative_profile=rng.random(self.nr_of_time_steps)))
+            for i in range(self.nr_of_profiles)])
+        flow_system.transform_data()
+        return flow_system
+
+    def stored_megabytes(self, precision: str) -> float:
+        set_precision(precision)
+        store = self.create_flow_system().time_series_store
+        self.assertEqual(store.data.dtype, float_dtype())
+        self.assertEqual(len(store), self.nr_of_profiles)
+        return store.data.nbytes / 1024 ** 2
+
+    def test_float32_halves_memory(self):
+        megabytes_64 = self.stored_megabytes('float64')
+        megabytes_32 = self.stored_megabytes('float32')
+        self.assertAlmostEqual(megabytes_32 / megabytes_64, 0.5,
+                               msg=f'Stored time series: {megabytes_64:.1f} MB (float64), {megabytes_32:.1f} MB (float32)')
+
+    def test_identical_profiles_are_stored_once(self):
+        profile = np.random.default_rng(seed=42).random(self.nr_of_time_steps)
+        flow_system = FlowSystem(create_datetime_array('2020-01-01', self.nr_of_time_steps, 'm'))
+        flow_system.add_effects(Effect('costs', '€', 'Kosten', is_standard=True, is_objective=True))
+        bus = Bus('Strom')
+        flow_system.add_components(
+            *[Sink(f'Last_{i}', sink=Flow('P_el', bus=bus, size=1, fixed_relative_profile=profile.copy()))
+              for i in range(10)],
+            Source('Netz', source=Flow('P_el', bus=bus, size=1, effects_per_flow_hour=profile * 2)))
+        flow_system.transform_data()
+        store = flow_system.time_series_store
+        self.assertEqual(len(store), 11)
+        self.assertEqual(store.data.shape[1], 2, 'Identical profiles should be stored once')
+        profiles = [flow.fixed_relative_profile for flow in flow_system.all_flows if flow.label == 'P_el'
+                    and flow.fixed_relative_profile is not None]
+        self.assertTrue(all(ts.data is profiles[0].data for ts in profiles), 'Profiles should share one view')
+        self.assertFalse(profiles[0].data.flags.writeable)
+        np.testing.assert_array_equal(store.to_dataframe()[profiles[3].label], profile)
+
+    def test_memory_mapped_profiles(self):
+        profiles = np.random.default_rng(seed=42).random((self.nr_of_time_steps, 3))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'profiles.npy')
+            np.save(path, profiles)
+            flow_system = FlowSystem(create_datetime_array('2020-01-01', self.nr_of_time_steps, 'm'))
+            flow_system.add_effects(Effect('costs', '€', 'Kosten', is_standard=True, is_objective=True))
+            bus = Bus('Strom')
+            sink = Sink('Last', sink=Flow('P_el', bus=bus, size=1,
+                                          fixed_relative_profile=TimeSeriesData.from_file(path, column=1)))
+            flow_system.add_components(sink, Source('Netz', source=Flow('P_el', bus=bus, size=2,
+                                                                        effects_per_flow_hour=1)))
+            calculation = FullCalculation('Window', flow_system, time_indices=range(96, 192))
+            calculation.do_modeling()
+
+            time_series = sink.sink.fixed_relative_profile
+            self.assertTrue(time_series.is_memory_mapped)
+            self.assertNotIn(time_series, flow_system.time_series_store)
+            self.assertIsInstance(time_series.data, np.memmap)
+            self.assertNotIsInstance(time_series.active_data, np.memmap)
+            np.testing.assert_array_equal(time_series.active_data, profiles[96:192, 1])
+            del calculation, flow_system, sink, time_series  # Release the memory map before the file is removed
+
+    def test_parquet_column(self):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+        import pandas as pd
+        profiles = pd.DataFrame({'a': np.arange(10.), 'b': np.arange(10.) * 2})
+        with tempfile.TemporaryDirectory() as data_dir, tempfile.TemporaryDirectory() as cache_dir:
+            path = os.path.join(data_dir, 'profiles.parquet')
+            profiles.to_parquet(path, row_group_size=4)
+            time_series_data = TimeSeriesData.from_file(path, column='b', cache_directory=cache_dir)
+            np.testing.assert_array_equal(time_series_data.data, profiles['b'].to_numpy())
+            self.assertEqual(os.listdir(data_dir), ['profiles.parquet'], 'The data directory should stay untouched')
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            del time_series_data  # Release the memory map before the file is removed
+
+    def test_invalid_precision(self):
+        with self.assertRaises(ValueError):
+            set_precision('float16')
+
+
+if __name__ == '__main__':
+    unittest.main()